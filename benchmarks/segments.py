@@ -0,0 +1,125 @@
+# python -m benchmarks.segments
+# outlines the segments of a replayed window like window_tools.draw_segments does with PIL, and with
+# two NumPy versions: slice fills per box in a Python loop, and every outline pixel at once
+import argparse
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from benchmarks.spatial import windows
+from macapptree.window_tools import (
+    ROLE_PALETTE, SEGMENT_OUTLINE_WIDTH, draw_segments, flatten_segments, segment_pixel_boxes,
+)
+
+
+def pil(image, pixel_boxes, role_ids):
+    image = image.copy()
+    draw_segments(ImageDraw.Draw(image), pixel_boxes, role_ids)
+    return image
+
+
+# four slice fills per box on the image as packed 32-bit pixels
+def numpy_slices(image, pixel_boxes, role_ids):
+    width, height = image.size
+    pixels = np.array(image.convert("RGBA")).view(np.uint32).reshape(height, width)
+    colors = np.concatenate([ROLE_PALETTE, np.full((len(ROLE_PALETTE), 1), 255, np.uint8)], axis=1)
+    packed = colors.view(np.uint32).ravel()[role_ids]
+    line = SEGMENT_OUTLINE_WIDTH
+    x1, y1, x2, y2 = pixel_boxes.T
+    # slice bounds clipped to the image, right and bottom exclusive
+    columns = [np.clip(value, 0, width) for value in (x1, x1 + line, x2 + 1 - line, x2 + 1)]
+    rows = [np.clip(value, 0, height) for value in (y1, y1 + line, y2 + 1 - line, y2 + 1)]
+    for left, inner_left, inner_right, right, top, inner_top, inner_bottom, bottom, color in zip(
+        *(column.tolist() for column in columns), *(row.tolist() for row in rows), packed.tolist()
+    ):
+        pixels[top:inner_top, left:right] = color
+        pixels[inner_bottom:bottom, left:right] = color
+        pixels[top:bottom, left:inner_left] = color
+        pixels[top:bottom, inner_right:right] = color
+    return Image.fromarray(pixels.view(np.uint8).reshape(height, width, 4), "RGBA").convert(image.mode)
+
+
+# every outline pixel enumerated at once, later boxes overwrite earlier ones
+def numpy_spans(image, pixel_boxes, role_ids):
+    width, height = image.size
+    pixels = np.array(image).reshape(-1, len(image.getbands()))
+    x1, y1, x2, y2 = pixel_boxes.T
+    order = np.arange(len(pixel_boxes))
+    line = SEGMENT_OUTLINE_WIDTH
+    # horizontal runs: the outline rows at the top and bottom; vertical runs: the outline columns
+    offsets = np.arange(line)
+    run_rows = np.concatenate([(y1[:, None] + offsets).ravel(), (y2[:, None] - offsets).ravel()])
+    run_columns = np.concatenate([(x1[:, None] + offsets).ravel(), (x2[:, None] - offsets).ravel()])
+    run_order = np.tile(np.repeat(order, line), 2)
+
+    def runs(fixed, starts, lengths, vertical):
+        ends = np.cumsum(lengths)
+        along = np.repeat(starts - ends + lengths, lengths) + np.arange(ends[-1] if len(ends) else 0)
+        fixed = np.repeat(fixed, lengths)
+        rows, columns = (along, fixed) if vertical else (fixed, along)
+        inside = (rows >= 0) & (rows < height) & (columns >= 0) & (columns < width)
+        return rows[inside] * width + columns[inside], np.repeat(run_order, lengths)[inside]
+
+    x_start, x_length = np.tile(np.repeat(x1, line), 2), np.tile(np.repeat(x2 - x1 + 1, line), 2)
+    y_start, y_length = np.tile(np.repeat(y1, line), 2), np.tile(np.repeat(y2 - y1 + 1, line), 2)
+    horizontal, horizontal_order = runs(run_rows, x_start, x_length, False)
+    vertical, vertical_order = runs(run_columns, y_start, y_length, True)
+    targets = np.concatenate([horizontal, vertical])
+    boxes = np.concatenate([horizontal_order, vertical_order])
+    # the last box drawn over a pixel wins
+    last = np.full(width * height, -1, dtype=np.int64)
+    np.maximum.at(last, targets, boxes)
+    painted = np.flatnonzero(last >= 0)
+    colors = ROLE_PALETTE[role_ids[last[painted]]]
+    pixels[painted, :3] = colors
+    if pixels.shape[1] == 4:
+        pixels[painted, 3] = 255
+    return Image.fromarray(pixels.reshape(height, width, -1), image.mode)
+
+
+# the image to an array and back, what any NumPy version pays on top of the drawing
+def round_trip(image, pixel_boxes, role_ids):
+    return Image.fromarray(np.array(image), image.mode)
+
+
+def _timed(function, *args, repeat=3):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000, np.asarray(result)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--fanout", type=int, default=10)
+    parser.add_argument("--scale", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    window = windows(np.random.default_rng(args.seed), args.depth, args.fanout)[0]
+    boxes, heights, role_ids = flatten_segments(window)
+    pixel_boxes = segment_pixel_boxes(boxes, heights, args.scale)
+    x1, y1, x2, y2 = window.window_screen_rect
+    image = Image.new("RGB", (int((x2 - x1) * args.scale), int((y2 - y1) * args.scale)), "white")
+    # PIL draws outlines of boxes under SEGMENT_OUTLINE_WIDTH pixels partly outside the box
+    small = int(np.sum((pixel_boxes[:, 2] - pixel_boxes[:, 0] < SEGMENT_OUTLINE_WIDTH)
+                       | (pixel_boxes[:, 3] - pixel_boxes[:, 1] < SEGMENT_OUTLINE_WIDTH)))
+    print(f"{len(pixel_boxes)} boxes ({small} under {SEGMENT_OUTLINE_WIDTH} px) on a {image.size[0]}x{image.size[1]} image")
+
+    reference_ms, reference = _timed(pil, image, pixel_boxes, role_ids)
+    print(f"{'PIL rectangle':<22}{reference_ms:>9.1f} ms")
+    print(f"{'array round trip':<22}{_timed(round_trip, image, pixel_boxes, role_ids)[0]:>9.1f} ms")
+    for name, function in (("numpy slices", numpy_slices), ("numpy all pixels", numpy_spans)):
+        ms, result = _timed(function, image, pixel_boxes, role_ids)
+        different = int((result != reference).any(axis=-1).sum())
+        print(f"{name:<22}{ms:>9.1f} ms, {different} pixels differ from PIL")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# python -m benchmarks.serializer
+# writes a replayed window the way --output-format json does (to_dict and json.dump) and with
+# macapptree.serializer as json and msgpack, from UIElements and from the views of a TreeStore
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.spatial import windows
+from macapptree import serializer, traversal
+from macapptree.tree_store import TreeStore
+
+
+def to_dict_json(roots, path, indent=4):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([root.to_dict() for root in roots], f, ensure_ascii=False, indent=indent)
+
+
+def _timed(function, *args, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--depth", type=int, default=6)
+    parser.add_argument("--fanout", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    roots = windows(np.random.default_rng(args.seed), args.depth, args.fanout)
+    views = TreeStore.from_elements(roots).root_nodes
+    nodes = sum(1 for root in roots for _ in traversal.walk(root))
+    print(f"{len(roots)} windows, {nodes} nodes")
+
+    formats = ["json"]
+    try:
+        serializer._msgpack()
+        formats.append("msgpack")
+    except RuntimeError:
+        print("msgpack is not installed, only json is timed")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "tree")
+        cases = [("to_dict + json.dump", lambda trees: to_dict_json(trees, path)),
+                 ("to_dict + json.dump, no indent", lambda trees: to_dict_json(trees, path, None))]
+        cases += [(f"serializer {format}", lambda trees, format=format: serializer.dump(trees, path, format))
+                  for format in formats]
+        for source, trees in (("elements", roots), ("store views", views)):
+            for name, write in cases:
+                ms = _timed(write, trees)
+                print(f"{source:<13}{name:<32}{ms:>8.1f} ms {os.path.getsize(path) / 1e6:>8.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# python -m benchmarks.spatial
+# times SpatialIndex queries against linear scans of every element, on two replayed windows with
+# randomly placed elements
+import argparse
+import math
+import time
+
+import numpy as np
+
+from macapptree import traversal
+from macapptree.backend import ReplayAXBackend, use_backend
+from macapptree.spatial import SpatialIndex, screen_box
+from macapptree.uielement import UIElement
+
+
+ROLES = ("AXGroup", "AXButton", "AXStaticText", "AXTextField", "AXImage")
+WINDOW_RECTS = ([200, 100, 1600, 980], [900, 500, 2300, 1380])
+
+
+# recording of a window whose elements are placed at random, partly outside their parents
+def random_recording(rng, depth, fanout, width=1400.0, height=880.0):
+    elements = {"0": {"attributes": {"AXWindows": [0, [{"$element": 1}]]}}}
+    pending = [(1, 0, 0.0, 0.0, width, height)]
+    next_id = 2
+    while pending:
+        node_id, level, x, y, node_width, node_height = pending.pop()
+        children = []
+        if level < depth:
+            for _ in range(fanout):
+                child_width = node_width * rng.uniform(0.05, 0.6)
+                child_height = node_height * rng.uniform(0.05, 0.6)
+                child_x = x + rng.uniform(-0.1, 1.0) * node_width
+                child_y = y + rng.uniform(-0.1, 1.0) * node_height
+                children.append(next_id)
+                pending.append((next_id, level + 1, child_x, child_y, child_width, child_height))
+                next_id += 1
+        elements[str(node_id)] = {
+            "attributes": {
+                "AXRole": [0, "AXWindow" if node_id == 1 else ROLES[node_id % len(ROLES)]],
+                "AXTitle": [0, f"node {node_id}"],
+                "AXPosition": [0, {"$point": [x, y]}],
+                "AXSize": [0, {"$size": [node_width, node_height]}],
+                "AXEnabled": [0, True],
+            },
+            "children": [{"$element": child} for child in children],
+        }
+    return {"elements": elements, "applications": {"1": 0}}
+
+
+def windows(rng, depth, fanout):
+    roots = []
+    for rect in WINDOW_RECTS:
+        replay = ReplayAXBackend(random_recording(rng, depth, fanout))
+        with use_backend(replay):
+            element = replay.attribute(replay.application(1), "AXWindows")[0]
+            window = UIElement(element, parents_visible_bbox=[0, 0, rect[2] - rect[0], rect[3] - rect[1]])
+        window.window_screen_rect = rect
+        roots.append(window)
+    return roots
+
+
+# what a caller without the index does: scan every element
+class LinearScan:
+    def __init__(self, roots):
+        self.items = []
+        for root in roots:
+            for element, depth, _ in traversal.walk_with_depth(root):
+                box = screen_box(element, root.window_screen_rect)
+                if box is not None:
+                    self.items.append((element, box, (depth, len(self.items))))
+
+    def hit_test(self, x, y):
+        best = None
+        for element, box, rank in self.items:
+            if box[0] <= x <= box[2] and box[1] <= y <= box[3] and (best is None or rank > best[1]):
+                best = (element, rank)
+        return best[0] if best else None
+
+    def intersecting(self, rect):
+        x1, y1, x2, y2 = rect
+        return [element for element, box, _ in self.items
+                if box[0] <= x2 and x1 <= box[2] and box[1] <= y2 and y1 <= box[3]]
+
+    def nearest(self, x, y, k):
+        found = []
+        for element, box, rank in self.items:
+            distance = math.hypot(max(box[0] - x, x - box[2], 0), max(box[1] - y, y - box[3], 0))
+            found.append((distance, -rank[0], -rank[1], element))
+        found.sort(key=lambda item: item[:3])
+        return [(item[0], item[3]) for item in found[:k]]
+
+
+# best time per call in microseconds
+def _per_call(function, calls, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--fanout", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    roots = windows(rng, args.depth, args.fanout)
+    start = time.perf_counter()
+    index = SpatialIndex(roots)
+    print(f"{index}, built in {(time.perf_counter() - start) * 1000:.1f} ms")
+    linear = LinearScan(roots)
+
+    points = rng.uniform((0, 0), (2400, 1400), (100, 2)).tolist()
+    rects = [(x, y, x + 100, y + 80) for x, y in points[:30]]
+    batch = rng.uniform((0, 0), (2400, 1400), (1000, 2))
+    rows = [
+        ("hit_test", len(points),
+         lambda: [linear.hit_test(x, y) for x, y in points], lambda: [index.hit_test(x, y) for x, y in points]),
+        ("hit_test_many (1000)", 1,
+         lambda: [linear.hit_test(x, y) for x, y in batch.tolist()], lambda: index.hit_test_many(batch)),
+        ("intersecting", len(rects),
+         lambda: [linear.intersecting(rect) for rect in rects], lambda: [index.intersecting(rect) for rect in rects]),
+        ("nearest (k=10)", 30,
+         lambda: [linear.nearest(x, y, 10) for x, y in points[:30]],
+         lambda: [index.nearest(x, y, 10) for x, y in points[:30]]),
+    ]
+    print(f"{'query':<24}{'linear':>14}{'index':>14}")
+    for name, calls, scan, query in rows:
+        print(f"{name:<24}{_per_call(scan, calls, 1):>11.0f} us{_per_call(query, calls):>11.1f} us")
+
+
+if __name__ == "__main__":
+    main()
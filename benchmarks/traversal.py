@@ -0,0 +1,131 @@
+# python -m benchmarks.traversal
+# builds and dumps replayed 50-level trees with the traversal engine (DFS and BFS) and with the
+# recursive construction it replaced, and finds how deep each one can go
+import argparse
+import time
+
+from benchmarks.spatial import ROLES
+from macapptree import traversal
+from macapptree.backend import ReplayAXBackend, use_backend
+from macapptree.uielement import UIElement
+
+
+# the construction before the traversal engine: every child builds its whole subtree in its constructor
+class RecursiveUIElement(UIElement):
+    def _expand(self):
+        if not self._complete:
+            return []
+        elements, self.action_items = self._child_elements_and_actions(
+            self.ax_element, self._start_position, self._children_hint
+        )
+        self._children_hint = None
+        if self.max_depth is None or self.max_depth > 0:
+            offset_x, offset_y = self._offset
+            child_depth = self.max_depth - 1 if self.max_depth is not None else None
+            self.children = [
+                self._make_child(child, offset_x, offset_y, child_depth, self.visible_bbox, True)
+                for child in elements
+            ]
+        return []
+
+
+# to_dict before the walkers
+def recursive_to_dict(node):
+    result = node._node_dict()
+    result["children"] = [recursive_to_dict(child) for child in node.children]
+    return result
+
+
+# recording of a window nested depth levels deep: every level has siblings leaves next to the node
+# that goes one level deeper
+def deep_recording(depth, siblings):
+    elements = {"0": {"attributes": {"AXWindows": [0, [{"$element": 1}]]}}}
+    next_id = 2
+    for level in range(depth + 1):
+        node_id = 1 if level == 0 else next_id - siblings - 1
+        children = []
+        if level < depth:
+            children = list(range(next_id, next_id + siblings + 1))
+            next_id += siblings + 1
+        elements[str(node_id)] = _element(node_id, level, children)
+        for index, leaf_id in enumerate(children[1:]):
+            elements[str(leaf_id)] = _element(leaf_id, level + 1, [], index + 1)
+    return {"elements": elements, "applications": {"1": 0}}
+
+
+def _element(node_id, level, children, column=0):
+    return {
+        "attributes": {
+            "AXRole": [0, "AXWindow" if node_id == 1 else ROLES[node_id % len(ROLES)]],
+            "AXTitle": [0, f"node {node_id}"],
+            "AXPosition": [0, {"$point": [level + column * 20.0, level * 2.0]}],
+            "AXSize": [0, {"$size": [max(1.0, 1400.0 - level * 2), max(1.0, 880.0 - level * 4)]}],
+            "AXEnabled": [0, True],
+        },
+        "children": [{"$element": child} for child in children],
+    }
+
+
+def build(replay, cls=UIElement, order=traversal.DFS):
+    previous = UIElement.traversal_order
+    UIElement.traversal_order = order
+    try:
+        with use_backend(replay):
+            return cls(replay.attribute(replay.application(1), "AXWindows")[0])
+    finally:
+        UIElement.traversal_order = previous
+
+
+def _timed(function, *args, repeat=20):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000, result
+
+
+# deepest chain, doubling up to limit levels, that builds and dumps without a RecursionError
+def deepest(cls, to_dict, limit):
+    depth, reached = 50, 0
+    while depth <= limit:
+        try:
+            to_dict(build(ReplayAXBackend(deep_recording(depth, 0)), cls))
+        except RecursionError:
+            return reached, True
+        reached, depth = depth, depth * 2
+    return reached, False
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--depth", type=int, default=50)
+    parser.add_argument("--siblings", type=int, default=5)
+    parser.add_argument("--limit", type=int, default=6400, help="Deepest chain to try")
+    args = parser.parse_args()
+
+    replay = ReplayAXBackend(deep_recording(args.depth, args.siblings))
+    reference = recursive_to_dict(build(replay, RecursiveUIElement))
+    nodes = sum(1 for _ in traversal.walk(build(replay)))
+    print(f"{args.depth} levels, {nodes} nodes")
+
+    for name, cls, order in (("recursive", RecursiveUIElement, traversal.DFS),
+                             ("engine DFS", UIElement, traversal.DFS),
+                             ("engine BFS", UIElement, traversal.BFS)):
+        build_ms, window = _timed(build, replay, cls, order)
+        to_dict = recursive_to_dict if cls is RecursiveUIElement else UIElement.to_dict
+        dump_ms, dump = _timed(to_dict, window)
+        same = "same dump" if dump == reference else "DIFFERENT dump"
+        print(f"{name:<12}build {build_ms:>7.2f} ms, to_dict {dump_ms:>6.2f} ms, {same}")
+
+    for name, cls, to_dict in (("recursive", RecursiveUIElement, recursive_to_dict),
+                               ("engine", UIElement, UIElement.to_dict)):
+        reached, failed = deepest(cls, to_dict, args.limit)
+        result = f"RecursionError above {reached} levels" if failed else f"{reached} levels without recursion errors"
+        print(f"{name:<12}{result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# python -m benchmarks.watch
+# replays a storm of value changes on random nodes of a replayed window through TreeWatcher and
+# compares the coalesced subtree refreshes with rebuilding the whole window once per notification
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.spatial import random_recording
+from macapptree import backend, traversal
+from macapptree.backend import ReplayAXBackend, use_backend
+from macapptree.uielement import UIElement
+from macapptree.watch import ReplayNotificationSource, TreeWatcher
+
+
+def _window(replay):
+    element = replay.attribute(replay.application(1), "AXWindows")[0]
+    return UIElement(element, parents_visible_bbox=[0, 0, 1400, 880])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--depth", type=int, default=7)
+    parser.add_argument("--fanout", type=int, default=4)
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--duration", type=float, default=1.0, help="Seconds of virtual time the storm lasts")
+    parser.add_argument("--coalesce", type=float, default=0.05)
+    parser.add_argument("--max-delay", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    recording = random_recording(rng, args.depth, args.fanout)
+    replay = ReplayAXBackend(recording)
+    with use_backend(replay):
+        start = time.perf_counter()
+        window = _window(replay)
+        build = time.perf_counter() - start
+    nodes = [node.ax_element.element_id for node in traversal.walk(window)]
+    print(f"{len(nodes)} nodes, full build in {build * 1000:.0f} ms")
+
+    times = np.sort(rng.uniform(0, args.duration, args.events))
+    targets = rng.choice(nodes[1:], args.events)
+    events = []
+    for index, (at, element_id) in enumerate(zip(times.tolist(), targets.tolist())):
+        recording["elements"][str(element_id)]["attributes"]["AXTitle"] = [0, f"changed {index}"]
+        events.append({"time": at, "pid": 1, "element": element_id,
+                       "notification": backend.AX_VALUE_CHANGED_NOTIFICATION})
+
+    watcher = TreeWatcher([window], 1, ReplayNotificationSource(events), lambda update: None,
+                          coalesce=args.coalesce, max_delay=args.max_delay)
+    with use_backend(replay):
+        watcher.start()
+        watcher.run(args.duration + 1.0)
+    stats = watcher.stats
+    print(f"{stats.notifications} notifications in {stats.flushes} flushes, "
+          f"{stats.refreshed_nodes} nodes refreshed in {stats.refresh_time * 1000:.0f} ms")
+    print(f"full builds instead: about {build * stats.flushes:.1f} s once per flush, "
+          f"{build * stats.notifications:.1f} s once per notification")
+
+
+if __name__ == "__main__":
+    main()
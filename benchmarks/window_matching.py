@@ -0,0 +1,88 @@
+# python -m benchmarks.window_matching
+# matches synthetic layouts of several hundred windows with the greedy per-window IoU search that
+# _process_app used before, and with window_matching.match_windows by window number and by IoU
+import argparse
+import time
+
+import numpy as np
+
+from macapptree.window_matching import VisibleWindowIndex, match_windows
+from macapptree.window_tools import _iou
+
+
+LAYOUTS = ((50, 8), (20, 40), (4, 200))
+
+
+# apps with overlapping windows, the accessibility frames off by a fraction of a point
+def layout(apps, windows, seed=0):
+    rng = np.random.default_rng(seed)
+    entries = []
+    ax_windows = {}
+    for pid in range(apps):
+        ax_windows[pid] = []
+        for number in range(pid * 1000, pid * 1000 + windows):
+            x, y = rng.integers(0, 2000), rng.integers(0, 1200)
+            width, height = rng.integers(200, 900), rng.integers(150, 700)
+            bounds = (int(x), int(y), int(width), int(height))
+            entries.append({"pid": pid, "bounds": bounds, "visible": [bounds], "window_number": number})
+            ax_windows[pid].append(((x + rng.random(), y, x + width, y + height), number))
+    return entries, ax_windows
+
+
+def greedy(entries, ax_windows):
+    matches = {}
+    for pid, windows in ax_windows.items():
+        cg_entries = [e for e in entries if e["pid"] == pid]
+        for rect, number in windows:
+            best = None
+            best_iou = 0.0
+            for entry in cg_entries:
+                x, y, w, h = entry["bounds"]
+                iou = _iou(rect, (x, y, x + w, y + h))
+                if iou > best_iou:
+                    best, best_iou = entry, iou
+            matches[number] = best
+    return matches
+
+
+def one_to_one(entries, ax_windows, use_numbers):
+    index = VisibleWindowIndex(entries)
+    matches = {}
+    for pid, windows in ax_windows.items():
+        numbers = [number for _, number in windows] if use_numbers else None
+        found = match_windows([rect for rect, _ in windows], index.for_pid(pid), numbers)
+        matches.update(zip([number for _, number in windows], found))
+    return matches
+
+
+def _timed(function, *args, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    correct = sum(1 for number, entry in result.items() if entry is not None and entry["window_number"] == number)
+    return best * 1000, correct
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'layout':<20}{'greedy':>18}{'by number':>18}{'by IoU':>18}")
+    for apps, windows in LAYOUTS:
+        entries, ax_windows = layout(apps, windows, args.seed)
+        columns = [
+            _timed(greedy, entries, ax_windows),
+            _timed(one_to_one, entries, ax_windows, True),
+            _timed(one_to_one, entries, ax_windows, False),
+        ]
+        cells = "".join(f"{f'{ms:.1f} ms ({correct})':>18}" for ms, correct in columns)
+        print(f"{f'{apps} apps x {windows}':<20}{cells}")
+    print("(n) is the number of windows matched to their own entry")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,10 @@
-from .extractor import extract_window
+from . import backend
 from . import uielement
-from . import files
-from .run import get_tree, get_tree_screenshot, get_app_bundle
\ No newline at end of file
+
+try:
+    from .extractor import extract_window
+    from . import files
+    from .run import get_tree, get_tree_screenshot, get_app_bundle
+except ImportError:
+    # pyobjc is macOS-only; backends and recorded trees stay usable without it
+    pass
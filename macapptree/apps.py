@@ -1,7 +1,6 @@
-import ApplicationServices
-import macapptree.uielement as uielement
+from macapptree import backend
+from macapptree import readiness
 import subprocess
-from time import sleep
 import Quartz
 import AppKit
 from typing import List, Dict, Tuple
@@ -74,21 +73,19 @@ def list_visible_app_bundles(extras_exclude: set[str] | None = None) -> list[str
 
 
 def application_for_process_id(pid):
-    return ApplicationServices.AXUIElementCreateApplication(pid)
+    return backend.get_backend().application(pid)
 
 
 # get windows for application
 def windows_for_application(app):
-    err, value = ApplicationServices.AXUIElementCopyAttributeValue(
-        app, ApplicationServices.kAXWindowsAttribute, None
-    )
-    if err != ApplicationServices.kAXErrorSuccess:
-        if err == ApplicationServices.kAXErrorNotImplemented:
+    err, value = backend.get_backend().copy_attribute(app, backend.AX_WINDOWS)
+    if err != backend.AX_ERROR_SUCCESS:
+        if err == backend.AX_ERROR_NOT_IMPLEMENTED:
             print("Attribute not implemented")
         else:
             print("Error retrieving attribute")
         return []
-    return uielement.CFAttributeToPyObject(value)
+    return list(value)
 
 
 def application_for_bundle(app_bundle, workspace):
@@ -106,17 +103,24 @@ def check_app_running(workspace, app_bundle):
     return False
 
 
-# launch the application
-def launch_app(bundle_id):
+# launch the application and wait until it has finished launching and shows a window
+def launch_app(bundle_id, timeout=10.0, window_timeout=3.0):
     subprocess.check_call(["open", "-b", bundle_id])
-    sleep(3)
+    workspace = AppKit.NSWorkspace.sharedWorkspace()
+    app = readiness.wait_until(readiness.app_launched(bundle_id, workspace), timeout, f"launch {bundle_id}")
+    if app is None:
+        print(f"App {bundle_id} did not finish launching in {timeout}s")
+        return
+    # apps without windows, e.g. menu bar extras, are given window_timeout
+    application = application_for_process_id(app.processIdentifier())
+    readiness.wait_until(readiness.app_has_windows(application), window_timeout, f"windows {bundle_id}")
 
 def dock_ax_application():
     import AppKit
     workspace = AppKit.NSWorkspace.sharedWorkspace()
     for app in workspace.runningApplications():
         if app.bundleIdentifier() == DOCK_BUNDLE:
-            return ApplicationServices.AXUIElementCreateApplication(app.processIdentifier())
+            return application_for_process_id(app.processIdentifier())
     return None
 
 def get_visible_windows_for_bundles(bundle_ids: List[str]) -> List[Dict]:
@@ -0,0 +1,749 @@
+import contextvars
+import json
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+try:
+    import ApplicationServices
+    import Foundation
+    import AppKit
+    # mutable array class of the attribute values; bound here because the name would be mangled in a class body
+    _NSArrayM = getattr(Foundation, "__NSArrayM", Foundation.NSArray)
+except ImportError:
+    # pyobjc is only available on macOS; recorded trees can still be replayed without it
+    ApplicationServices = None
+    Foundation = None
+    AppKit = None
+    _NSArrayM = None
+
+
+# accessibility attribute names (same strings as the kAX*Attribute constants)
+AX_ROLE = "AXRole"
+AX_SUBROLE = "AXSubrole"
+AX_TITLE = "AXTitle"
+AX_ENABLED = "AXEnabled"
+AX_POSITION = "AXPosition"
+AX_SIZE = "AXSize"
+AX_DESCRIPTION = "AXDescription"
+AX_ROLE_DESCRIPTION = "AXRoleDescription"
+AX_VALUE = "AXValue"
+AX_CHILDREN = "AXChildren"
+AX_VISIBLE_CHILDREN = "AXVisibleChildren"
+AX_PARENT = "AXParent"
+AX_WINDOW = "AXWindow"
+AX_WINDOWS = "AXWindows"
+AX_MENU_BAR = "AXMenuBar"
+
+# accessibility notification names (same strings as the kAX*Notification constants)
+AX_VALUE_CHANGED_NOTIFICATION = "AXValueChanged"
+AX_CREATED_NOTIFICATION = "AXCreated"
+AX_UI_ELEMENT_DESTROYED_NOTIFICATION = "AXUIElementDestroyed"
+AX_WINDOW_MOVED_NOTIFICATION = "AXWindowMoved"
+AX_WINDOW_RESIZED_NOTIFICATION = "AXWindowResized"
+AX_FOCUSED_UI_ELEMENT_CHANGED_NOTIFICATION = "AXFocusedUIElementChanged"
+
+# AXValue types (same values as the kAXValue*Type constants)
+AX_VALUE_CGPOINT = 1
+AX_VALUE_CGSIZE = 2
+AX_VALUE_AXERROR = 5
+
+# AXError codes
+AX_ERROR_SUCCESS = 0
+AX_ERROR_FAILURE = -25200
+AX_ERROR_CANNOT_COMPLETE = -25204
+AX_ERROR_ATTRIBUTE_UNSUPPORTED = -25205
+AX_ERROR_NOT_IMPLEMENTED = -25208
+AX_ERROR_NO_VALUE = -25212
+
+
+# convert CF attribute to python object
+def CFAttributeToPyObject(attrValue):
+    def list_helper(list_value):
+        list_builder = []
+        for item in list_value:
+            list_builder.append(CFAttributeToPyObject(item))
+        return list_builder
+
+    def number_helper(number_value):
+        success, int_value = Foundation.CFNumberGetValue(
+            number_value, Foundation.kCFNumberIntType, None
+        )
+        if success:
+            return int(int_value)
+
+        success, float_value = Foundation.CFNumberGetValue(
+            number_value, Foundation.kCFNumberDoubleType, None
+        )
+        if success:
+            return float(float_value)
+        return None
+
+    def axuielement_helper(element_value):
+        return element_value
+
+    cf_attr_type = Foundation.CFGetTypeID(attrValue)
+    cf_type_mapping = {
+        Foundation.CFStringGetTypeID(): str,
+        Foundation.CFBooleanGetTypeID(): bool,
+        Foundation.CFArrayGetTypeID(): list_helper,
+        Foundation.CFNumberGetTypeID(): number_helper,
+        ApplicationServices.AXUIElementGetTypeID(): axuielement_helper,
+    }
+    try:
+        return cf_type_mapping[cf_attr_type](attrValue)
+    except KeyError:
+        # did not get a supported CF type. Move on to AX type
+        pass
+
+    ax_attr_type = ApplicationServices.AXValueGetType(attrValue)
+    ax_type_map = {
+        ApplicationServices.kAXValueCGSizeType: Foundation.NSSizeFromString,
+        ApplicationServices.kAXValueCGPointType: Foundation.NSPointFromString,
+        ApplicationServices.kAXValueCFRangeType: Foundation.NSRangeFromString,
+    }
+    try:
+        extracted_str = re.search("{.*}", attrValue.description()).group()
+        return tuple(ax_type_map[ax_attr_type](extracted_str))
+    except KeyError:
+        return None
+
+
+# whether the value is an NSDate, without a live backend: offline backends never return one
+def is_date(value):
+    return AppKit is not None and isinstance(value, AppKit.NSDate)
+
+
+# point and size used by the offline backends in place of CGPoint/CGSize
+class Point:
+    __slots__ = ("x", "y")
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+    def __eq__(self, other):
+        return isinstance(other, Point) and self.x == other.x and self.y == other.y
+
+    def __copy__(self):
+        return Point(self.x, self.y)
+
+    def __repr__(self):
+        return f"Point(x={self.x}, y={self.y})"
+
+
+class Size:
+    __slots__ = ("width", "height")
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+    def __eq__(self, other):
+        return isinstance(other, Size) and self.width == other.width and self.height == other.height
+
+    def __copy__(self):
+        return Size(self.width, self.height)
+
+    def __repr__(self):
+        return f"Size(width={self.width}, height={self.height})"
+
+
+# interface for everything that talks to the accessibility API
+class AXBackend:
+    # returns (error code, value) for the attribute
+    def copy_attribute(self, element, attribute):
+        raise NotImplementedError
+
+    # returns a list of (error code, value) for the attributes, one round trip where supported
+    def copy_multiple_attributes(self, element, attributes):
+        return [self.copy_attribute(element, attribute) for attribute in attributes]
+
+    # returns the children of the element or None
+    def children(self, element):
+        raise NotImplementedError
+
+    # returns the action names of the element
+    def action_names(self, element):
+        raise NotImplementedError
+
+    # returns the attribute names of the element
+    def attribute_names(self, element):
+        raise NotImplementedError
+
+    # unpacks an AXValue of the given type (point or size)
+    def ax_value(self, value, value_type):
+        raise NotImplementedError
+
+    def application(self, pid):
+        raise NotImplementedError
+
+    def system_wide(self):
+        raise NotImplementedError
+
+    # returns the element at the screen position or None
+    def element_at_position(self, x, y):
+        raise NotImplementedError
+
+    def is_element(self, value):
+        raise NotImplementedError
+
+    def is_array(self, value):
+        return isinstance(value, (list, tuple))
+
+    def is_date(self, value):
+        return False
+
+    # bound how long calls on the element wait for the app to reply, for an application element
+    # this covers every element of the app. returns an error code
+    def set_messaging_timeout(self, element, seconds):
+        return AX_ERROR_SUCCESS
+
+    # returns the window server id (CGWindowID) of a window element, None when unknown
+    def window_number(self, element):
+        return None
+
+    # returns the attribute value or None on error
+    def attribute(self, element, attribute):
+        err, value = self.copy_attribute(element, attribute)
+        if err == AX_ERROR_SUCCESS:
+            return value
+        return None
+
+    # returns {attribute: value} with None for attributes that failed
+    def attributes(self, element, attributes):
+        replies = self.copy_multiple_attributes(element, attributes)
+        return {
+            attribute: value if err == AX_ERROR_SUCCESS else None
+            for attribute, (err, value) in zip(attributes, replies)
+        }
+
+
+# backend calling the accessibility API through pyobjc
+class LiveAXBackend(AXBackend):
+    def __init__(self):
+        if ApplicationServices is None:
+            raise RuntimeError("pyobjc is required for the live accessibility backend")
+
+    def copy_attribute(self, element, attribute):
+        err, value = ApplicationServices.AXUIElementCopyAttributeValue(
+            element, attribute, None
+        )
+        if err == ApplicationServices.kAXErrorSuccess and isinstance(value, _NSArrayM):
+            value = CFAttributeToPyObject(value)
+        return err, value
+
+    def copy_multiple_attributes(self, element, attributes):
+        err, values = ApplicationServices.AXUIElementCopyMultipleAttributeValues(
+            element, attributes, 0, None
+        )
+        if err != ApplicationServices.kAXErrorSuccess or values is None or len(values) != len(attributes):
+            return super().copy_multiple_attributes(element, attributes)
+
+        replies = []
+        for attribute, value in zip(attributes, values):
+            if self._is_error_value(value):
+                _, code = ApplicationServices.AXValueGetValue(value, AX_VALUE_AXERROR, None)
+                if code in (AX_ERROR_NO_VALUE, AX_ERROR_ATTRIBUTE_UNSUPPORTED):
+                    replies.append((code, None))
+                else:
+                    # transient error, retry the single attribute
+                    replies.append(self.copy_attribute(element, attribute))
+                continue
+            if isinstance(value, _NSArrayM):
+                value = CFAttributeToPyObject(value)
+            replies.append((ApplicationServices.kAXErrorSuccess, value))
+        return replies
+
+    @staticmethod
+    def _is_error_value(value):
+        return (
+            isinstance(value, ApplicationServices.AXValueRef)
+            and ApplicationServices.AXValueGetType(value) == AX_VALUE_AXERROR
+        )
+
+    def children(self, element):
+        err, value = ApplicationServices.AXUIElementCopyAttributeValues(
+            element, ApplicationServices.kAXChildrenAttribute, 0, 999, None
+        )
+        if err == ApplicationServices.kAXErrorSuccess:
+            if isinstance(value, _NSArrayM):
+                return CFAttributeToPyObject(value)
+            return value
+        return self.attribute(element, ApplicationServices.kAXChildrenAttribute)
+
+    def action_names(self, element):
+        err, actions = ApplicationServices.AXUIElementCopyActionNames(element, None)
+        if err == 0 and actions is not None and len(actions) > 0:
+            return actions
+        return []
+
+    def attribute_names(self, element):
+        err, value = ApplicationServices.AXUIElementCopyAttributeNames(element, None)
+        if err == ApplicationServices.kAXErrorSuccess:
+            return value
+        return []
+
+    def ax_value(self, value, value_type):
+        err, result = ApplicationServices.AXValueGetValue(value, value_type, None)
+        if err == True:
+            return result
+        return None
+
+    def application(self, pid):
+        return ApplicationServices.AXUIElementCreateApplication(pid)
+
+    def system_wide(self):
+        return ApplicationServices.AXUIElementCreateSystemWide()
+
+    def element_at_position(self, x, y):
+        err, value = ApplicationServices.AXUIElementCopyElementAtPosition(
+            self.system_wide(), x, y, None
+        )
+        if err == ApplicationServices.kAXErrorSuccess:
+            return value
+        return None
+
+    def is_element(self, value):
+        return isinstance(value, ApplicationServices.AXUIElementRef)
+
+    def is_array(self, value):
+        return isinstance(value, (list, tuple, Foundation.NSArray))
+
+    def is_date(self, value):
+        return is_date(value)
+
+    def set_messaging_timeout(self, element, seconds):
+        return ApplicationServices.AXUIElementSetMessagingTimeout(element, seconds)
+
+    def window_number(self, element):
+        get_window = _ax_get_window()
+        if get_window is None:
+            return None
+        err, number = get_window(element, None)
+        if err == ApplicationServices.kAXErrorSuccess and number:
+            return int(number)
+        return None
+
+
+_ax_functions = None
+
+
+# _AXUIElementGetWindow is private but stable, it maps window elements to CGWindowIDs
+def _ax_get_window():
+    global _ax_functions
+    if _ax_functions is None:
+        _ax_functions = {}
+        try:
+            import objc
+            bundle = Foundation.NSBundle.bundleWithIdentifier_("com.apple.HIServices")
+            objc.loadBundleFunctions(bundle, _ax_functions, [("_AXUIElementGetWindow", b"i^{__AXUIElement=}o^I")])
+        except Exception:
+            # not available on this system, windows are matched by their frames
+            pass
+    return _ax_functions.get("_AXUIElementGetWindow")
+
+
+# forwards every call to another backend, base for wrappers
+class DelegatingAXBackend(AXBackend):
+    def __init__(self, backend=None):
+        self.backend = backend or LiveAXBackend()
+
+    def copy_attribute(self, element, attribute):
+        return self.backend.copy_attribute(element, attribute)
+
+    def copy_multiple_attributes(self, element, attributes):
+        return self.backend.copy_multiple_attributes(element, attributes)
+
+    def children(self, element):
+        return self.backend.children(element)
+
+    def action_names(self, element):
+        return self.backend.action_names(element)
+
+    def attribute_names(self, element):
+        return self.backend.attribute_names(element)
+
+    def ax_value(self, value, value_type):
+        return self.backend.ax_value(value, value_type)
+
+    def application(self, pid):
+        return self.backend.application(pid)
+
+    def system_wide(self):
+        return self.backend.system_wide()
+
+    def element_at_position(self, x, y):
+        return self.backend.element_at_position(x, y)
+
+    def is_element(self, value):
+        return self.backend.is_element(value)
+
+    def is_array(self, value):
+        return self.backend.is_array(value)
+
+    def is_date(self, value):
+        return self.backend.is_date(value)
+
+    def set_messaging_timeout(self, element, seconds):
+        return self.backend.set_messaging_timeout(element, seconds)
+
+    def window_number(self, element):
+        return self.backend.window_number(element)
+
+
+# counts the cross-process round trips made through the wrapped backend
+class CountingAXBackend(DelegatingAXBackend):
+    def __init__(self, backend=None):
+        super().__init__(backend)
+        self.calls = Counter()
+        self.attribute_calls = Counter()
+
+    @property
+    def round_trips(self):
+        return sum(self.calls.values())
+
+    def reset(self):
+        self.calls.clear()
+        self.attribute_calls.clear()
+
+    def copy_attribute(self, element, attribute):
+        self.calls["copy_attribute"] += 1
+        self.attribute_calls[attribute] += 1
+        return super().copy_attribute(element, attribute)
+
+    def copy_multiple_attributes(self, element, attributes):
+        self.calls["copy_multiple_attributes"] += 1
+        self.attribute_calls.update(attributes)
+        return super().copy_multiple_attributes(element, attributes)
+
+    def children(self, element):
+        self.calls["children"] += 1
+        self.attribute_calls[AX_CHILDREN] += 1
+        return super().children(element)
+
+    def action_names(self, element):
+        self.calls["action_names"] += 1
+        return super().action_names(element)
+
+    def attribute_names(self, element):
+        self.calls["attribute_names"] += 1
+        return super().attribute_names(element)
+
+    def element_at_position(self, x, y):
+        self.calls["element_at_position"] += 1
+        return super().element_at_position(x, y)
+
+
+# remembers the replies of the wrapped backend so that every (element, attribute) pair crosses
+# IPC at most once. meant to live for one capture; transient errors are not remembered.
+class MemoAXBackend(DelegatingAXBackend):
+    _transient_errors = (AX_ERROR_FAILURE, AX_ERROR_CANNOT_COMPLETE)
+
+    def __init__(self, backend=None):
+        super().__init__(backend)
+        self._replies = {}
+        self._actions = {}
+        self._attribute_names = {}
+        # attribute -> replies fetched through the wrapped backend / served from the memo
+        self.fetched = Counter()
+        self.duplicates = Counter()
+
+    @property
+    def calls_saved(self):
+        return sum(self.duplicates.values())
+
+    def _remember(self, element, attribute, reply):
+        self.fetched[attribute] += 1
+        if reply[0] not in self._transient_errors:
+            self._replies[(element, attribute)] = reply
+        return reply
+
+    def copy_attribute(self, element, attribute):
+        reply = self._replies.get((element, attribute))
+        if reply is not None:
+            self.duplicates[attribute] += 1
+            return reply
+        return self._remember(element, attribute, self.backend.copy_attribute(element, attribute))
+
+    def copy_multiple_attributes(self, element, attributes):
+        replies = [self._replies.get((element, attribute)) for attribute in attributes]
+        missing = [attribute for attribute, reply in zip(attributes, replies) if reply is None]
+        for attribute, reply in zip(attributes, replies):
+            if reply is not None:
+                self.duplicates[attribute] += 1
+        if not missing:
+            return replies
+        fetched = iter(self.backend.copy_multiple_attributes(element, missing))
+        return [
+            reply if reply is not None else self._remember(element, attribute, next(fetched))
+            for attribute, reply in zip(attributes, replies)
+        ]
+
+    def children(self, element):
+        reply = self._replies.get((element, AX_CHILDREN))
+        if reply is not None:
+            self.duplicates[AX_CHILDREN] += 1
+            return reply[1]
+        value = self.backend.children(element)
+        reply = (AX_ERROR_SUCCESS, value) if value is not None else (AX_ERROR_NO_VALUE, None)
+        return self._remember(element, AX_CHILDREN, reply)[1]
+
+    def action_names(self, element):
+        if element in self._actions:
+            self.duplicates["actions"] += 1
+            return self._actions[element]
+        self.fetched["actions"] += 1
+        value = self._actions[element] = self.backend.action_names(element)
+        return value
+
+    def attribute_names(self, element):
+        if element in self._attribute_names:
+            self.duplicates["attribute_names"] += 1
+            return self._attribute_names[element]
+        self.fetched["attribute_names"] += 1
+        value = self._attribute_names[element] = self.backend.attribute_names(element)
+        return value
+
+
+# wraps another backend and records every reply so it can be replayed later
+class RecordingAXBackend(DelegatingAXBackend):
+    def __init__(self, backend=None, path=None):
+        super().__init__(backend)
+        self.path = path
+        self._ids = {}
+        self.elements = {}
+        self.applications = {}
+        self.positions = {}
+
+    def _element_id(self, element):
+        element_id = self._ids.get(element)
+        if element_id is None:
+            element_id = len(self._ids)
+            self._ids[element] = element_id
+            self.elements[element_id] = {"attributes": {}}
+        return element_id
+
+    def _record(self, element):
+        return self.elements[self._element_id(element)]
+
+    def _encode(self, value):
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return value
+        if self.backend.is_element(value):
+            return {"$element": self._element_id(value)}
+        if self.backend.is_array(value):
+            return [self._encode(item) for item in value]
+        if self.backend.is_date(value):
+            return str(value)
+        try:
+            point = self.backend.ax_value(value, AX_VALUE_CGPOINT)
+            if point is not None:
+                return {"$point": [point.x, point.y]}
+            size = self.backend.ax_value(value, AX_VALUE_CGSIZE)
+            if size is not None:
+                return {"$size": [size.width, size.height]}
+        except Exception:
+            # not an AXValue
+            pass
+        return str(value)
+
+    def copy_attribute(self, element, attribute):
+        err, value = self.backend.copy_attribute(element, attribute)
+        self._record(element)["attributes"][attribute] = [
+            err, self._encode(value) if err == AX_ERROR_SUCCESS else None
+        ]
+        return err, value
+
+    def copy_multiple_attributes(self, element, attributes):
+        replies = self.backend.copy_multiple_attributes(element, attributes)
+        record = self._record(element)["attributes"]
+        for attribute, (err, value) in zip(attributes, replies):
+            record[attribute] = [err, self._encode(value) if err == AX_ERROR_SUCCESS else None]
+        return replies
+
+    def children(self, element):
+        value = self.backend.children(element)
+        self._record(element)["children"] = self._encode(value)
+        return value
+
+    def action_names(self, element):
+        value = self.backend.action_names(element)
+        self._record(element)["actions"] = [str(action) for action in value]
+        return value
+
+    def attribute_names(self, element):
+        value = self.backend.attribute_names(element)
+        self._record(element)["attribute_names"] = [str(name) for name in value]
+        return value
+
+    def window_number(self, element):
+        value = self.backend.window_number(element)
+        self._record(element)["window_number"] = value
+        return value
+
+    def application(self, pid):
+        element = self.backend.application(pid)
+        self.applications[str(pid)] = self._element_id(element)
+        return element
+
+    def element_at_position(self, x, y):
+        value = self.backend.element_at_position(x, y)
+        self.positions[f"{x};{y}"] = self._encode(value)
+        return value
+
+    def to_dict(self):
+        return {
+            "elements": {str(k): v for k, v in self.elements.items()},
+            "applications": self.applications,
+            "positions": self.positions,
+        }
+
+    def save(self, path=None):
+        path = path or self.path
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        return path
+
+
+# element handle returned by the replay backend
+class ReplayElement:
+    __slots__ = ("element_id",)
+
+    def __init__(self, element_id):
+        self.element_id = element_id
+
+    def __eq__(self, other):
+        return isinstance(other, ReplayElement) and self.element_id == other.element_id
+
+    def __hash__(self):
+        return hash(self.element_id)
+
+    def __repr__(self):
+        return f"ReplayElement({self.element_id})"
+
+
+# answers accessibility calls from a recording, optionally with a simulated per-call latency
+class ReplayAXBackend(AXBackend):
+    def __init__(self, recording, latency=0.0):
+        if isinstance(recording, str):
+            with open(recording, encoding="utf-8") as f:
+                recording = json.load(f)
+        self.elements = recording["elements"]
+        self.applications = recording.get("applications", {})
+        self.positions = recording.get("positions", {})
+        self.latency = latency
+
+    def _wait(self):
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def _decode(self, value):
+        if isinstance(value, list):
+            return [self._decode(item) for item in value]
+        if isinstance(value, dict):
+            if "$element" in value:
+                return ReplayElement(value["$element"])
+            if "$point" in value:
+                return Point(*value["$point"])
+            if "$size" in value:
+                return Size(*value["$size"])
+        return value
+
+    def _record(self, element):
+        return self.elements.get(str(element.element_id), {})
+
+    def _reply(self, element, attribute):
+        record = self._record(element)
+        reply = record.get("attributes", {}).get(attribute)
+        if reply is None and attribute == AX_CHILDREN and "children" in record:
+            reply = [AX_ERROR_SUCCESS, record["children"]]
+        if reply is None:
+            return AX_ERROR_NO_VALUE, None
+        err, value = reply
+        return err, self._decode(value)
+
+    def copy_attribute(self, element, attribute):
+        self._wait()
+        return self._reply(element, attribute)
+
+    def copy_multiple_attributes(self, element, attributes):
+        self._wait()
+        return [self._reply(element, attribute) for attribute in attributes]
+
+    def children(self, element):
+        self._wait()
+        record = self._record(element)
+        if "children" in record:
+            return self._decode(record["children"])
+        return self.attribute(element, AX_CHILDREN)
+
+    def action_names(self, element):
+        self._wait()
+        return list(self._record(element).get("actions", []))
+
+    def attribute_names(self, element):
+        self._wait()
+        record = self._record(element)
+        return list(record.get("attribute_names", record.get("attributes", {}).keys()))
+
+    def ax_value(self, value, value_type):
+        if value_type == AX_VALUE_CGPOINT and isinstance(value, Point):
+            return Point(value.x, value.y)
+        if value_type == AX_VALUE_CGSIZE and isinstance(value, Size):
+            return Size(value.width, value.height)
+        return None
+
+    def window_number(self, element):
+        return self._record(element).get("window_number")
+
+    def application(self, pid):
+        element_id = self.applications.get(str(pid))
+        if element_id is None:
+            return None
+        return ReplayElement(element_id)
+
+    def system_wide(self):
+        return None
+
+    def element_at_position(self, x, y):
+        self._wait()
+        return self._decode(self.positions.get(f"{x};{y}"))
+
+    def is_element(self, value):
+        return isinstance(value, ReplayElement)
+
+
+_backend = None
+# backend installed by use_backend; context-local so that concurrent captures on other threads
+# neither see it nor restore each other's backend
+_context_backend = contextvars.ContextVar("macapptree_backend", default=None)
+
+
+# get the backend used for all accessibility calls
+def get_backend():
+    backend = _context_backend.get()
+    if backend is not None:
+        return backend
+    global _backend
+    if _backend is None:
+        _backend = LiveAXBackend()
+    return _backend
+
+
+# set the process-wide backend, used where no use_backend block is active
+def set_backend(backend):
+    global _backend
+    _backend = backend
+
+
+# temporarily switch the accessibility backend for the current thread or task.
+# threads started inside the block do not inherit it, run them in contextvars.copy_context()
+@contextmanager
+def use_backend(backend):
+    token = _context_backend.set(backend)
+    try:
+        yield backend
+    finally:
+        _context_backend.reset(token)
@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from macapptree.backend import DelegatingAXBackend, get_backend, use_backend
+
+
+DEADLINE = "deadline"
+MAX_NODES = "max_nodes"
+MAX_ATTRIBUTE_CALLS = "max_attribute_calls"
+
+
+# limits on the work of a capture. once a limit is hit the traversal stops expanding nodes
+# and marks the ones it did not expand as truncated, so the result is a well-formed partial tree.
+class CaptureBudget:
+    def __init__(self, deadline=None, max_nodes=None, max_attribute_calls=None, clock=time.monotonic):
+        self.deadline = deadline
+        self.max_nodes = max_nodes
+        self.max_attribute_calls = max_attribute_calls
+        self.clock = clock
+        self.nodes = 0
+        self.attribute_calls = 0
+        self.truncated = 0
+        self.reason = None
+        # where the budget went: nodes per role and calls made to expand nodes of each role
+        self.nodes_by_role = Counter()
+        self.calls_by_role = Counter()
+        self._start = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self._start is None:
+            self._start = self.clock()
+        return self
+
+    @property
+    def elapsed(self):
+        if self._start is None:
+            return 0.0
+        return self.clock() - self._start
+
+    # name of the limit that was hit, or None
+    def exhausted(self):
+        if self.reason is None:
+            if self.deadline is not None and self.elapsed >= self.deadline:
+                self.reason = DEADLINE
+            elif self.max_nodes is not None and self.nodes >= self.max_nodes:
+                self.reason = MAX_NODES
+            elif self.max_attribute_calls is not None and self.attribute_calls >= self.max_attribute_calls:
+                self.reason = MAX_ATTRIBUTE_CALLS
+        return self.reason
+
+    def charge_node(self, role):
+        with self._lock:
+            self.nodes += 1
+            self.nodes_by_role[role] += 1
+
+    def charge_calls(self, count=1):
+        with self._lock:
+            self.attribute_calls += count
+
+    def mark_truncated(self):
+        with self._lock:
+            self.truncated += 1
+
+    # backend wrapper counting the calls that reach the wrapped backend
+    def track(self, backend):
+        return BudgetAXBackend(backend, self)
+
+    def stats(self):
+        return {
+            "reason": self.reason,
+            "elapsed": self.elapsed,
+            "nodes": self.nodes,
+            "attribute_calls": self.attribute_calls,
+            "truncated": self.truncated,
+            "nodes_by_role": dict(self.nodes_by_role.most_common()),
+            "calls_by_role": dict(self.calls_by_role.most_common()),
+        }
+
+    def __repr__(self):
+        return (f"CaptureBudget(reason={self.reason}, elapsed={self.elapsed:.3f}, nodes={self.nodes}, "
+                f"attribute_calls={self.attribute_calls}, truncated={self.truncated})")
+
+
+# charges every call to the capture budget
+class BudgetAXBackend(DelegatingAXBackend):
+    def __init__(self, backend, budget):
+        super().__init__(backend)
+        self.budget = budget
+
+    def copy_attribute(self, element, attribute):
+        self.budget.charge_calls()
+        return super().copy_attribute(element, attribute)
+
+    def copy_multiple_attributes(self, element, attributes):
+        self.budget.charge_calls()
+        return super().copy_multiple_attributes(element, attributes)
+
+    def children(self, element):
+        self.budget.charge_calls()
+        return super().children(element)
+
+    def action_names(self, element):
+        self.budget.charge_calls()
+        return super().action_names(element)
+
+    def attribute_names(self, element):
+        self.budget.charge_calls()
+        return super().attribute_names(element)
+
+    def element_at_position(self, x, y):
+        self.budget.charge_calls()
+        return super().element_at_position(x, y)
+
+
+# count the calls of the current backend against the budget, unless they already are
+@contextmanager
+def tracking(budget):
+    current = get_backend()
+    backend = current if budget is not None else None
+    while backend is not None:
+        if getattr(backend, "budget", None) is budget:
+            break
+        backend = getattr(backend, "backend", None)
+    if budget is None or backend is not None:
+        yield current
+        return
+    with use_backend(budget.track(current)) as tracked:
+        yield tracked
@@ -0,0 +1,150 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+# rough size of one built UIElement with its attributes, used for the memory bound
+BYTES_PER_NODE = 1200
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.invalidations = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.reused_nodes = 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def to_dict(self):
+        result = dict(vars(self))
+        result["hit_rate"] = self.hit_rate
+        return result
+
+    def __repr__(self):
+        return (f"CacheStats(hits={self.hits}, misses={self.misses}, stores={self.stores}, "
+                f"invalidations={self.invalidations}, expirations={self.expirations}, "
+                f"evictions={self.evictions}, reused_nodes={self.reused_nodes})")
+
+
+class _Entry:
+    __slots__ = ("signal", "children", "action_items", "nodes", "charged", "created")
+
+    def __init__(self, signal, children, action_items, nodes, charged, created):
+        self.signal = signal
+        self.children = children
+        self.action_items = action_items
+        self.nodes = nodes
+        self.charged = charged
+        self.created = created
+
+
+# children of previously built nodes, keyed by accessibility element.
+# an entry is reused while the node has the same position, size and child elements and the same
+# offset, visible bbox and depth limit; changes deeper in the subtree are only picked up once the
+# entry expires. the reused subtrees are shared with the earlier capture.
+class SubtreeCache:
+    def __init__(self, max_entries=10000, ttl=30.0, max_bytes=None, min_nodes=8, uncached_roles=("AXWindow",),
+                 clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.min_nodes = min_nodes
+        # windows are always fetched so that their direct layout is current
+        self.uncached_roles = set(uncached_roles)
+        self.clock = clock
+        self.stats = CacheStats()
+        self._entries = OrderedDict()
+        self._nodes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    # approximate memory held by the cached subtrees.
+    # an entry is charged for the nodes not already held by the entries of its descendants.
+    @property
+    def nbytes(self):
+        return self._nodes * BYTES_PER_NODE
+
+    def cacheable(self, node):
+        return node.role not in self.uncached_roles
+
+    @staticmethod
+    def signal(node):
+        position = node._start_position
+        return (
+            (position.x, position.y) if position is not None else None,
+            (node.size.width, node.size.height) if node.size is not None else None,
+            tuple(node._children_hint or ()),
+            node._offset,
+            tuple(node.visible_bbox) if node.visible_bbox else None,
+            node.max_depth,
+        )
+
+    # entry for the element from an earlier capture if it is still valid, or None
+    def lookup(self, element, signal):
+        with self._lock:
+            entry = self._entries.get(element)
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            if self.ttl is not None and self.clock() - entry.created > self.ttl:
+                self._remove(element)
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return None
+            if entry.signal != signal:
+                self._remove(element)
+                self.stats.invalidations += 1
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(element)
+            self.stats.hits += 1
+            self.stats.reused_nodes += entry.nodes - 1
+            return entry
+
+    # remember the children of a node whose subtree was just built, children are stored first
+    def store(self, node, signal):
+        nodes = 1 + sum(getattr(child, "_subtree_nodes", 1) for child in node.children)
+        uncharged = 1 + sum(getattr(child, "_uncharged_nodes", 1) for child in node.children)
+        node._subtree_nodes = nodes
+        node._uncharged_nodes = uncharged
+        if nodes < self.min_nodes:
+            return
+        node._uncharged_nodes = 0
+        entry = _Entry(signal, list(node.children), list(node.action_items), nodes, uncharged, self.clock())
+        with self._lock:
+            self._remove(node.ax_element)
+            self._entries[node.ax_element] = entry
+            self._nodes += uncharged
+            self.stats.stores += 1
+            self._evict()
+
+    def invalidate(self, element=None):
+        with self._lock:
+            if element is None:
+                self._entries.clear()
+                self._nodes = 0
+            else:
+                self._remove(element)
+
+    def _remove(self, element):
+        entry = self._entries.pop(element, None)
+        if entry is not None:
+            self._nodes -= entry.charged
+
+    def _evict(self):
+        while self._entries and (
+            (self.max_entries is not None and len(self._entries) > self.max_entries)
+            or (self.max_bytes is not None and self.nbytes > self.max_bytes)
+        ):
+            _, entry = self._entries.popitem(last=False)
+            self._nodes -= entry.charged
+            self.stats.evictions += 1
@@ -0,0 +1,247 @@
+import contextvars
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+from PIL import Image
+
+try:
+    import Quartz
+    import AppKit
+except ImportError:
+    # pyobjc is only available on macOS; synthetic frames can still be captured without it
+    Quartz = None
+    AppKit = None
+
+
+# interface for everything that produces screen pixels.
+# areas are (x, y, width, height) in screen points, images are RGB in device pixels.
+class CaptureSource:
+    # device pixels per point
+    scale = 1.0
+
+    # (x, y, width, height) of the main screen in points
+    def screen_bounds(self):
+        raise NotImplementedError
+
+    # bounds of every display in points, the main display first
+    def displays(self):
+        return [self.screen_bounds()]
+
+    # forget pixels kept from earlier grabs because the screen changed
+    def refresh(self):
+        pass
+
+    # RGB uint8 array of shape (height, width, 3) for the area, None for the whole screen
+    def grab_array(self, bounds=None):
+        raise NotImplementedError
+
+    # pixels of a single window; by default what the screen shows in its bounds
+    def grab_window_array(self, window_id, bounds):
+        return self.grab_array(bounds)
+
+    def grab(self, bounds=None):
+        return Image.fromarray(self.grab_array(bounds))
+
+    def grab_window(self, window_id, bounds):
+        return Image.fromarray(self.grab_window_array(window_id, bounds))
+
+
+# pixels straight from the window server, without a subprocess or a file
+class QuartzCaptureSource(CaptureSource):
+    def __init__(self):
+        if Quartz is None:
+            raise RuntimeError("pyobjc is required for the Quartz capture source")
+
+    @property
+    def scale(self):
+        return AppKit.NSScreen.mainScreen().backingScaleFactor()
+
+    def screen_bounds(self):
+        frame = AppKit.NSScreen.mainScreen().frame()
+        return (frame.origin.x, frame.origin.y, frame.size.width, frame.size.height)
+
+    def displays(self):
+        err, display_ids, count = Quartz.CGGetActiveDisplayList(32, None, None)
+        if err != 0 or not count:
+            return [self.screen_bounds()]
+        result = []
+        for display_id in display_ids[:count]:
+            rect = Quartz.CGDisplayBounds(display_id)
+            result.append((rect.origin.x, rect.origin.y, rect.size.width, rect.size.height))
+        return result
+
+    def grab_array(self, bounds=None):
+        x, y, width, height = bounds if bounds is not None else self.screen_bounds()
+        image = Quartz.CGWindowListCreateImage(
+            Quartz.CGRectMake(x, y, width, height),
+            Quartz.kCGWindowListOptionOnScreenOnly,
+            Quartz.kCGNullWindowID,
+            Quartz.kCGWindowImageDefault,
+        )
+        return _cgimage_to_array(image)
+
+    # the window alone, including the parts covered by other windows
+    def grab_window_array(self, window_id, bounds):
+        image = Quartz.CGWindowListCreateImage(
+            Quartz.CGRectNull,
+            Quartz.kCGWindowListOptionIncludingWindow,
+            window_id,
+            Quartz.kCGWindowImageBoundsIgnoreFraming,
+        )
+        return _cgimage_to_array(image)
+
+
+def _cgimage_to_array(image):
+    if image is None:
+        raise RuntimeError("The window server returned no image, is screen recording allowed?")
+    width = Quartz.CGImageGetWidth(image)
+    height = Quartz.CGImageGetHeight(image)
+    bytes_per_row = Quartz.CGImageGetBytesPerRow(image)
+    data = Quartz.CGDataProviderCopyData(Quartz.CGImageGetDataProvider(image))
+    # rows are padded to bytes_per_row, pixels are BGRA
+    pixels = np.frombuffer(data, dtype=np.uint8).reshape(height, bytes_per_row // 4, 4)
+    return np.ascontiguousarray(pixels[:, :width, 2::-1])
+
+
+# serves areas of a fixed frame, e.g. a synthetic screen or an earlier screenshot.
+# the frame covers the screen area bounds (in points) at the given scale. areas inside the
+# frame are returned as views into it, not copies.
+class FrameCaptureSource(CaptureSource):
+    def __init__(self, frame, scale=1.0, bounds=None, windows=None):
+        if isinstance(frame, Image.Image):
+            frame = np.asarray(frame.convert("RGB"))
+        self.frame = frame
+        self.scale = scale
+        height, width = frame.shape[:2]
+        self.bounds = bounds or (0, 0, width / scale, height / scale)
+        # window id -> frame of that window alone
+        self.windows = dict(windows or {})
+
+    def screen_bounds(self):
+        return self.bounds
+
+    def grab_array(self, bounds=None):
+        if bounds is None:
+            return self.frame[:, :, :3]
+        x, y, width, height = bounds
+        left = int((x - self.bounds[0]) * self.scale)
+        top = int((y - self.bounds[1]) * self.scale)
+        right = int((x + width - self.bounds[0]) * self.scale)
+        bottom = int((y + height - self.bounds[1]) * self.scale)
+        frame_height, frame_width = self.frame.shape[:2]
+        if 0 <= left <= right <= frame_width and 0 <= top <= bottom <= frame_height:
+            return self.frame[top:bottom, left:right, :3]
+        # areas outside the frame are black, like off-screen areas
+        result = np.zeros((max(0, bottom - top), max(0, right - left), 3), dtype=np.uint8)
+        src_top, src_left = max(0, top), max(0, left)
+        src_bottom, src_right = min(frame_height, bottom), min(frame_width, right)
+        if src_bottom > src_top and src_right > src_left:
+            result[src_top - top:src_bottom - top, src_left - left:src_right - left] = \
+                self.frame[src_top:src_bottom, src_left:src_right, :3]
+        return result
+
+    def grab_window_array(self, window_id, bounds):
+        if window_id in self.windows:
+            return np.asarray(self.windows[window_id]).copy()
+        return self.grab_array(bounds)
+
+
+# grabs every display once and serves all the areas of a capture run from those frames, as views
+# into them. the crops of a run are consistent in time and no pixel is grabbed twice; windows
+# grabbed on their own still go to the wrapped source.
+class CaptureSession(CaptureSource):
+    def __init__(self, source=None):
+        self.source = source or get_source()
+        self.grabs = 0
+        self.crops = 0
+        self._frames = None
+        self._lock = threading.Lock()
+
+    @property
+    def scale(self):
+        return self.source.scale
+
+    def screen_bounds(self):
+        return self.source.screen_bounds()
+
+    def displays(self):
+        return [frame.bounds for frame in self.frames()]
+
+    # one FrameCaptureSource per display, grabbed on first use
+    def frames(self):
+        with self._lock:
+            if self._frames is None:
+                self._frames = []
+                for bounds in self.source.displays():
+                    frame = np.asarray(self.source.grab_array(bounds))
+                    # the crops share the frame
+                    frame.flags.writeable = False
+                    self.grabs += 1
+                    scale = frame.shape[1] / bounds[2] if bounds[2] else self.source.scale
+                    self._frames.append(FrameCaptureSource(frame, scale, bounds))
+            return self._frames
+
+    def refresh(self):
+        with self._lock:
+            self._frames = None
+        self.source.refresh()
+
+    def grab_array(self, bounds=None):
+        frames = self.frames()
+        self.crops += 1
+        if bounds is None:
+            return frames[0].grab_array()
+        return max(frames, key=lambda frame: _overlap(frame.bounds, bounds)).grab_array(bounds)
+
+    def grab_window_array(self, window_id, bounds):
+        return self.source.grab_window_array(window_id, bounds)
+
+    def __repr__(self):
+        return f"CaptureSession(grabs={self.grabs}, crops={self.crops})"
+
+
+def _overlap(a, b):
+    width = min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0])
+    height = min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1])
+    return max(0, width) * max(0, height)
+
+
+# crop a screen image to the window, coordinates are (x, y, width, height) in points
+def crop_to_window(image, window_coords, scale):
+    left, top, width, height = window_coords
+    right = left + width
+    bottom = top + height
+    return image.crop((int(left * scale), int(top * scale), int(right * scale), int(bottom * scale)))
+
+
+_source = None
+# source installed by use_source, context-local like the backend of macapptree.backend.use_backend
+_context_source = contextvars.ContextVar("macapptree_source", default=None)
+
+
+# get the source used for all screenshots
+def get_source():
+    source = _context_source.get()
+    if source is not None:
+        return source
+    global _source
+    if _source is None:
+        _source = QuartzCaptureSource()
+    return _source
+
+
+# set the process-wide source, used where no use_source block is active
+def set_source(source):
+    global _source
+    _source = source
+
+
+# temporarily switch the capture source for the current thread or task
+@contextmanager
+def use_source(source):
+    token = _context_source.set(source)
+    try:
+        yield source
+    finally:
+        _context_source.reset(token)
@@ -0,0 +1,70 @@
+import itertools
+import socket
+
+from macapptree.server import DEFAULT_SOCKET_PATH, encode_message, decode_message, decode_image
+
+
+class CaptureRejected(Exception):
+    pass
+
+
+# client for the capture server started with `python -m macapptree.server`
+class CaptureClient:
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH, timeout=None):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._ids = itertools.count()
+        self._sock = None
+        self._file = None
+
+    def connect(self):
+        if self._sock is None:
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._sock.settimeout(self.timeout)
+            self._sock.connect(self.socket_path)
+            self._file = self._sock.makefile("rb")
+        return self
+
+    def close(self):
+        if self._sock is not None:
+            self._file.close()
+            self._sock.close()
+            self._sock = None
+            self._file = None
+
+    def __enter__(self):
+        return self.connect()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # yields the server messages for the request as they arrive
+    def stream(self, bundles, max_depth=None, screenshots=False):
+        self.connect()
+        request_id = next(self._ids)
+        self._sock.sendall(encode_message({
+            "id": request_id,
+            "bundles": list(bundles),
+            "max_depth": max_depth,
+            "screenshots": screenshots,
+        }))
+        for line in self._file:
+            message = decode_message(line)
+            if message.get("id") != request_id:
+                continue
+            if message["type"] == "rejected":
+                raise CaptureRejected(message.get("error"))
+            if message["type"] == "done":
+                return
+            if message["type"] == "tree" and screenshots:
+                message["cropped_image"] = decode_image(message.get("cropped_image"))
+                message["segmented_image"] = decode_image(message.get("segmented_image"))
+            yield message
+
+    # returns {bundle: message} with the tree or the error for every bundle
+    def capture(self, bundles, max_depth=None, screenshots=False):
+        results = {}
+        for message in self.stream(bundles, max_depth, screenshots):
+            if message["type"] in ("tree", "error"):
+                results[message["bundle"]] = message
+        return results
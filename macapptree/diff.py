@@ -0,0 +1,311 @@
+import argparse
+import copy
+import json
+from bisect import bisect_left
+from hashlib import blake2b
+
+from macapptree import hashing
+from macapptree import traversal
+
+
+DELTA_VERSION = 1
+
+
+def _dict_children(node):
+    return node.get("children") or []
+
+
+# dictionary form of a root as written by macapptree.main
+def as_dict(root):
+    if isinstance(root, dict):
+        return root
+    result = root.to_dict()
+    if getattr(root, "app_name", None):
+        result["app_name"] = root.app_name
+    return result
+
+
+# digest of every subtree, identifier and content_identifier do not cover all the dumped fields
+def _signatures(roots):
+    signatures = {}
+    for root in roots:
+        for node in traversal.walk_post_order(root, _dict_children):
+            # dumps list their keys in a fixed order, a different order only costs a field comparison
+            fields = [item for item in node.items() if item[0] != "children"]
+            h = blake2b(repr(fields).encode("utf-8", "surrogatepass"), digest_size=16)
+            for child in _dict_children(node):
+                h.update(signatures[id(child)])
+            signatures[id(node)] = h.digest()
+    return signatures
+
+
+# dumped trees: every node is hashed over all its fields up front, the diff is O(n)
+class _DictTrees:
+    def __init__(self, old_roots, new_roots):
+        self.old_roots = [as_dict(root) for root in old_roots]
+        self.new_roots = [as_dict(root) for root in new_roots]
+        self._signatures = _signatures(self.old_roots + self.new_roots)
+
+    def children(self, node):
+        return _dict_children(node)
+
+    def signature(self, node):
+        return self._signatures[id(node)]
+
+    def fields(self, node):
+        return node
+
+    def identifier(self, node):
+        return node.get("id") or None
+
+    def label(self, node):
+        return node.get("role"), node.get("name")
+
+    def as_dict(self, node):
+        return node
+
+
+# UIElements hashed with the merkle scheme: a dump identifier covers every dumped field of the
+# subtree, so equal subtrees are skipped without being visited and the work follows the size of
+# the change. the app name of a root can be set after hashing and is compared with it.
+class _ElementTrees:
+    def __init__(self, old_roots, new_roots):
+        self.old_roots = list(old_roots)
+        self.new_roots = list(new_roots)
+
+    def children(self, node):
+        return node.children
+
+    def signature(self, node):
+        return hashing.dump_identifier(node), getattr(node, "app_name", None)
+
+    def fields(self, node):
+        result = node._node_dict()
+        if getattr(node, "app_name", None):
+            result["app_name"] = node.app_name
+        return result
+
+    def identifier(self, node):
+        return node.identifier or None
+
+    def label(self, node):
+        return node.role, node.name
+
+    def as_dict(self, node):
+        return as_dict(node)
+
+
+def _merkle_hashed(roots):
+    return all(getattr(root, "hash_scheme", None) == hashing.MERKLE for root in roots)
+
+
+# compute the delta turning the old roots into the new ones.
+# nodes are addressed by their path of child indices in the old tree, [] is the list of roots.
+# exact compares every dumped field of every node even when both sides are merkle-hashed UIElements.
+def diff(old_roots, new_roots, exact=False):
+    if not exact and _merkle_hashed(old_roots) and _merkle_hashed(new_roots):
+        trees = _ElementTrees(old_roots, new_roots)
+    else:
+        trees = _DictTrees(old_roots, new_roots)
+
+    delta = {"version": DELTA_VERSION, "removed": [], "inserted": [], "moved": [], "modified": []}
+    removed = {}
+    inserted = []
+    pending = [([], trees.old_roots, trees.new_roots)]
+    while pending:
+        parent_path, old_children, new_children = pending.pop()
+        matches = _match_children(old_children, new_children, trees)
+
+        matched_old = [old_index for old_index in matches if old_index is not None]
+        kept = set(_increasing_subsequence(matched_old))
+        for new_index, old_index in enumerate(matches):
+            new_child = new_children[new_index]
+            if old_index is None:
+                insertion = {"parent": parent_path, "index": new_index, "node": trees.as_dict(new_child)}
+                delta["inserted"].append(insertion)
+                inserted.append((insertion, trees.signature(new_child)))
+                continue
+            path = parent_path + [old_index]
+            if old_index not in kept:
+                delta["moved"].append({"node": path, "parent": parent_path, "index": new_index})
+            old_child = old_children[old_index]
+            if trees.signature(old_child) == trees.signature(new_child):
+                continue
+            modified = _modified_fields(trees.fields(old_child), trees.fields(new_child))
+            if modified is not None:
+                modified["node"] = path
+                delta["modified"].append(modified)
+            pending.append((path, trees.children(old_child), trees.children(new_child)))
+
+        used = set(matched_old)
+        for old_index, old_child in enumerate(old_children):
+            if old_index not in used:
+                path = parent_path + [old_index]
+                delta["removed"].append(path)
+                removed.setdefault(trees.signature(old_child), []).append(path)
+
+    _detect_moves(delta, removed, inserted)
+    return delta
+
+
+# pair new children with old ones: identical subtree first, then same identifier, then same role and name
+def _match_children(old_children, new_children, trees):
+    matches = [None] * len(new_children)
+    free = set(range(len(old_children)))
+    for key in (trees.signature, trees.identifier, trees.label):
+        candidates = {}
+        for old_index in sorted(free):
+            value = key(old_children[old_index])
+            if value is not None:
+                candidates.setdefault(value, []).append(old_index)
+        if not candidates:
+            continue
+        for new_index, new_child in enumerate(new_children):
+            if matches[new_index] is not None:
+                continue
+            indices = candidates.get(key(new_child))
+            if indices:
+                matches[new_index] = indices.pop(0)
+                free.discard(matches[new_index])
+    return matches
+
+
+# old indices that keep their relative order, everything else is reported as moved
+def _increasing_subsequence(values):
+    tails = []
+    tail_positions = []
+    previous = [None] * len(values)
+    for position, value in enumerate(values):
+        index = bisect_left(tails, value)
+        if index == len(tails):
+            tails.append(value)
+            tail_positions.append(position)
+        else:
+            tails[index] = value
+            tail_positions[index] = position
+        previous[position] = tail_positions[index - 1] if index > 0 else None
+    result = []
+    position = tail_positions[-1] if tail_positions else None
+    while position is not None:
+        result.append(values[position])
+        position = previous[position]
+    return result
+
+
+def _modified_fields(old_node, new_node):
+    fields = {}
+    unset = []
+    for key, value in new_node.items():
+        if key != "children" and (key not in old_node or old_node[key] != value):
+            fields[key] = value
+    for key in old_node:
+        if key != "children" and key not in new_node:
+            unset.append(key)
+    if not fields and not unset:
+        return None
+    result = {"fields": fields}
+    if unset:
+        result["unset"] = unset
+    return result
+
+
+# an inserted subtree identical to a removed one is reported as a move
+def _detect_moves(delta, removed, insertions):
+    inserted = []
+    for insertion, signature in insertions:
+        paths = removed.get(signature)
+        if not paths:
+            inserted.append(insertion)
+            continue
+        path = paths.pop(0)
+        delta["removed"].remove(path)
+        delta["moved"].append({"node": path, "parent": insertion["parent"], "index": insertion["index"]})
+    delta["inserted"] = inserted
+
+
+# rebuild the new roots from the old ones and a delta
+def apply(old_roots, delta):
+    if delta.get("version") != DELTA_VERSION:
+        raise ValueError(f"Unsupported delta version: {delta.get('version')}")
+    roots = copy.deepcopy([as_dict(root) for root in old_roots])
+    top = {"children": roots}
+
+    # resolve every path before the tree changes
+    def resolve(path):
+        node = top
+        for index in path:
+            node = node["children"][index]
+        return node
+
+    moved = [(resolve(move["node"]), resolve(move["parent"]), move) for move in delta["moved"]]
+    removed = [resolve(path) for path in delta["removed"]]
+    inserted = [(resolve(insertion["parent"]), insertion) for insertion in delta["inserted"]]
+    modified = [(resolve(change["node"]), change) for change in delta["modified"]]
+
+    # nodes leaving their position, and explicit positions in their new parents
+    leaving = {id(node) for node in removed}
+    leaving.update(id(node) for node, _, _ in moved)
+    placements = {}
+    for node, parent, move in moved:
+        placements.setdefault(id(parent), (parent, {}))[1][move["index"]] = node
+    for parent, insertion in inserted:
+        placements.setdefault(id(parent), (parent, {}))[1][insertion["index"]] = copy.deepcopy(insertion["node"])
+
+    changed_parents = {id(parent): parent for parent, _ in placements.values()}
+    for path in delta["removed"] + [move["node"] for move in delta["moved"]]:
+        parent = resolve(path[:-1])
+        changed_parents[id(parent)] = parent
+
+    for parent_id, parent in changed_parents.items():
+        placed = placements.get(parent_id, (parent, {}))[1]
+        kept = iter([child for child in _dict_children(parent) if id(child) not in leaving])
+        children = []
+        for index in range(len(placed) + len(_dict_children(parent)) - _leaving_count(parent, leaving)):
+            children.append(placed[index] if index in placed else next(kept))
+        parent["children"] = children
+
+    for node, change in modified:
+        node.update(change["fields"])
+        for key in change.get("unset", ()):
+            node.pop(key, None)
+    return top["children"]
+
+
+def _leaving_count(parent, leaving):
+    return sum(1 for child in _dict_children(parent) if id(child) in leaving)
+
+
+def delta_size(delta):
+    return len(delta["removed"]) + len(delta["inserted"]) + len(delta["moved"]) + len(delta["modified"])
+
+
+def load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def dump(data, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    diff_parser = subparsers.add_parser("diff", help="Write the delta between two accessibility dumps")
+    diff_parser.add_argument("old", type=str)
+    diff_parser.add_argument("new", type=str)
+    diff_parser.add_argument("--out", type=str, required=True, help="Delta output file")
+    apply_parser = subparsers.add_parser("apply", help="Rebuild a dump from a baseline and a delta")
+    apply_parser.add_argument("baseline", type=str)
+    apply_parser.add_argument("delta", type=str)
+    apply_parser.add_argument("--out", type=str, required=True, help="Rebuilt dump output file")
+    args = parser.parse_args()
+
+    if args.command == "diff":
+        dump(diff(load(args.old), load(args.new)), args.out)
+    else:
+        rebuilt = apply(load(args.baseline), load(args.delta))
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(rebuilt, f, ensure_ascii=False, indent=4)
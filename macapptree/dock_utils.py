@@ -1,14 +1,14 @@
 import os
-import time
 import AppKit
 import Quartz
 import ApplicationServices
 
 import macapptree.apps as apps
-from macapptree.uielement import UIElement
+from macapptree.uielement import UIElement, element_attribute
+from macapptree import readiness
 from macapptree.extractor import extract_window
-from macapptree.window_tools import store_screen_scaling_factor, segment_window_components
-from macapptree.screenshot_app_window import capture_full_screen
+from macapptree.window_tools import store_screen_scaling_factor, segment_window_image
+from macapptree.capture import get_source
 from macapptree.window_tools import propagate_screen_rect
 
 DOCK_THICKNESS_PT = 96 
@@ -24,12 +24,18 @@ def _dock_tl_rect_fixed(orientation: str = "bottom") -> tuple[int, int, int, int
         return (sw - t, 0, t, sh)
     return (0, sh - t, sw, t)
 
-def _propagate_screen_rect_local(ui_element, screen_rect_tl):
-    ui_element.window_screen_rect = screen_rect_tl
-    for child in getattr(ui_element, "children", []):
-        _propagate_screen_rect_local(child, screen_rect_tl)
-
-# if the dock is set to autohide, we can move the mouse to reveal it temporarily
+# the dock's icon list, its frame is off-screen while the dock is hidden
+def _dock_list():
+    dock_ax = apps.dock_ax_application()
+    if dock_ax is None:
+        return None
+    for child in element_attribute(dock_ax, ApplicationServices.kAXChildrenAttribute) or []:
+        if element_attribute(child, ApplicationServices.kAXRoleAttribute) == "AXList":
+            return child
+    return None
+
+# if the dock is set to autohide, we can move the mouse to reveal it temporarily.
+# dwell is the longest wait for the dock to be on screen
 def _reveal_dock_temporarily(orientation: str = "bottom", dwell: float = 0.8):
     try:
         screen = AppKit.NSScreen.mainScreen().frame()
@@ -45,10 +51,18 @@ def _reveal_dock_temporarily(orientation: str = "bottom", dwell: float = 0.8):
 
         evt = Quartz.CGEventCreateMouseEvent(None, Quartz.kCGEventMouseMoved, (x, y), Quartz.kCGMouseButtonLeft)
         Quartz.CGEventPost(Quartz.kCGHIDEventTap, evt)
-        time.sleep(dwell)
+        readiness.wait_until(readiness.element_on_screen(_dock_list(), (0, 0, sw, sh)), dwell, "dock revealed")
     except Exception:
         pass
 
+# whether the dock hides itself, assumed when the preference cannot be read
+def _dock_autohides():
+    try:
+        value = AppKit.CFPreferencesCopyAppValue("autohide", "com.apple.dock")
+    except Exception:
+        return True
+    return True if value is None else bool(value)
+
 class DockCapture:
     def __init__(self, orientation: str = "bottom", reveal: bool = True, dwell: float = 0.8):
         self.orientation = orientation
@@ -58,8 +72,11 @@ class DockCapture:
     def capture(self, max_depth=None, output_screenshot_dir=None):
         store_screen_scaling_factor()
 
-        if self.reveal:
+        # a revealed dock is not on the frames grabbed earlier in the run
+        source = get_source()
+        if self.reveal and _dock_autohides():
             _reveal_dock_temporarily(self.orientation, dwell=self.dwell)
+            source.refresh()
 
         dock_ax = apps.dock_ax_application()
 
@@ -85,14 +102,12 @@ class DockCapture:
         if output_screenshot_dir:
             os.makedirs(output_screenshot_dir, exist_ok=True)
 
-            full_path = os.path.join(output_screenshot_dir, "dock_full.png")
-            capture_full_screen(full_path)
-
-            crop_path = full_path.replace(".png", "_cropped.png")
-            from macapptree.screenshot_app_window import crop_screenshot
-            _ = crop_screenshot(full_path, (x_tl, y_tl, w, h), crop_path)
+            crop_path = os.path.join(output_screenshot_dir, "dock_full_cropped.png")
+            cropped_image = source.grab((x_tl, y_tl, w, h))
+            cropped_image.save(crop_path)
 
-            segmented_path = segment_window_components(dock_root, crop_path) or crop_path
+            segmented_path = crop_path.replace(".png", "_segmented.png")
+            segment_window_image(dock_root, cropped_image, source.scale).save(segmented_path)
             screenshot_info = {
                 "app": "com.apple.dock",
                 "window_name": "Dock",
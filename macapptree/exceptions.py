@@ -1,2 +1,7 @@
 class WindowNotFoundException(BaseException):
-    pass
\ No newline at end of file
+    pass
+
+
+# raised for the accessibility calls of an app the watchdog marked as hung
+class AppNotRespondingException(BaseException):
+    pass
@@ -1,7 +1,8 @@
 from macapptree.uielement import UIElement
 import AppKit
-import ApplicationServices
 import macapptree.uielement as uielement
+from macapptree import backend
+from macapptree.backend import get_backend
 import macapptree.files as files
 import macapptree.window_tools as window_tools
 
@@ -9,13 +10,7 @@ import macapptree.window_tools as window_tools
 # perform a hit test on the specified point
 def hit_test(point, window_element):
     window_point = window_tools.convert_point_to_window(point, window_element.position)
-    system_component = ApplicationServices.AXUIElementCreateSystemWide()
-    err, value = ApplicationServices.AXUIElementCopyElementAtPosition(
-        system_component, window_point.x, window_point.y, None
-    )
-    if err == ApplicationServices.kAXErrorSuccess:
-        return value
-    return None
+    return get_backend().element_at_position(window_point.x, window_point.y)
 
 
 def extract_with_hit_test(window, app_bundle, output_file, print_nodes, max_depth):
@@ -34,11 +29,12 @@ def extract_with_hit_test(window, app_bundle, output_file, print_nodes, max_dept
     found_root_element = UIElement.find_root_element(group_element)
     root_element = UIElement(found_root_element, window_offset_x, window_offset_y, max_depth)
     parent_window = uielement.element_attribute(
-        found_root_element, ApplicationServices.kAXWindowAttribute
+        found_root_element, backend.AX_WINDOW
     )
     if parent_window is not None:
+        # only the frame, name and role of the parent window are compared
         parent_window_element = UIElement(
-            parent_window, window_offset_x, window_offset_y, max_depth
+            parent_window, window_offset_x, window_offset_y, 0
         )
 
         if window_tools.windows_are_equal(window, parent_window_element):
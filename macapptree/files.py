@@ -1,10 +1,19 @@
 import json
 
+from macapptree.stream import NDJSONTreeWriter
 
-# store element to the output file as json
+
+NDJSON_EXTENSIONS = (".ndjson", ".ndjson.gz", ".ndjson.zst")
+
+
+# store element to the output file as json, or one node per line for .ndjson files
 def store_data_to_file(element, output_file):
     if output_file is None:
         return
+    if output_file.endswith(NDJSON_EXTENSIONS):
+        with NDJSONTreeWriter(output_file) as writer:
+            writer.write_tree(element)
+        return
     json_data = json.dumps(element.to_dict(), indent=4)
     with open(output_file, "w") as f:
         f.write(json_data)
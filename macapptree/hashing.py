@@ -0,0 +1,131 @@
+from hashlib import blake2b
+
+from macapptree import traversal
+
+
+# md5 over formatted strings, the identifiers written by earlier versions
+LEGACY = "md5"
+# blake2b with merkle combination of the child digests
+MERKLE = "blake2b"
+SCHEMES = (LEGACY, MERKLE)
+
+DIGEST_SIZE = 16
+_SEPARATOR = "\x1f"
+_NONE = "\x00"
+
+
+def identifier(node, scheme=LEGACY):
+    if scheme == LEGACY:
+        return node.component_hash()
+    if scheme == MERKLE:
+        return _digest(_component_string(node))
+    raise ValueError(f"Unknown hash scheme: {scheme}")
+
+
+def content_identifier(node, children, scheme=LEGACY):
+    if scheme == LEGACY:
+        return node.children_content_hash(children)
+    if scheme == MERKLE:
+        return _merkle_content(_content_string(node), node.identifier, _children_string(children))
+    raise ValueError(f"Unknown hash scheme: {scheme}")
+
+
+# set identifier and content_identifier of a node whose children are already hashed.
+# with the merkle scheme a node whose fields and child digests did not change keeps its hashes.
+def calculate(node, scheme=LEGACY):
+    if scheme == LEGACY:
+        node.identifier = node.component_hash()
+        node.content_identifier = node.children_content_hash(node.children)
+        return False
+    if scheme != MERKLE:
+        raise ValueError(f"Unknown hash scheme: {scheme}")
+
+    component, content, children, layout = parts = (
+        _component_string(node), _content_string(node), _children_string(node.children), _layout_string(node)
+    )
+    # only a digest of the hashed strings is kept on the node, not the strings themselves
+    key = _digest("".join([f"{len(part)}:{part}" for part in parts]))
+    if getattr(node, "_hash_key", None) == key:
+        return True
+    node.identifier = _digest(component)
+    node.content_identifier = _merkle_content(content, node.identifier, children)
+    node._dump_identifier = _digest(f"{node.content_identifier}{_SEPARATOR}{layout}")
+    node._hash_key = key
+    return False
+
+
+# merkle digest of every field the dictionary form of the subtree holds. the content identifier
+# leaves out positions below a point, the bboxes and the visibility; two subtrees with the same
+# dump identifier dump the same. computed on demand for nodes the merkle scheme did not hash.
+def dump_identifier(node):
+    if getattr(node, "_dump_identifier", None) is None:
+        for child in traversal.walk_post_order(node, _without_dump_identifier):
+            child._dump_identifier = _digest(f"{child.content_identifier}{_SEPARATOR}{_layout_string(child)}")
+    return node._dump_identifier
+
+
+# recompute the hashes of a tree bottom-up after some nodes changed, returns the number of reused nodes
+def rehash(root, scheme=LEGACY):
+    reused = 0
+    for node in traversal.walk_post_order(root):
+        reused += calculate(node, scheme)
+    return reused
+
+
+def _component_string(node):
+    # rounded like the legacy scheme so subpixel jitter keeps the identifier
+    if node.position is None or node.size is None:
+        return f"{node.role}{_SEPARATOR}{_NONE}{_SEPARATOR}{node.enabled}"
+    return (
+        f"{node.role}{_SEPARATOR}"
+        f"{node.position.x:.0f};{node.position.y:.0f};{node.size.width:.0f};{node.size.height:.0f}"
+        f"{_SEPARATOR}{node.enabled}"
+    )
+
+
+def _content_string(node):
+    value = node.value
+    if value is not None and hasattr(value, "content_identifier"):
+        value = value.content_identifier
+    return _SEPARATOR.join((_text(node.description), _text(node.role_description), _text(node.name), _text(value)))
+
+
+def _without_dump_identifier(node):
+    return [child for child in node.children if getattr(child, "_dump_identifier", None) is None]
+
+
+# the dumped fields outside _component_string and _content_string, with the child dump identifiers
+def _layout_string(node):
+    value = node.value
+    value = dump_identifier(value) if hasattr(value, "content_identifier") else _NONE
+    fields = (
+        _point(getattr(node, "absolute_position", None)), _point(node.position),
+        node.bbox, node.visible_bbox, node.visible, node.app_name, node.pruned, node.truncated, value,
+    )
+    children = "".join([dump_identifier(child) for child in node.children])
+    return f"{_SEPARATOR.join(map(_text, fields))}{_SEPARATOR}{children}"
+
+
+def _point(point):
+    if point is None:
+        return None
+    return f"{point.x:.2f};{point.y:.2f}"
+
+
+# child digests have a fixed width, so they are concatenated without separators
+def _children_string(children):
+    return "".join([child.content_identifier for child in children])
+
+
+def _merkle_content(content, identifier, children):
+    return _digest(f"{content}{_SEPARATOR}{identifier}{_SEPARATOR}{children}")
+
+
+def _text(value):
+    if value is None:
+        return _NONE
+    return str(value)
+
+
+def _digest(data):
+    return blake2b(data.encode("utf-8", "surrogatepass"), digest_size=DIGEST_SIZE).hexdigest()
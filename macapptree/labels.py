@@ -0,0 +1,105 @@
+import numpy as np
+
+from macapptree.window_tools import ROLE_IDS
+
+
+BACKGROUND = 0
+# role class of every mask pixel: 0 is background, then the roles of window_tools.ROLE_COLORS,
+# the last class collects all other roles
+ROLE_CLASSES = ("background",) + tuple(ROLE_IDS) + ("other",)
+_ROLE_CLASS_IDS = {role: index for index, role in enumerate(ROLE_CLASSES)}
+OTHER_ROLE = len(ROLE_CLASSES) - 1
+
+MAX_INSTANCES = np.iinfo(np.uint16).max
+
+
+class LabelMasks:
+    def __init__(self, instance_mask, role_mask, node_ids, node_paths, roles):
+        # instance i > 0 is node_ids[i - 1], 0 is background
+        self.instance_mask = instance_mask
+        self.role_mask = role_mask
+        self.node_ids = node_ids
+        # child index path of each instance inside the window, "" is the window itself
+        self.node_paths = node_paths
+        self.roles = roles
+
+    def to_arrays(self):
+        return {
+            "instance_mask": self.instance_mask,
+            "role_mask": self.role_mask,
+            "node_ids": np.array(self.node_ids, dtype=np.str_),
+            "node_paths": np.array(self.node_paths, dtype=np.str_),
+            "node_roles": np.array(self.roles, dtype=np.str_),
+            "role_classes": np.array(ROLE_CLASSES, dtype=np.str_),
+        }
+
+    def save(self, path):
+        np.savez_compressed(path, **self.to_arrays())
+        return path
+
+    def __repr__(self):
+        return f"LabelMasks(shape={self.instance_mask.shape}, instances={len(self.node_ids)})"
+
+
+def load(path):
+    with np.load(path) as data:
+        return LabelMasks(
+            data["instance_mask"], data["role_mask"],
+            data["node_ids"].tolist(), data["node_paths"].tolist(), data["node_roles"].tolist()
+        )
+
+
+# visible nodes of the window in painting order: shallower nodes first, then pre-order,
+# so that children cover their parents and later siblings cover earlier ones.
+# returns the nodes, their paths, depths and visible bboxes (n, 4) in points
+def flatten_nodes(window):
+    nodes = []
+    paths = []
+    depths = []
+    boxes = []
+    pending = [(window, 0, "")]
+    while pending:
+        node, depth, path = pending.pop()
+        if node.visible and node.visible_bbox and node.size is not None \
+                and node.size.width != 0 and node.size.height != 0:
+            nodes.append(node)
+            paths.append(path)
+            depths.append(depth)
+            boxes.append(node.visible_bbox)
+        for index in range(len(node.children) - 1, -1, -1):
+            child_path = f"{path}/{index}" if path else str(index)
+            pending.append((node.children[index], depth + 1, child_path))
+    depths = np.array(depths, dtype=np.int64)
+    order = np.argsort(depths, kind="stable")
+    return (
+        [nodes[i] for i in order],
+        [paths[i] for i in order],
+        depths[order],
+        np.array(boxes, dtype=np.float64).reshape(-1, 4)[order],
+    )
+
+
+# instance and role masks of the window at device resolution.
+# shape is (height, width) of the window image, scale the device pixels per point.
+def label_masks(window, shape, scale=1.0):
+    nodes, paths, _, boxes = flatten_nodes(window)
+    if len(nodes) > MAX_INSTANCES:
+        raise ValueError(f"{len(nodes)} visible nodes do not fit a uint16 instance mask")
+
+    height, width = shape
+    # half-open pixel rectangles, clipped to the image
+    pixels = (boxes * scale).astype(np.int64)
+    pixels[:, [0, 2]] = np.clip(pixels[:, [0, 2]], 0, width)
+    pixels[:, [1, 3]] = np.clip(pixels[:, [1, 3]], 0, height)
+    roles = [node.role or "" for node in nodes]
+    role_ids = np.array([_ROLE_CLASS_IDS.get(role, OTHER_ROLE) for role in roles], dtype=np.uint8)
+
+    # paint into an instance mask, roles follow from the instances in one lookup
+    instance_mask = np.zeros((height, width), dtype=np.uint16)
+    for instance, (x1, y1, x2, y2) in enumerate(pixels.tolist(), start=1):
+        instance_mask[y1:y2, x1:x2] = instance
+    role_lookup = np.concatenate([[BACKGROUND], role_ids]).astype(np.uint8)
+    role_mask = role_lookup[instance_mask]
+
+    node_ids = [node.identifier for node in nodes]
+    return LabelMasks(instance_mask, role_mask, node_ids, paths, roles)
@@ -4,17 +4,34 @@ import argparse
 import json
 import os
 import time
-from PIL import ImageGrab, Image, ImageDraw, ImageFont
+from contextlib import nullcontext
+from PIL import Image, ImageDraw, ImageFont
 
 from macapptree.apps import get_visible_windows_for_bundles
 import macapptree.apps as apps
-from macapptree.window_tools import store_screen_scaling_factor, segment_window_components
+from macapptree.window_tools import store_screen_scaling_factor, segment_window_image
 from macapptree.uielement import UIElement, element_attribute, element_value
 from macapptree.extractor import extract_window
-from macapptree.screenshot_app_window import screenshot_window_to_file, capture_full_screen, rect_subtract
-from macapptree.uielement import _flatten_ui_elements
-from macapptree.window_tools import propagate_screen_rect, _iou, _build_global_visible_index
-
+from macapptree.screenshot_app_window import screenshot_window, capture_full_screen, rect_subtract
+from macapptree.capture import CaptureSession, get_source, use_source
+from macapptree.window_tools import propagate_screen_rect, _build_global_visible_index
+from macapptree.window_matching import as_index, match_windows
+
+from macapptree.stream import NDJSONTreeWriter
+from macapptree.tree_store import TreeStoreBuilder
+from macapptree.backend import MemoAXBackend, get_backend, use_backend
+from macapptree import serializer
+from macapptree import traversal
+from macapptree import hashing
+from macapptree import diff
+from macapptree.pruning import VisibilityPruning, ALWAYS
+from macapptree import budget as capture_budget
+from macapptree import readiness
+from macapptree import labels
+from macapptree.watchdog import HangWatchdog, MAX_TIMEOUTS
+from macapptree.manifest import write_manifest
+from macapptree.workers import run_apps
+from macapptree.exceptions import AppNotRespondingException
 from macapptree.menu_bar_utils import MenuBarCapture
 from macapptree.dock_utils import DockCapture
 
@@ -35,7 +52,8 @@ def get_window_rect(window):
     return [x, y, x + w, y + h]
 
 
-def draw_bounding_boxes_on_full_screen(full_screen_path, ui_elements, output_path=None):
+# ui_roots are captured trees, the screen rect of every element is the one of its root
+def draw_bounding_boxes_on_full_screen(full_screen_path, ui_roots, output_path=None):
     img = Image.open(full_screen_path)
     draw = ImageDraw.Draw(img)
     try:
@@ -50,11 +68,10 @@ def draw_bounding_boxes_on_full_screen(full_screen_path, ui_elements, output_pat
     sx = iw_px / max(1, sw_pt)
     sy = ih_px / max(1, sh_pt)
 
-    for e in ui_elements:
+    for e, win_rect in _elements_with_screen_rect(ui_roots):
         if not getattr(e, "visible", False):
             continue
 
-        win_rect = getattr(e, "window_screen_rect", None)   
         vb = getattr(e, "visible_bbox", None) 
         if not win_rect or not vb:
             continue
@@ -90,7 +107,32 @@ def draw_bounding_boxes_on_full_screen(full_screen_path, ui_elements, output_pat
     return output_path
 
 
-def process_app(app_bundle, max_depth, output_screenshot_dir=None, global_vis_index=None):
+# (element, window_screen_rect) for every element of the trees
+def _elements_with_screen_rect(ui_roots):
+    for root in ui_roots:
+        win_rect = getattr(root, "window_screen_rect", None)
+        for element in traversal.walk(root):
+            yield element, win_rect
+
+
+# budget is an optional budget.CaptureBudget bounding the work of the capture.
+# watchdog is an optional watchdog.HangWatchdog, it has to be the current backend or be wrapped by it.
+# label_masks adds instance and role masks (labels.LabelMasks) of every window to the screenshots.
+# store_builder is an optional tree_store.TreeStoreBuilder: the windows are stored in it while they are built
+# and their nodes released, the returned roots keep no children and builder.view(root) gives the tree.
+# writer is an optional stream.NDJSONTreeWriter the windows are streamed to while they are built; the caller
+# writes the roots. without screenshots the streamed nodes are released as well
+def process_app(app_bundle, max_depth, output_screenshot_dir=None, global_vis_index=None, load_images=False,
+                visitor=None, budget=None, watchdog=None, label_masks=False, store_builder=None, writer=None):
+    with capture_budget.tracking(budget):
+        return _process_app(
+            app_bundle, max_depth, output_screenshot_dir, global_vis_index, load_images, visitor, budget, watchdog,
+            label_masks, store_builder, writer
+        )
+
+
+def _process_app(app_bundle, max_depth, output_screenshot_dir, global_vis_index, load_images, visitor, budget,
+                 watchdog, label_masks, store_builder=None, writer=None):
     store_screen_scaling_factor()
     workspace = AppKit.NSWorkspace.sharedWorkspace()
     app = apps.application_for_bundle(app_bundle, workspace)
@@ -99,159 +141,277 @@ def process_app(app_bundle, max_depth, output_screenshot_dir=None, global_vis_in
         return [], []
 
     application = apps.application_for_process_id(app.processIdentifier())
-    windows = apps.windows_for_application(application)
-    if not windows:
-        print(f"No windows found for {app_bundle}")
-        return [], []
-
-    cg_entries = [e for e in (global_vis_index or []) if e["pid"] == int(app.processIdentifier())]
-
     all_ui_elements = []
     screenshot_info_list = []
 
-    for ax_win in windows:
-        rect = get_window_rect(ax_win)  
-        if not rect:
-            continue
-        x_tl, y_tl, x2_tl, y2_tl = rect
-        w_ax, h_ax = (x2_tl - x_tl), (y2_tl - y_tl)
-
-        best = None
-        best_iou = 0.0
-        for cg in cg_entries:
-            cx, cy, cW, cH = cg["bounds"]
-            cand = (cx, cy, cx + cW, cy + cH)
-            iou = _iou((x_tl, y_tl, x2_tl, y2_tl), cand)
-            if iou > best_iou:
-                best_iou, best = iou, cg
-        if not best:
-            continue
-
-        vis_rects = best["visible"] 
-        # skip not visible windows
-        if not vis_rects:
-            continue
-
-        vx1 = min(r[0] for r in vis_rects)
-        vy1 = min(r[1] for r in vis_rects)
-        vx2 = max(r[0] + r[2] for r in vis_rects)
-        vy2 = max(r[1] + r[3] for r in vis_rects)
-
-        ix1, iy1 = max(x_tl, vx1), max(y_tl, vy1)
-        ix2, iy2 = min(x2_tl, vx2), min(y2_tl, vy2)
-        if ix2 <= ix1 or iy2 <= iy1:
-            continue
+    # an app that stops replying is skipped, the windows captured before are kept
+    watching = watchdog.watching(app_bundle, application) if watchdog is not None else nullcontext()
+    try:
+        with watching:
+            windows = apps.windows_for_application(application)
+            if not windows:
+                print(f"No windows found for {app_bundle}")
+                return [], []
+
+            cg_entries = as_index(global_vis_index).for_pid(app.processIdentifier())
+            rects = [get_window_rect(ax_win) for ax_win in windows]
+            numbers = [get_backend().window_number(ax_win) for ax_win in windows]
+            matches = match_windows(rects, cg_entries, numbers)
+
+            for ax_win, rect, best in zip(windows, rects, matches):
+                if not rect or not best:
+                    continue
+                x_tl, y_tl, x2_tl, y2_tl = rect
+                w_ax, h_ax = (x2_tl - x_tl), (y2_tl - y_tl)
+
+                vis_rects = best["visible"] 
+                # skip not visible windows
+                if not vis_rects:
+                    continue
+
+                vx1 = min(r[0] for r in vis_rects)
+                vy1 = min(r[1] for r in vis_rects)
+                vx2 = max(r[0] + r[2] for r in vis_rects)
+                vy2 = max(r[1] + r[3] for r in vis_rects)
+
+                ix1, iy1 = max(x_tl, vx1), max(y_tl, vy1)
+                ix2, iy2 = min(x2_tl, vx2), min(y2_tl, vy2)
+                if ix2 <= ix1 or iy2 <= iy1:
+                    continue
+
+                parents_visible_bbox = [
+                    int(ix1 - x_tl),
+                    int(iy1 - y_tl),
+                    int(ix2 - x_tl),
+                    int(iy2 - y_tl),
+                ]
+
+                win_screen_rect = [x_tl, y_tl, x_tl + w_ax, y_tl + h_ax]
+
+                # the nodes are only kept when something other than the visitors reads the tree
+                release = store_builder is not None or (
+                    writer is not None and not (output_screenshot_dir or load_images)
+                )
+                streaming = writer.window() if writer is not None else nullcontext()
+                with streaming:
+                    ui_window = UIElement(
+                        ax_win,
+                        max_depth=max_depth,
+                        parents_visible_bbox=parents_visible_bbox,
+                        visitor=traversal.chain(
+                            visitor, writer.visit if writer else None, store_builder.visit if store_builder else None
+                        ),
+                        budget=budget,
+                        release=release
+                    )
+                ui_window.app_name = app.localizedName()
+                ui_window.window_screen_rect = win_screen_rect
+
+                extract_window(
+                    ui_window, app_bundle, None,
+                    perform_hit_test=False, print_nodes=False, max_depth=max_depth
+                )
+                # released windows keep the rect on the root, their store nodes resolve it through it
+                propagate_screen_rect(ui_window, win_screen_rect)
+                all_ui_elements.append(ui_window)
+                tree = ui_window
+                if store_builder is not None:
+                    tree = store_builder.add_root(ui_window, win_screen_rect)
+
+                # the window is grabbed and segmented in memory, files are only written for output_screenshot_dir
+                if output_screenshot_dir or load_images:
+                    window_name = getattr(ax_win, "name", None) or app.localizedName() or "window"
+                    source = get_source()
+                    cropped_image, _ = screenshot_window(app.localizedName(), window_name, source)
+                    segmented_image = segment_window_image(tree, cropped_image, source.scale)
+                    screenshot_info = {
+                        "app": app_bundle,
+                        "window_name": window_name,
+                        "cropped_screenshot_path": None,
+                        "segmented_screenshot_path": None
+                    }
+                    masks = None
+                    if label_masks:
+                        masks = labels.label_masks(
+                            tree, (cropped_image.height, cropped_image.width), source.scale
+                        )
+                        screenshot_info["labels_path"] = None
+                    if output_screenshot_dir:
+                        os.makedirs(output_screenshot_dir, exist_ok=True)
+                        crop_path = os.path.join(
+                            output_screenshot_dir, f"{app.localizedName()}_{window_name}_cropped.png"
+                        )
+                        segmented_path = crop_path.replace(".png", "_segmented.png")
+                        cropped_image.save(crop_path)
+                        segmented_image.save(segmented_path)
+                        screenshot_info["cropped_screenshot_path"] = crop_path
+                        screenshot_info["segmented_screenshot_path"] = segmented_path
+                        if masks is not None:
+                            screenshot_info["labels_path"] = masks.save(crop_path.replace(".png", "_labels.npz"))
+                    if load_images:
+                        screenshot_info["cropped_image"] = cropped_image
+                        screenshot_info["segmented_image"] = segmented_image
+                        if masks is not None:
+                            screenshot_info["labels"] = masks
+                    screenshot_info_list.append(screenshot_info)
+    except AppNotRespondingException:
+        print(f"{app_bundle} is not responding, skipping the rest of it.")
 
-        parents_visible_bbox = [
-            int(ix1 - x_tl),
-            int(iy1 - y_tl),
-            int(ix2 - x_tl),
-            int(iy2 - y_tl),
-        ]
+    return all_ui_elements, screenshot_info_list
 
-        win_screen_rect = [x_tl, y_tl, x_tl + w_ax, y_tl + h_ax]
 
-        ui_window = UIElement(
-            ax_win,
-            max_depth=max_depth,
-            parents_visible_bbox=parents_visible_bbox
+# process the apps, concurrently when workers > 1; results keep the order of app_bundles
+def process_apps(app_bundles, max_depth, output_screenshot_dir=None, global_vis_index=None, workers=1,
+                 visitor=None, budget=None, watchdog=None, label_masks=False, store_builder=None, writer=None):
+    def process(app_bundle):
+        return process_app(
+            app_bundle, max_depth, output_screenshot_dir, global_vis_index=global_vis_index, visitor=visitor,
+            budget=budget, watchdog=watchdog, label_masks=label_masks, store_builder=store_builder, writer=writer
         )
-        ui_window.app_name = app.localizedName()
-        ui_window.window_screen_rect = win_screen_rect
 
-        extract_window(
-            ui_window, app_bundle, None,
-            perform_hit_test=False, print_nodes=False, max_depth=max_depth
-        )
-        propagate_screen_rect(ui_window, win_screen_rect)
-        all_ui_elements.append(ui_window)
-
-        if output_screenshot_dir:
-            os.makedirs(output_screenshot_dir, exist_ok=True)
-            window_name = getattr(ax_win, "name", None) or app.localizedName() or "window"
-            crop_path, _ = screenshot_window_to_file(
-                app.localizedName(),
-                window_name,
-                os.path.join(output_screenshot_dir, f"{app.localizedName()}_{window_name}_cropped.png")
-            )
-            segmented_path = segment_window_components(ui_window, crop_path)
-            screenshot_info_list.append({
-                "app": app_bundle,
-                "window_name": window_name,
-                "cropped_screenshot_path": crop_path,
-                "segmented_screenshot_path": segmented_path
-            })
+    results = run_apps(app_bundles, process, workers)
 
-    return all_ui_elements, screenshot_info_list
+    all_elements = []
+    all_screenshots = []
+    timings = {}
+    for app_bundle, ((elements, screenshots), elapsed) in zip(app_bundles, results):
+        all_elements.extend(elements)
+        all_screenshots.extend(screenshots)
+        timings[app_bundle] = elapsed
+    return all_elements, all_screenshots, timings
 
 
 def main(app_bundles, output_accessibility_file, output_screenshot_dir, max_depth,
-         include_menubar=False, include_dock=False):
+         include_menubar=False, include_dock=False, workers=1, output_format="json", compression=None,
+         baseline=None, deadline=None, max_nodes=None, max_attribute_calls=None,
+         ax_timeout=None, app_timeouts=None, max_timeouts=MAX_TIMEOUTS, manifest_file=None, label_masks=False,
+         compact=False):
+    if baseline is not None and output_format != "json":
+        raise ValueError("--baseline writes json deltas and cannot be combined with --output-format")
     store_screen_scaling_factor()
 
-    all_elements = []
-    all_screenshots = []
-
+    # give the apps together up to a second to report their windows
     workspace = AppKit.NSWorkspace.sharedWorkspace()
+    ready_deadline = time.monotonic() + 1.0
     for app_bundle in app_bundles:
         app = apps.application_for_bundle(app_bundle, workspace)
         if app is None:
             print(f"App {app_bundle} not found or not running.")
-    time.sleep(1)
+            continue
+        application = apps.application_for_process_id(app.processIdentifier())
+        readiness.wait_until(
+            readiness.app_has_windows(application), max(0.0, ready_deadline - time.monotonic()),
+            f"windows {app_bundle}"
+        )
+
+    # every display is grabbed once, the screenshots of the run are cropped from the same frames
+    session = CaptureSession(get_source())
 
     full_screen_path = None
     if output_screenshot_dir:
         os.makedirs(output_screenshot_dir, exist_ok=True)
         full_screen_path = os.path.join(output_screenshot_dir, "full_screen.png")
-        capture_full_screen(full_screen_path)
+        capture_full_screen(full_screen_path, session)
 
     global_vis_index = _build_global_visible_index(app_bundles)
 
-    for app_bundle in app_bundles:
-        print(f"Processing app: {app_bundle}")
-        elements, screenshots = process_app(
-            app_bundle, max_depth, output_screenshot_dir, global_vis_index=global_vis_index
+    # nodes are written while the trees are built
+    writer = None
+    if output_format == "ndjson":
+        writer = NDJSONTreeWriter(output_accessibility_file, compression)
+    # the app windows are kept in a TreeStore instead of UIElement objects
+    store_builder = TreeStoreBuilder() if compact else None
+
+    # gives up on apps that stop replying, sees only the calls that reach the apps
+    watchdog = HangWatchdog(get_backend(), ax_timeout, max_timeouts, app_timeouts)
+
+    # one budget for all apps, the memo sits in front so only real fetches are charged
+    budget = None
+    backend = watchdog
+    if deadline is not None or max_nodes is not None or max_attribute_calls is not None:
+        budget = capture_budget.CaptureBudget(deadline, max_nodes, max_attribute_calls).start()
+        backend = budget.track(backend)
+
+    # every (element, attribute) pair is fetched at most once during the capture
+    memo = MemoAXBackend(backend)
+    with use_backend(memo), use_source(session):
+        all_elements, all_screenshots, timings = process_apps(
+            app_bundles, max_depth, output_screenshot_dir,
+            global_vis_index=global_vis_index, workers=workers,
+            budget=budget, watchdog=watchdog, label_masks=label_masks, store_builder=store_builder, writer=writer
         )
-        all_elements.extend(elements)
-        all_screenshots.extend(screenshots)
-
-    if include_menubar:
-        print("Processing Menu Bar…")
-        mb = MenuBarCapture()
-        mb_roots, mb_shots = mb.capture(max_depth, output_screenshot_dir)
-        for r in mb_roots or []:
-            all_elements.append(r)
-        if mb_shots:
-            all_screenshots.append(mb_shots)
-
-    if include_dock:
-        print("Processing Dock…")
-        dock = DockCapture(orientation="bottom", reveal=True, dwell=0.8)
-
-        dock_root, dock_shots = dock.capture(max_depth, output_screenshot_dir)
-        if dock_root:
-            all_elements.append(dock_root)
-        if dock_shots:
-            all_screenshots.append(dock_shots)
-
-
-    accessibility_data = []
-    for e in all_elements:
-        d = e.to_dict()
-        if getattr(e, "app_name", None):
-            d["app_name"] = e.app_name
-        accessibility_data.append(d)
-    with open(output_accessibility_file, "w", encoding="utf-8") as f:
-        json.dump(accessibility_data, f, ensure_ascii=False, indent=4)
+        app_roots = len(all_elements)
+
+        if include_menubar:
+            print("Processing Menu Bar…")
+            mb = MenuBarCapture()
+            mb_roots, mb_shots = mb.capture(max_depth, output_screenshot_dir)
+            for r in mb_roots or []:
+                all_elements.append(r)
+            if mb_shots:
+                all_screenshots.append(mb_shots)
+
+        if include_dock:
+            print("Processing Dock…")
+            dock = DockCapture(orientation="bottom", reveal=True, dwell=0.8)
+
+            dock_root, dock_shots = dock.capture(max_depth, output_screenshot_dir)
+            if dock_root:
+                all_elements.append(dock_root)
+            if dock_shots:
+                all_screenshots.append(dock_shots)
+
+    print(f"AX memo: {memo.calls_saved} duplicate calls removed")
+    if session.grabs:
+        print(f"Screen: {session.grabs} grabs, {session.crops} crops")
+    print(f"Waited {readiness.log.total:.2f}s for readiness: {json.dumps(readiness.log.stats())}")
+    if budget is not None:
+        print(f"Capture budget: {json.dumps(budget.stats())}")
+    if watchdog.hung:
+        print(f"Not responding: {', '.join(watchdog.hung)}")
+
+    if writer:
+        for index, e in enumerate(all_elements):
+            if index < app_roots:
+                writer.write_root(e, index)
+            else:
+                writer.write_tree(e, index)
+        writer.close()
+
+    if store_builder is not None:
+        store = store_builder.build()
+        print(f"Tree store: {len(store)} nodes, {store.nbytes()} bytes")
+        all_elements[:app_roots] = [store_builder.view(e) for e in all_elements[:app_roots]]
+
+    if output_format == "structured":
+        serializer.dump(all_elements, output_accessibility_file, "json")
+    elif output_format == "msgpack":
+        serializer.dump(all_elements, output_accessibility_file, "msgpack")
+    elif baseline is not None:
+        delta = diff.diff(diff.load(baseline), all_elements)
+        diff.dump(delta, output_accessibility_file)
+        print(f"Delta against {baseline}: {diff.delta_size(delta)} changes")
+    elif output_format == "json":
+        accessibility_data = [diff.as_dict(e) for e in all_elements]
+        with open(output_accessibility_file, "w", encoding="utf-8") as f:
+            json.dump(accessibility_data, f, ensure_ascii=False, indent=4)
 
     if all_screenshots:
         print(json.dumps(all_screenshots, indent=4))
 
     if full_screen_path and all_elements:
         annotated_path = os.path.join(output_screenshot_dir, "full_screen_annotated.png")
-        all_elements_flat = _flatten_ui_elements(all_elements)
-        draw_bounding_boxes_on_full_screen(full_screen_path, all_elements_flat, annotated_path)
+        draw_bounding_boxes_on_full_screen(full_screen_path, all_elements, annotated_path)
+
+    # the manifest is written when asked for, or next to --oa when timeouts are set
+    if manifest_file is None and (ax_timeout is not None or app_timeouts):
+        manifest_file = os.path.splitext(output_accessibility_file)[0] + ".manifest.json"
+    if manifest_file is not None:
+        write_manifest(manifest_file, output_accessibility_file, output_format, timings, watchdog, budget)
 
+    for app_bundle, elapsed in timings.items():
+        print(f"{app_bundle}: {elapsed:.2f}s")
+    return timings
 
 
 if __name__ == "__main__":
@@ -266,8 +426,49 @@ if __name__ == "__main__":
     parser.add_argument("--include-menubar", action="store_true", help="Also capture the top Menu Bar (front app + system extras)")
     parser.add_argument("--include-dock", action="store_true", help="Also capture the Dock (lower/side bar) accessibility tree")
     parser.add_argument("--all-apps", action="store_true", help="Ignore -a and auto-discover visible apps .")
+    parser.add_argument("--workers", type=int, default=1, help="Number of apps to extract concurrently")
+    parser.add_argument("--output-format", choices=["json", "ndjson", "structured", "msgpack"], default="json",
+                        help="json: legacy nested dump, ndjson: one node per line streamed while extracting, "
+                             "structured/msgpack: typed single-pass serialization as JSON or msgpack")
+    parser.add_argument("--hash-scheme", choices=list(hashing.SCHEMES), default=hashing.LEGACY,
+                        help="md5: identifiers compatible with earlier outputs, blake2b: merkle identifiers")
+    parser.add_argument("--prune-invisible", action="store_true",
+                        help="Keep invisible and zero-area subtrees as stubs instead of descending into them")
+    parser.add_argument("--always-descend", nargs="+", default=[],
+                        help="Roles to descend into even when invisible, in addition to the menu roles")
+    parser.add_argument("--deadline", type=float, default=None,
+                        help="Stop expanding nodes after this many seconds and mark the cut nodes as truncated")
+    parser.add_argument("--max-nodes", type=int, default=None, help="Maximum number of nodes to capture")
+    parser.add_argument("--max-attribute-calls", type=int, default=None,
+                        help="Maximum number of accessibility calls to make")
+    parser.add_argument("--label-masks", action="store_true",
+                        help="Save uint16 instance and uint8 role masks of every window next to its --os screenshot")
+    parser.add_argument("--ax-timeout", type=float, default=None,
+                        help="Seconds an accessibility call waits for an app to reply (system default if omitted)")
+    parser.add_argument("--app-timeout", nargs="+", default=[], metavar="BUNDLE=SECONDS",
+                        help="Per-app accessibility timeouts overriding --ax-timeout")
+    parser.add_argument("--hang-after", type=int, default=MAX_TIMEOUTS,
+                        help="Consecutive timeouts after which an app is reported as not responding and skipped")
+    parser.add_argument("--manifest", type=str, default=None,
+                        help="Capture manifest output file (written next to --oa with a .manifest.json suffix when timeouts are set)")
+    parser.add_argument("--baseline", type=str, default=None,
+                        help="Previous json dump; write the delta against it to --oa instead of the full dump")
+    parser.add_argument("--compact", action="store_true",
+                        help="Keep the app windows in a TreeStore while they are built instead of UIElement objects")
+    parser.add_argument("--compression", choices=["gzip", "zstd"], default=None, help="Compress the ndjson output")
     args = parser.parse_args()
 
+    UIElement.hash_scheme = args.hash_scheme
+    if args.prune_invisible:
+        UIElement.visibility_pruning = VisibilityPruning()
+        for role in args.always_descend:
+            UIElement.visibility_pruning.role_policies[role] = ALWAYS
+    app_timeouts = {}
+    for item in args.app_timeout:
+        bundle, _, seconds = item.rpartition("=")
+        if not bundle:
+            parser.error(f"--app-timeout expects BUNDLE=SECONDS, got {item}")
+        app_timeouts[bundle] = float(seconds)
     target_apps = args.apps
     if args.all_apps or not target_apps:
         from macapptree.apps import list_visible_app_bundles
@@ -279,5 +480,18 @@ if __name__ == "__main__":
         args.os,
         args.max_depth,
         include_menubar=args.include_menubar,
-        include_dock=args.include_dock
+        include_dock=args.include_dock,
+        workers=args.workers,
+        output_format=args.output_format,
+        compression=args.compression,
+        baseline=args.baseline,
+        deadline=args.deadline,
+        max_nodes=args.max_nodes,
+        max_attribute_calls=args.max_attribute_calls,
+        ax_timeout=args.ax_timeout,
+        app_timeouts=app_timeouts,
+        max_timeouts=args.hang_after,
+        manifest_file=args.manifest,
+        label_masks=args.label_masks,
+        compact=args.compact
     )
@@ -0,0 +1,22 @@
+import json
+
+from macapptree import readiness
+
+
+# summary of a capture written next to the accessibility output
+def write_manifest(path, output_accessibility_file, output_format, timings, watchdog=None, budget=None):
+    hung = watchdog.report() if watchdog is not None else {}
+    manifest = {
+        "output": output_accessibility_file,
+        "output_format": output_format,
+        "apps": [
+            {"bundle": app_bundle, "elapsed": elapsed, "status": "not_responding" if app_bundle in hung else "ok"}
+            for app_bundle, elapsed in timings.items()
+        ],
+        "hung_apps": hung,
+        "budget": budget.stats() if budget is not None else None,
+        "waits": [record.to_dict() for record in readiness.log.records],
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=4)
+    return path
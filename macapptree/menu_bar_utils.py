@@ -7,10 +7,9 @@ import ApplicationServices
 
 import macapptree.apps as apps
 from macapptree.uielement import UIElement, element_attribute
-from macapptree.window_tools import store_screen_scaling_factor, segment_window_components, propagate_screen_rect
+from macapptree.window_tools import store_screen_scaling_factor, segment_window_image, propagate_screen_rect
 from macapptree.extractor import extract_window
-from macapptree.screenshot_app_window import capture_full_screen
-from macapptree.screenshot_app_window import crop_screenshot
+from macapptree.capture import get_source
 
 
 class MenuBarCapture:
@@ -94,15 +93,15 @@ class MenuBarCapture:
 
         if output_screenshot_dir:
             os.makedirs(output_screenshot_dir, exist_ok=True)
-            full_path = os.path.join(output_screenshot_dir, "menubar_full.png")
-            capture_full_screen(full_path)
-
-        
-            crop_path = full_path.replace(".png", "_cropped.png")
-            _ = crop_screenshot(full_path, (x_tl, y_tl, w, h), crop_path)
+            crop_path = os.path.join(output_screenshot_dir, "menubar_full_cropped.png")
+            source = get_source()
+            cropped_image = source.grab((x_tl, y_tl, w, h))
+            cropped_image.save(crop_path)
 
             if roots:
-                segment_window_components(roots[0], crop_path)
+                segment_window_image(roots[0], cropped_image, source.scale).save(
+                    crop_path.replace(".png", "_segmented.png")
+                )
             shot_info = {
                 "app": "menubar",
                 "window_name": "MenuBar",
@@ -0,0 +1,38 @@
+# descend into the node whatever its visibility
+ALWAYS = "always"
+# descend only if the node has a visible area
+VISIBLE = "visible"
+
+# menus report empty or off-screen frames while closed but are still wanted
+DEFAULT_ROLE_POLICIES = {
+    "AXMenuBar": ALWAYS,
+    "AXMenuBarItem": ALWAYS,
+    "AXMenu": ALWAYS,
+}
+
+
+# decides which nodes the traversal expands when UIElement.visibility_pruning is set.
+# nodes that are not expanded are kept as stubs with pruned = True and no children.
+class VisibilityPruning:
+    def __init__(self, role_policies=None, default=VISIBLE, min_area=1):
+        self.role_policies = dict(DEFAULT_ROLE_POLICIES if role_policies is None else role_policies)
+        self.default = default
+        self.min_area = min_area
+        self.pruned = 0
+
+    def policy(self, role):
+        return self.role_policies.get(role, self.default)
+
+    def descend(self, node):
+        policy = self.policy(node.role)
+        if policy == ALWAYS:
+            return True
+        if policy != VISIBLE:
+            raise ValueError(f"Unknown pruning policy for {node.role}: {policy}")
+        if not node.visible or not node.visible_bbox:
+            return False
+        x1, y1, x2, y2 = node.visible_bbox
+        return (x2 - x1) * (y2 - y1) >= self.min_area
+
+    def __repr__(self):
+        return f"VisibilityPruning(default={self.default}, pruned={self.pruned})"
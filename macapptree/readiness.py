@@ -0,0 +1,150 @@
+import os
+import threading
+import time
+
+from macapptree import backend
+
+
+DEFAULT_TIMEOUT = 5.0
+# first poll interval, doubled after every miss up to MAX_INTERVAL
+DEFAULT_INTERVAL = 0.01
+MAX_INTERVAL = 0.1
+
+
+class WaitRecord:
+    __slots__ = ("name", "elapsed", "ready", "polls")
+
+    def __init__(self, name, elapsed, ready, polls):
+        self.name = name
+        self.elapsed = elapsed
+        self.ready = ready
+        self.polls = polls
+
+    def to_dict(self):
+        return {"name": self.name, "elapsed": self.elapsed, "ready": self.ready, "polls": self.polls}
+
+    def __repr__(self):
+        return f"WaitRecord(name={self.name}, elapsed={self.elapsed:.3f}, ready={self.ready}, polls={self.polls})"
+
+
+# how long every wait of a run really took
+class WaitLog:
+    def __init__(self):
+        self.records = []
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self.records.append(record)
+
+    def clear(self):
+        with self._lock:
+            self.records.clear()
+
+    @property
+    def total(self):
+        return sum(record.elapsed for record in self.records)
+
+    # name -> count, total and longest wait and the number of waits that timed out
+    def stats(self):
+        result = {}
+        for record in list(self.records):
+            entry = result.setdefault(record.name, {"count": 0, "total": 0.0, "max": 0.0, "timeouts": 0})
+            entry["count"] += 1
+            entry["total"] += record.elapsed
+            entry["max"] = max(entry["max"], record.elapsed)
+            entry["timeouts"] += 0 if record.ready else 1
+        return result
+
+
+# waits of the process, reported by macapptree.main
+log = WaitLog()
+
+
+# poll condition until it returns a truthy value or the timeout passes, and return its last value.
+# a wait that times out is not an error: callers go on as they did after the fixed sleeps.
+def wait_until(condition, timeout=DEFAULT_TIMEOUT, name=None, interval=DEFAULT_INTERVAL, wait_log=None,
+               clock=time.monotonic, sleep=time.sleep):
+    start = clock()
+    polls = 0
+    while True:
+        value = condition()
+        polls += 1
+        elapsed = clock() - start
+        if value or elapsed >= timeout:
+            record = WaitRecord(name or getattr(condition, "__name__", "condition"), elapsed, bool(value), polls)
+            (wait_log or log).add(record)
+            return value
+        sleep(min(interval, timeout - elapsed))
+        interval = min(interval * 2, MAX_INTERVAL)
+
+
+# conditions
+
+# the file exists, is not empty and its size did not change since the previous poll
+def file_complete(path):
+    last = [None]
+
+    def condition():
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return False
+        complete = size > 0 and size == last[0]
+        last[0] = size
+        return complete
+
+    condition.__name__ = "file_complete"
+    return condition
+
+
+# the running application has finished launching
+def app_launched(bundle_id, workspace):
+    def condition():
+        for app in workspace.runningApplications():
+            if app.bundleIdentifier() == bundle_id and app.isFinishedLaunching():
+                return app
+        return None
+
+    condition.__name__ = "app_launched"
+    return condition
+
+
+# the accessibility application element reports at least one window
+def app_has_windows(application):
+    def condition():
+        if application is None:
+            return None
+        err, windows = backend.get_backend().copy_attribute(application, backend.AX_WINDOWS)
+        if err != backend.AX_ERROR_SUCCESS or not windows:
+            return None
+        return list(windows)
+
+    condition.__name__ = "app_has_windows"
+    return condition
+
+
+# the element's frame lies within the screen area (x, y, width, height)
+def element_on_screen(element, screen_bounds, tolerance=1):
+    def condition():
+        if element is None:
+            return False
+        ax = backend.get_backend()
+        position = ax.attribute(element, backend.AX_POSITION)
+        size = ax.attribute(element, backend.AX_SIZE)
+        if position is None or size is None:
+            return False
+        position = ax.ax_value(position, backend.AX_VALUE_CGPOINT)
+        size = ax.ax_value(size, backend.AX_VALUE_CGSIZE)
+        if position is None or size is None or size.width <= 0 or size.height <= 0:
+            return False
+        x, y, width, height = screen_bounds
+        return (
+            position.x >= x - tolerance
+            and position.y >= y - tolerance
+            and position.x + size.width <= x + width + tolerance
+            and position.y + size.height <= y + height + tolerance
+        )
+
+    condition.__name__ = "element_on_screen"
+    return condition
@@ -1,10 +1,19 @@
-from PIL import Image
 import subprocess
 import tempfile
+import shutil
 import json
+import sys
 import re
 import os
-import macapptree.screenshot_app_window as screenshot_app_window
+import AppKit
+import macapptree.apps as apps
+import macapptree.main as main
+from macapptree.backend import MemoAXBackend, get_backend, use_backend
+from macapptree.capture import CaptureSession, get_source, use_source
+from macapptree import labels
+from PIL import Image
+from macapptree.window_tools import _build_global_visible_index
+
 
 def get_app_bundle(app_name):
     command = ['osascript', '-e', f'id of app "{app_name}"']
@@ -12,19 +21,83 @@ def get_app_bundle(app_name):
     return bundle
 
 
-def launch_app(app_bundle):
+def launch_app(app_bundle, isolated=False):
+    if not isolated:
+        workspace = AppKit.NSWorkspace.sharedWorkspace()
+        if not apps.check_app_running(workspace, app_bundle):
+            apps.launch_app(app_bundle)
+        return
     try:
-        subprocess.check_call(["python", "-m", "macapptree.launch_app", "-a", app_bundle])
+        subprocess.check_call([sys.executable, "-m", "macapptree.launch_app", "-a", app_bundle])
     except subprocess.CalledProcessError as e:
         print(f"Failed to launch app: {app_bundle}. Error: {e.stderr}")
         raise e
 
 
-def get_tree(app_bundle, max_depth=None):
+# extract the app windows in the current process
+def capture_app(app_bundle, max_depth=None, output_screenshot_dir=None, load_images=False, label_masks=False):
     launch_app(app_bundle)
+    global_vis_index = _build_global_visible_index([app_bundle])
+    with use_backend(MemoAXBackend(get_backend())), use_source(CaptureSession(get_source())):
+        return main.process_app(
+            app_bundle, max_depth, output_screenshot_dir,
+            global_vis_index=global_vis_index, load_images=load_images, label_masks=label_masks
+        )
+
+
+def _tree_to_dict(elements):
+    tree = []
+    for e in elements:
+        d = e.to_dict()
+        if getattr(e, "app_name", None):
+            d["app_name"] = e.app_name
+        tree.append(d)
+    return tree
+
+
+def get_tree(app_bundle, max_depth=None, isolated=False, as_elements=False):
+    if isolated:
+        return _get_tree_isolated(app_bundle, max_depth)
+
+    elements, _ = capture_app(app_bundle, max_depth)
+    if as_elements:
+        return elements
+    return _tree_to_dict(elements)
+
+
+# with label_masks the labels.LabelMasks of the window are returned as a fourth value
+def get_tree_screenshot(app_bundle, max_depth=None, isolated=False, as_elements=False, label_masks=False):
+    if isolated:
+        return _get_tree_screenshot_isolated(app_bundle, max_depth, label_masks)
+
+    # the screenshots are kept in memory only
+    elements, screenshots = capture_app(app_bundle, max_depth, load_images=True, label_masks=label_masks)
+
+    tree = elements if as_elements else _tree_to_dict(elements)
+    if not screenshots:
+        print(f"Failed to extract screenshots for {app_bundle}")
+        return (tree, None, None, None) if label_masks else (tree, None, None)
+    result = (tree, screenshots[0]["cropped_image"], screenshots[0]["segmented_image"])
+    if label_masks:
+        result += (screenshots[0].get("labels"),)
+    return result
+
+
+# read the image fully into memory so the file can be removed
+def _load_image(path):
+    if not path or not os.path.exists(path):
+        return None
+    with Image.open(path) as img:
+        img.load()
+        return img.copy()
+
+
+# run the extraction in a separate python process
+def _get_tree_isolated(app_bundle, max_depth=None):
+    launch_app(app_bundle, isolated=True)
 
     tmp_file = tempfile.NamedTemporaryFile(delete=False)
-    command = ["python", "-m", "macapptree.main", "-a", app_bundle, "--oa", tmp_file.name]
+    command = [sys.executable, "-m", "macapptree.main", "-a", app_bundle, "--oa", tmp_file.name]
     if max_depth:
         command.extend(["--max-depth", str(max_depth)])
     try:
@@ -35,39 +108,43 @@ def get_tree(app_bundle, max_depth=None):
         raise e
     finally:
         tmp_file.close()
+        os.remove(tmp_file.name)
 
 
-def get_tree_screenshot(app_bundle, max_depth=None):
-    launch_app(app_bundle)
-    
+def _get_tree_screenshot_isolated(app_bundle, max_depth=None, label_masks=False):
+    launch_app(app_bundle, isolated=True)
+
     a11y_tmp_file = tempfile.NamedTemporaryFile(delete=False)
-    screenshot_tmp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
-    command = ["python", "-m", "macapptree.main", 
-                "-a", app_bundle, 
+    screenshot_tmp_dir = tempfile.mkdtemp()
+    command = [sys.executable, "-m", "macapptree.main",
+                "-a", app_bundle,
                 "--oa", a11y_tmp_file.name,
-                "--os", screenshot_tmp_file.name]
+                "--os", screenshot_tmp_dir]
     if max_depth:
         command.extend(["--max-depth", str(max_depth)])
+    if label_masks:
+        command.append("--label-masks")
     try:
         result = subprocess.run(command, capture_output=True, text=True, check=True)
-        json_match = re.search(r'{.*}', result.stdout, re.DOTALL)
+        json_match = re.search(r'^\[.*^\]', result.stdout, re.DOTALL | re.MULTILINE)
         if not json_match:
             print(f"Failed to extract screenshots for {app_bundle}")
-            return json.load(a11y_tmp_file), None, None
-
-        json_str = json_match.group(0)
-        screenshots_paths_dict = json.loads(json_str)
-        croped_img = Image.open(screenshots_paths_dict["croped_screenshot_path"])
-        segmented_img = Image.open(screenshots_paths_dict["segmented_screenshot_path"])
+            tree = json.load(a11y_tmp_file)
+            return (tree, None, None, None) if label_masks else (tree, None, None)
 
-        os.remove(screenshots_paths_dict["croped_screenshot_path"])
-        os.remove(screenshots_paths_dict["segmented_screenshot_path"])
+        screenshots = json.loads(json_match.group(0))
+        croped_img = _load_image(screenshots[0]["cropped_screenshot_path"])
+        segmented_img = _load_image(screenshots[0]["segmented_screenshot_path"])
 
-        return json.load(a11y_tmp_file), croped_img, segmented_img
+        result = (json.load(a11y_tmp_file), croped_img, segmented_img)
+        if label_masks:
+            labels_path = screenshots[0].get("labels_path")
+            result += (labels.load(labels_path) if labels_path else None,)
+        return result
     except (subprocess.CalledProcessError, json.JSONDecodeError) as e:
-        print(f"Failed to extract app accessibility for {app_bundle}. Error: {e.stderr}")
+        print(f"Failed to extract app accessibility for {app_bundle}. Error: {e}")
         raise e
     finally:
         a11y_tmp_file.close()
-        screenshot_tmp_file.close()
-
+        os.remove(a11y_tmp_file.name)
+        shutil.rmtree(screenshot_tmp_dir, ignore_errors=True)
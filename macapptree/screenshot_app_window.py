@@ -1,7 +1,6 @@
 from typing import Iterable, List, Dict, AnyStr, Union, Tuple
 from macapptree.uielement import UIElement
 import subprocess
-from PIL import ImageGrab
 import time
 import Quartz
 import os
@@ -9,6 +8,8 @@ import AppKit
 from unidecode import unidecode
 from PIL import Image
 from macapptree.exceptions import WindowNotFoundException
+from macapptree.capture import get_source, crop_to_window
+from macapptree import readiness
 import time as _time
 
 DOCK_BUNDLE = "com.apple.dock"
@@ -38,12 +39,13 @@ def get_window_info() -> List[WindowInfo]:
     )
 
 
-def capture_full_screen(output_path: str):
-    screen = AppKit.NSScreen.mainScreen()
-    frame = screen.frame()
-    left, top = int(frame.origin.x), int(frame.origin.y)
-    width, height = int(frame.size.width), int(frame.size.height)
-    img = ImageGrab.grab(bbox=(left, top, left + width, top + height))
+# image of the main screen from the capture source, nothing is written to disk
+def grab_full_screen(source=None) -> Image.Image:
+    return (source or get_source()).grab()
+
+
+def capture_full_screen(output_path: str, source=None):
+    img = grab_full_screen(source)
     img.save(output_path)
     print(f"Full-screen screenshot saved to {output_path}")
     return output_path
@@ -98,6 +100,7 @@ def take_screenshot(window: int, filename: str, output_folder: str = None) -> st
     rc, output = subprocess.getstatusoutput(command)
     if rc != SUCCESS:
         raise ScreencaptureEx(f"Error: screencapture output: {output}")
+    readiness.wait_until(readiness.file_complete(filename), 2.0, "screenshot file")
 
     return filename
 
@@ -115,20 +118,18 @@ def get_filename(window_name, extension, add_cursor_move) -> str:
         return f"{time.time():.2f}.{extension}"
 
 
-def crop_screenshot(image_path, window_coords, output_path):
-    backing_scale_factor = AppKit.NSScreen.mainScreen().backingScaleFactor()
+# image_path is a screenshot file or an image of the whole screen
+def crop_screenshot(image_path, window_coords, output_path, source=None):
+    scale = (source or get_source()).scale
 
-    screenshot = Image.open(image_path)
+    screenshot = image_path if isinstance(image_path, Image.Image) else Image.open(image_path)
 
     left, top, width, height = window_coords
 
     right = left + width
     bottom = top + height
 
-    cropped_image = screenshot.crop((int(left * backing_scale_factor),
-                                     int(top * backing_scale_factor),
-                                     int(right * backing_scale_factor),
-                                     int(bottom * backing_scale_factor)))
+    cropped_image = crop_to_window(screenshot, window_coords, scale)
 
     cropped_image.save(output_path)
     scaled_coors = (int(left ),
@@ -167,18 +168,32 @@ def find_window(
     raise WindowNotFoundException(f"Window {window_name} not found.")
 
 
+# image of the window as shown on screen, grabbed into memory, and its (left, top, right, bottom) in points
+def screenshot_window(
+        app_name: str,
+        window_name: str,
+        source=None
+) -> Tuple[Image.Image, Tuple[int, int, int, int]]:
+    _, _, window_coords = find_window(app_name, window_name)
+    image = (source or get_source()).grab(window_coords)
+    left, top, width, height = window_coords
+    return image, (int(left), int(top), int(left + width), int(top + height))
+
+
 def screenshot_window_to_file(
         app_name: str,
         window_name: str,
-        output_file: str
+        output_file: str,
+        source=None
 ) -> str:
-    identifier, _, window_coords = find_window(app_name, window_name)
-    take_screenshot(identifier, output_file)
+    source = source or get_source()
+    _, _, window_coords = find_window(app_name, window_name)
+    screen = grab_full_screen(source)
+    screen.save(output_file)
+    # same cropped file name as before, next to the full screen screenshot
     _, extension = os.path.splitext(output_file)
-    time.sleep(0.4)
     filename_cropped = output_file.replace(f".{extension}", f"_cropped.{extension}")
-    scaled_coors = crop_screenshot(output_file, window_coords, filename_cropped)
-    time.sleep(0.4)
+    scaled_coors = crop_screenshot(screen, window_coords, filename_cropped, source)
     return filename_cropped, scaled_coors
 
 
@@ -190,21 +205,23 @@ def screenshot_windows(
         output_folder: str,
         extension: str = "",
         add_cursor_move: bool = False,
+        source=None,
 ) -> str:
     
     try:
+        source = source or get_source()
         identifier, name, window_coords = find_window(app_name, window_name)
         if name == "":
             name = element_identifier
         file_name = get_filename(name, extension, add_cursor_move)
-        file_path = take_screenshot(identifier, file_name, output_folder)
-        time.sleep(0.4)
-
-        file_path_cropped = file_path.replace(f".{extension}", f"_cropped.{extension}")
         file_name_cropped = file_name.replace(f".{extension}", f"_cropped.{extension}")
+        if output_folder:
+            os.makedirs(output_folder, exist_ok=True)
+        file_path_cropped = os.path.join(output_folder, file_name_cropped) if output_folder else file_name_cropped
 
-        scaled_coors = crop_screenshot(file_path, window_coords, file_path_cropped)
-        time.sleep(0.4)
+        source.grab(window_coords).save(file_path_cropped)
+        left, top, width, height = window_coords
+        scaled_coors = (int(left), int(top), int(left + width), int(top + height))
         return (file_name_cropped, scaled_coors)
     except Exception as e:
         print(repr(e))
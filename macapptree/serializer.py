@@ -0,0 +1,104 @@
+import json
+
+from macapptree import traversal
+from macapptree.uielement import UIElement
+
+
+FORMATS = ("json", "msgpack")
+
+
+# serialize a tree in one pass with typed fields:
+# positions and sizes are numbers, element values are nested nodes instead of escaped JSON
+def serialize(root):
+    # keyed by node: NodeViews of a TreeStore are equal, not identical, across walks
+    results = {}
+    for node in traversal.walk_post_order(root):
+        result = _node(node)
+        result["children"] = [results.pop(child) for child in node.children]
+        results[node] = result
+    return results[root]
+
+
+def _point(point):
+    if point is None:
+        return None
+    return {"x": point.x, "y": point.y}
+
+
+def _size(size):
+    if size is None:
+        return None
+    return {"width": size.width, "height": size.height}
+
+
+def _value(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, UIElement):
+        return serialize(value)
+    if isinstance(value, (list, tuple)):
+        return [_value(item) for item in value]
+    # dates and other foundation objects
+    return str(value)
+
+
+def _node(node):
+    # a TreeStore view keeps the element value dumped for to_dict, and its serialized form next to it
+    value_tree = getattr(node, "value_tree", None)
+    result = {
+        "id": node.identifier,
+        "content_id": node.content_identifier,
+        "name": node.name,
+        "role": node.role,
+        "description": node.description,
+        "role_description": node.role_description,
+        "value": value_tree if value_tree is not None else _value(node.value),
+        "absolute_position": _point(node.absolute_position),
+        "position": _point(node.position),
+        "size": _size(node.size),
+        "enabled": node.enabled,
+        "bbox": node.bbox,
+        "visible_bbox": node.visible_bbox,
+        "visible": node.visible,
+        "children": None,
+    }
+    if getattr(node, "app_name", None) is not None:
+        result["app_name"] = node.app_name
+    if getattr(node, "pruned", False):
+        result["pruned"] = True
+    if getattr(node, "truncated", False):
+        result["truncated"] = True
+    return result
+
+
+def dumps(roots, format="json"):
+    data = [serialize(root) for root in roots]
+    if format == "json":
+        return json.dumps(data, ensure_ascii=False).encode("utf-8")
+    if format == "msgpack":
+        return _msgpack().packb(data, use_bin_type=True)
+    raise ValueError(f"Unknown format: {format}")
+
+
+def dump(roots, path, format="json"):
+    with open(path, "wb") as f:
+        f.write(dumps(roots, format))
+    return path
+
+
+def load(path, format="json"):
+    with open(path, "rb") as f:
+        data = f.read()
+    if format == "json":
+        return json.loads(data)
+    if format == "msgpack":
+        return _msgpack().unpackb(data, raw=False)
+    raise ValueError(f"Unknown format: {format}")
+
+
+def _msgpack():
+    try:
+        import msgpack
+    except ImportError:
+        raise RuntimeError("msgpack output requires the msgpack package")
+    return msgpack
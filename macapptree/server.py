@@ -0,0 +1,182 @@
+import argparse
+import base64
+import io
+import json
+import os
+import socketserver
+import threading
+import time
+
+from macapptree.cache import SubtreeCache
+from macapptree.uielement import UIElement
+
+
+DEFAULT_SOCKET_PATH = "/tmp/macapptree.sock"
+
+
+# one JSON object per line in both directions
+def encode_message(message):
+    return (json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def decode_message(line):
+    return json.loads(line.decode("utf-8"))
+
+
+def encode_image(image):
+    if image is None:
+        return None
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def decode_image(data):
+    if data is None:
+        return None
+    from PIL import Image
+    return Image.open(io.BytesIO(base64.b64decode(data)))
+
+
+# capture backend interface used by the server
+class CaptureBackend:
+    # returns (tree, cropped image, segmented image) for the bundle
+    def capture(self, bundle, max_depth=None, screenshots=False):
+        raise NotImplementedError
+
+
+# captures in the server process, keeping pyobjc, AppKit, Quartz and PIL loaded
+class InProcessCaptureBackend(CaptureBackend):
+    def __init__(self):
+        import macapptree.run as run
+        self.run = run
+
+    def capture(self, bundle, max_depth=None, screenshots=False):
+        if screenshots:
+            return self.run.get_tree_screenshot(bundle, max_depth)
+        return self.run.get_tree(bundle, max_depth), None, None
+
+
+class CaptureServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH, backend=None, max_concurrency=1, max_queue=8):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        self.socket_path = socket_path
+        self.backend = backend or InProcessCaptureBackend()
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.slots = threading.Semaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._pending = 0
+        super().__init__(socket_path, CaptureRequestHandler)
+
+    # reserve a place for the request, returns the queue position or None if the queue is full
+    def enqueue(self):
+        with self._lock:
+            if self._pending >= self.max_concurrency + self.max_queue:
+                return None
+            self._pending += 1
+            return max(0, self._pending - self.max_concurrency)
+
+    def dequeue(self):
+        with self._lock:
+            self._pending -= 1
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+class CaptureRequestHandler(socketserver.StreamRequestHandler):
+    def send(self, message):
+        self.wfile.write(encode_message(message))
+        self.wfile.flush()
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = decode_message(line)
+            except json.JSONDecodeError as e:
+                self.send({"type": "error", "error": f"Invalid request: {e}"})
+                continue
+            self.handle_request(request)
+
+    def handle_request(self, request):
+        request_id = request.get("id")
+        bundles = request.get("bundles") or []
+        max_depth = request.get("max_depth")
+        screenshots = bool(request.get("screenshots", False))
+
+        queue_position = self.server.enqueue()
+        if queue_position is None:
+            self.send({"id": request_id, "type": "rejected", "error": "Capture queue is full"})
+            return
+
+        try:
+            self.send({"id": request_id, "type": "accepted", "queue_position": queue_position})
+            with self.server.slots:
+                start = time.time()
+                for bundle in bundles:
+                    self.capture_bundle(request_id, bundle, max_depth, screenshots)
+                done = {"id": request_id, "type": "done", "elapsed": time.time() - start}
+                if UIElement.subtree_cache is not None:
+                    done["cache"] = UIElement.subtree_cache.stats.to_dict()
+                self.send(done)
+        finally:
+            self.server.dequeue()
+
+    def capture_bundle(self, request_id, bundle, max_depth, screenshots):
+        start = time.time()
+        try:
+            tree, cropped, segmented = self.server.backend.capture(bundle, max_depth, screenshots)
+        except Exception as e:
+            self.send({"id": request_id, "type": "error", "bundle": bundle, "error": repr(e)})
+            return
+        message = {
+            "id": request_id,
+            "type": "tree",
+            "bundle": bundle,
+            "tree": tree,
+            "elapsed": time.time() - start,
+        }
+        if screenshots:
+            message["cropped_image"] = encode_image(cropped)
+            message["segmented_image"] = encode_image(segmented)
+        self.send(message)
+
+
+# cache is an optional cache.SubtreeCache shared by all captures of the server
+def serve(socket_path=DEFAULT_SOCKET_PATH, max_concurrency=1, max_queue=8, backend=None, cache=None):
+    if cache is not None:
+        UIElement.subtree_cache = cache
+    server = CaptureServer(socket_path, backend, max_concurrency, max_queue)
+    print(f"macapptree server listening on {socket_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--socket", type=str, default=DEFAULT_SOCKET_PATH, help="Unix socket path to listen on")
+    parser.add_argument("--concurrency", type=int, default=1, help="Maximum number of captures running at once")
+    parser.add_argument("--queue", type=int, default=8, help="Maximum number of requests waiting for a capture slot")
+    parser.add_argument("--cache-ttl", type=float, default=None,
+                        help="Reuse unchanged subtrees of earlier captures for this many seconds")
+    parser.add_argument("--cache-entries", type=int, default=10000, help="Maximum number of cached subtrees")
+    parser.add_argument("--cache-mb", type=float, default=None, help="Approximate memory bound of the cache in MB")
+    args = parser.parse_args()
+
+    cache = None
+    if args.cache_ttl is not None:
+        max_bytes = int(args.cache_mb * 1024 * 1024) if args.cache_mb is not None else None
+        cache = SubtreeCache(max_entries=args.cache_entries, ttl=args.cache_ttl, max_bytes=max_bytes)
+    serve(args.socket, args.concurrency, args.queue, cache=cache)
@@ -0,0 +1,241 @@
+import math
+
+import numpy as np
+
+from macapptree import traversal
+
+
+# boxes covering more grid cells than this are not put into the cells but checked on every query,
+# so windows and large groups do not fill thousands of cells each
+MAX_CELLS_PER_BOX = 64
+MIN_CELL_SIZE = 4.0
+
+
+# screen-space (x1, y1, x2, y2) box of a captured element, None when it is not visible.
+# win_rect is the window_screen_rect of the element's root, read from the element when not given
+def screen_box(element, win_rect=None):
+    if not getattr(element, "visible", False):
+        return None
+    if win_rect is None:
+        win_rect = getattr(element, "window_screen_rect", None)
+    vb = getattr(element, "visible_bbox", None)
+    if not win_rect or not vb:
+        return None
+    wx1, wy1 = win_rect[0], win_rect[1]
+    return (wx1 + vb[0], wy1 + vb[1], wx1 + vb[2], wy1 + vb[3])
+
+
+# uniform grid over the screen boxes of captured trees, for hit testing without accessibility calls.
+# boxes are closed: a point on the edge of an element is inside it, like in UIElement._set_bboxes.
+# elements are numbered in pre-order over the roots; when several elements contain a point the deepest
+# one wins, and among equally deep ones the one that comes later, i.e. is drawn on top.
+class SpatialIndex:
+    def __init__(self, roots, cell_size=None):
+        elements = []
+        boxes = []
+        depths = []
+        for root in roots:
+            win_rect = getattr(root, "window_screen_rect", None)
+            for element, depth, _ in traversal.walk_with_depth(root):
+                box = screen_box(element, win_rect)
+                if box is None:
+                    continue
+                elements.append(element)
+                boxes.append(box)
+                depths.append(depth)
+        self.elements = elements
+        self.boxes = np.array(boxes, dtype=np.float64).reshape(-1, 4)
+        self.depths = np.array(depths, dtype=np.int64)
+        # rank of every element in hit test order, higher wins
+        self.priority = np.empty(len(elements), dtype=np.int64)
+        self.priority[np.lexsort((np.arange(len(elements)), self.depths))] = np.arange(len(elements))
+        self.cell_size = float(cell_size) if cell_size else self._default_cell_size()
+        self._build_grid()
+
+    def __len__(self):
+        return len(self.elements)
+
+    def __repr__(self):
+        return (f"SpatialIndex(elements={len(self.elements)}, cell_size={self.cell_size:.1f}, "
+                f"grid={self.columns}x{self.rows}, large={len(self.large)})")
+
+    # about the size of a typical element, so most boxes touch a few cells only
+    def _default_cell_size(self):
+        if not len(self.boxes):
+            return MIN_CELL_SIZE
+        sides = np.maximum(self.boxes[:, 2] - self.boxes[:, 0], self.boxes[:, 3] - self.boxes[:, 1])
+        return max(MIN_CELL_SIZE, float(np.median(sides)))
+
+    def _cells(self, x, y):
+        column = np.floor((x - self.origin[0]) / self.cell_size).astype(np.int64)
+        row = np.floor((y - self.origin[1]) / self.cell_size).astype(np.int64)
+        return column, row
+
+    # cells as CSR: the elements of cell c are cell_items[cell_start[c]:cell_start[c + 1]]
+    def _build_grid(self):
+        boxes = self.boxes
+        if len(boxes):
+            self.origin = (float(boxes[:, 0].min()), float(boxes[:, 1].min()))
+            self.columns = int((boxes[:, 2].max() - self.origin[0]) // self.cell_size) + 1
+            self.rows = int((boxes[:, 3].max() - self.origin[1]) // self.cell_size) + 1
+        else:
+            self.origin = (0.0, 0.0)
+            self.columns = self.rows = 0
+
+        c1, r1 = self._cells(boxes[:, 0], boxes[:, 1])
+        c2, r2 = self._cells(boxes[:, 2], boxes[:, 3])
+        widths = c2 - c1 + 1
+        heights = r2 - r1 + 1
+        counts = widths * heights
+        is_large = counts > MAX_CELLS_PER_BOX
+        self.large = np.flatnonzero(is_large)
+
+        small = np.flatnonzero(~is_large)
+        counts = counts[small]
+        # one (cell, element) pair per covered cell, enumerated without a Python loop
+        items = np.repeat(small, counts)
+        offsets = _ranges(np.zeros_like(counts), counts)
+        widths = np.repeat(widths[small], counts)
+        columns = np.repeat(c1[small], counts) + offsets % widths
+        rows = np.repeat(r1[small], counts) + offsets // widths
+        cells = rows * self.columns + columns
+
+        order = np.argsort(cells, kind="stable")
+        self.cell_items = items[order]
+        self.cell_start = np.searchsorted(cells[order], np.arange(self.columns * self.rows + 1))
+
+    # elements put into the given cells, with repeats
+    def _cell_items(self, cells):
+        starts = self.cell_start[cells]
+        counts = self.cell_start[cells + 1] - starts
+        return self.cell_items[_ranges(starts, counts)]
+
+    # elements that may intersect the given cells: the ones in them and the large ones
+    def _candidates(self, cells):
+        return np.concatenate([self._cell_items(cells), self.large])
+
+    def _cells_in(self, c1, r1, c2, r2):
+        c1, c2 = max(c1, 0), min(c2, self.columns - 1)
+        r1, r2 = max(r1, 0), min(r2, self.rows - 1)
+        if c1 > c2 or r1 > r2:
+            return np.empty(0, dtype=np.int64)
+        rows = np.arange(r1, r2 + 1)[:, None]
+        return (rows * self.columns + np.arange(c1, c2 + 1)).ravel()
+
+    # indices of the elements containing the point, unordered
+    def _containing(self, x, y):
+        column, row = self._cells(x, y)
+        if 0 <= column < self.columns and 0 <= row < self.rows:
+            cell = row * self.columns + column
+            candidates = np.concatenate([self.cell_items[self.cell_start[cell]:self.cell_start[cell + 1]], self.large])
+        else:
+            candidates = self.large
+        boxes = self.boxes[candidates]
+        inside = (boxes[:, 0] <= x) & (x <= boxes[:, 2]) & (boxes[:, 1] <= y) & (y <= boxes[:, 3])
+        return candidates[inside]
+
+    # the deepest element at the screen point, or None
+    def hit_test(self, x, y):
+        found = self._containing(x, y)
+        if not len(found):
+            return None
+        return self.elements[found[np.argmax(self.priority[found])]]
+
+    # every element containing the point, the one hit_test returns last
+    def elements_at(self, x, y):
+        found = self._containing(x, y)
+        found = found[np.argsort(self.priority[found])]
+        return [self.elements[i] for i in found.tolist()]
+
+    # hit_test for many points at once, points is an (n, 2) array; returns element indices, -1 for none
+    def hit_test_indices(self, points):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        x, y = points[:, 0], points[:, 1]
+        best = np.full(len(points), -1, dtype=np.int64)
+        if not len(self.elements):
+            return best
+
+        # points against the elements of their cell
+        column, row = self._cells(x, y)
+        on_grid = np.flatnonzero((column >= 0) & (column < self.columns) & (row >= 0) & (row < self.rows))
+        cells = row[on_grid] * self.columns + column[on_grid]
+        counts = self.cell_start[cells + 1] - self.cell_start[cells]
+        point_of = np.repeat(on_grid, counts)
+        items = self._cell_items(cells)
+        # points against the large elements
+        if len(self.large):
+            point_of = np.concatenate([point_of, np.repeat(np.arange(len(points)), len(self.large))])
+            items = np.concatenate([items, np.tile(self.large, len(points))])
+
+        boxes = self.boxes[items]
+        px, py = x[point_of], y[point_of]
+        inside = (boxes[:, 0] <= px) & (px <= boxes[:, 2]) & (boxes[:, 1] <= py) & (py <= boxes[:, 3])
+        point_of, items = point_of[inside], items[inside]
+        # the best hit of every point is the last one after sorting by point, then priority
+        order = np.lexsort((self.priority[items], point_of))
+        point_of, items = point_of[order], items[order]
+        last = np.ones(len(point_of), dtype=bool)
+        last[:-1] = point_of[1:] != point_of[:-1]
+        best[point_of[last]] = items[last]
+        return best
+
+    def hit_test_many(self, points):
+        return [self.elements[i] if i >= 0 else None for i in self.hit_test_indices(points).tolist()]
+
+    # elements whose boxes intersect the screen rect (x1, y1, x2, y2), in pre-order
+    def intersecting(self, rect):
+        x1, y1, x2, y2 = rect
+        c1, r1 = self._cells(x1, y1)
+        c2, r2 = self._cells(x2, y2)
+        cells = self._cells_in(int(c1), int(r1), int(c2), int(r2))
+        candidates = np.unique(self._candidates(cells)) if len(cells) else self.large
+        boxes = self.boxes[candidates]
+        hits = (boxes[:, 0] <= x2) & (x1 <= boxes[:, 2]) & (boxes[:, 1] <= y2) & (y1 <= boxes[:, 3])
+        return [self.elements[i] for i in np.sort(candidates[hits]).tolist()]
+
+    # distances from the point to the boxes, 0 inside
+    def _distances(self, indices, x, y):
+        boxes = self.boxes[indices]
+        dx = np.maximum(np.maximum(boxes[:, 0] - x, x - boxes[:, 2]), 0)
+        dy = np.maximum(np.maximum(boxes[:, 1] - y, y - boxes[:, 3]), 0)
+        return np.hypot(dx, dy)
+
+    # the k elements closest to the point as (distance, element), closest first; among elements at
+    # the same distance, e.g. all the ones containing the point, the hit_test order decides
+    def nearest(self, x, y, k=1):
+        if not len(self.elements) or k <= 0:
+            return []
+        k = min(k, len(self.elements))
+        # a point off the grid starts from the closest cell, the sides beyond it hold nothing
+        column, row = (int(v) for v in self._cells(x, y))
+        column = min(max(column, 0), self.columns - 1)
+        row = min(max(row, 0), self.rows - 1)
+        radius = 0
+        # search a square of cells around the point, doubling it until nothing outside can be closer
+        while True:
+            left, top = column - radius, row - radius
+            right, bottom = column + radius, row + radius
+            candidates = np.unique(self._candidates(self._cells_in(left, top, right, bottom)))
+            covers = left <= 0 and top <= 0 and right >= self.columns - 1 and bottom >= self.rows - 1
+            if covers or len(candidates) >= k:
+                distances = self._distances(candidates, x, y)
+                if covers:
+                    break
+                # the closest point outside the square, sides at the edge of the grid have nothing beyond
+                bound = min(
+                    x - (self.origin[0] + left * self.cell_size) if left > 0 else math.inf,
+                    self.origin[0] + (right + 1) * self.cell_size - x if right < self.columns - 1 else math.inf,
+                    y - (self.origin[1] + top * self.cell_size) if top > 0 else math.inf,
+                    self.origin[1] + (bottom + 1) * self.cell_size - y if bottom < self.rows - 1 else math.inf,
+                )
+                if np.partition(distances, k - 1)[k - 1] <= bound:
+                    break
+            radius = radius * 2 or 1
+        order = np.lexsort((-self.priority[candidates], distances))[:k]
+        return [(float(distances[i]), self.elements[candidates[i]]) for i in order.tolist()]
+
+
+# concatenated aranges start[i]:start[i] + count[i]
+def _ranges(starts, counts):
+    ends = np.cumsum(counts)
+    return np.repeat(starts - ends + counts, counts) + np.arange(ends[-1] if len(ends) else 0)
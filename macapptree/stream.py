@@ -0,0 +1,246 @@
+import contextvars
+import gzip
+import itertools
+import json
+import queue
+import threading
+from contextlib import contextmanager
+
+from macapptree import traversal
+
+
+_STOP = object()
+
+
+# open a (possibly compressed) file for text writing or reading
+def open_stream(path, mode="w", compression=None):
+    if compression is None:
+        if path.endswith(".gz"):
+            compression = "gzip"
+        elif path.endswith(".zst"):
+            compression = "zstd"
+
+    if compression == "gzip":
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError("zstd compression requires the zstandard package")
+        import io
+        if mode == "w":
+            raw = zstandard.ZstdCompressor().stream_writer(open(path, "wb"), closefd=True)
+        else:
+            raw = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+        return io.TextIOWrapper(raw, encoding="utf-8")
+    if compression is not None:
+        raise ValueError(f"Unknown compression: {compression}")
+    return open(path, mode, encoding="utf-8")
+
+
+# writes tree nodes as newline-delimited JSON from a background thread.
+# every line is one node without its children plus node_id, parent_id, depth and index.
+# nodes built inside writer.window() also carry the window number, and the window ends with an
+# {"event": "end"} line once its root is written, or an {"event": "abort"} line if the build failed.
+class NDJSONTreeWriter:
+    def __init__(self, path, compression=None, max_pending=10000):
+        self.path = path
+        self._file = open_stream(path, "w", compression)
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._ids = itertools.count()
+        # id(node) -> (node_id, window, node) of the nodes whose children were emitted before them,
+        # the reference keeps the id from being reused until the node is emitted
+        self._node_ids = {}
+        self._windows = itertools.count()
+        self._window = contextvars.ContextVar("ndjson_window", default=None)
+        # window of the roots built inside window(), until they are written
+        self._root_windows = {}
+        self._window_nodes = {}
+        self._lock = threading.Lock()
+        self._error = None
+        self.nodes_written = 0
+        self._thread = threading.Thread(target=self._run, name="ndjson-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            if record is _STOP:
+                break
+            if self._error is not None:
+                continue
+            try:
+                self._file.write(json.dumps(record, ensure_ascii=False))
+                self._file.write("\n")
+                if "event" not in record:
+                    self.nodes_written += 1
+            except Exception as e:
+                self._error = e
+
+    def _node_id(self, node):
+        with self._lock:
+            entry = self._node_ids.get(id(node))
+            if entry is None:
+                entry = (next(self._ids), self._window.get(), node)
+                self._node_ids[id(node)] = entry
+            return entry[0]
+
+    def _release(self, node):
+        with self._lock:
+            entry = self._node_ids.pop(id(node), None)
+            return entry[0] if entry is not None else None
+
+    # number the nodes built in the block as one window, returns the window number.
+    # an exception leaving the block writes the abort marker; the nodes already written stay in
+    # the file and load_ndjson skips them
+    @contextmanager
+    def window(self):
+        window = next(self._windows)
+        token = self._window.set(window)
+        try:
+            yield window
+        except BaseException as e:
+            with self._lock:
+                # the unfinished nodes are never emitted, their objects may be reused
+                for key in [key for key, (_, owner, _) in self._node_ids.items() if owner == window]:
+                    del self._node_ids[key]
+                nodes = self._window_nodes.pop(window, 0)
+            self._queue.put({"event": "abort", "window": window, "nodes": nodes, "reason": f"{type(e).__name__}: {e}"})
+            raise
+        finally:
+            self._window.reset(token)
+
+    def _emit(self, node, parent_id, depth, index):
+        node_id = self._release(node)
+        if node_id is None:
+            node_id = next(self._ids)
+        window = self._window.get()
+        if parent_id is None:
+            with self._lock:
+                window = self._root_windows.pop(id(node), window)
+        if window is not None:
+            with self._lock:
+                self._window_nodes[window] = self._window_nodes.get(window, 0) + 1
+        record = node._node_dict()
+        del record["children"]
+        if parent_id is None and getattr(node, "app_name", None):
+            record["app_name"] = node.app_name
+        record["node_id"] = node_id
+        record["parent_id"] = parent_id
+        record["depth"] = depth
+        record["index"] = index
+        if window is not None:
+            record["window"] = window
+        self._queue.put(record)
+        return window
+
+    # traversal visitor: emits the children of a node once the node is finished
+    def visit(self, node, depth):
+        window = self._window.get()
+        if depth == 0 and window is not None:
+            with self._lock:
+                self._root_windows[id(node)] = window
+        if not node.children:
+            return
+        parent_id = self._node_id(node)
+        for index, child in enumerate(node.children):
+            self._emit(child, parent_id, depth + 1, index)
+
+    # emit the root of a tree built with visitor=writer.visit, and the end marker of its window
+    def write_root(self, root, index=0):
+        window = self._emit(root, None, 0, index)
+        if window is not None:
+            with self._lock:
+                nodes = self._window_nodes.pop(window, 0)
+            self._queue.put({"event": "end", "window": window, "nodes": nodes})
+
+    # emit a tree that is already built
+    def write_tree(self, root, index=0):
+        with self.window():
+            # reversed pre-order visits every node before the node itself is emitted by its parent
+            for node, depth, _ in reversed(list(traversal.walk_with_depth(root))):
+                self.visit(node, depth)
+            self.write_root(root, index)
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._file.close()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# rebuild the nested dictionaries from a file written by NDJSONTreeWriter.
+# windows that were aborted, or have no end marker because the capture stopped, are skipped, as are
+# nodes whose parent is missing. skipped is extended with one {"window", "nodes", "reason"} dict per
+# skipped window (window None for the nodes without parent); without it they are printed
+def load_ndjson(path, compression=None, skipped=None):
+    nodes = {}
+    parents = {}
+    indices = {}
+    windows = {}
+    ended = set()
+    aborted = {}
+    with open_stream(path, "r", compression) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            event = record.pop("event", None)
+            if event == "end":
+                ended.add(record["window"])
+                continue
+            if event == "abort":
+                aborted[record["window"]] = record.get("reason")
+                continue
+            node_id = record.pop("node_id")
+            parents[node_id] = record.pop("parent_id")
+            indices[node_id] = record.pop("index", 0)
+            record.pop("depth", None)
+            window = record.pop("window", None)
+            if window is not None:
+                windows.setdefault(window, []).append(node_id)
+            nodes[node_id] = record
+
+    report = []
+    for window in sorted(set(windows) | set(aborted)):
+        if window in ended and window not in aborted:
+            continue
+        node_ids = windows.get(window, [])
+        for node_id in node_ids:
+            del nodes[node_id]
+        report.append({"window": window, "nodes": len(node_ids), "reason": aborted.get(window, "no end marker")})
+
+    children = {}
+    roots = []
+    for node_id, record in nodes.items():
+        record["children"] = children.setdefault(node_id, [])
+        parent_id = parents[node_id]
+        if parent_id is None:
+            roots.append((indices[node_id], record))
+        else:
+            children.setdefault(parent_id, []).append((indices[node_id], record))
+    for node_list in children.values():
+        node_list.sort(key=lambda item: item[0])
+        node_list[:] = [child for _, child in node_list]
+    roots.sort(key=lambda item: item[0])
+    roots = [root for _, root in roots]
+
+    # children of parents that were never written
+    orphans = sum(len(node_list) for parent_id, node_list in children.items() if parent_id not in nodes)
+    if orphans:
+        reachable = sum(1 for root in roots for _ in traversal.walk(root, children=lambda node: node["children"]))
+        report.append({"window": None, "nodes": len(nodes) - reachable, "reason": "parent missing"})
+
+    if skipped is not None:
+        skipped.extend(report)
+    else:
+        for entry in report:
+            print(f"Skipped {entry['nodes']} nodes of window {entry['window']}: {entry['reason']}")
+    return roots
@@ -0,0 +1,106 @@
+from collections import deque
+
+
+DFS = "dfs"
+BFS = "bfs"
+
+
+def _children(node):
+    return getattr(node, "children", None) or []
+
+
+class _Pending:
+    __slots__ = ("node", "depth", "parent", "remaining")
+
+    def __init__(self, node, depth, parent):
+        self.node = node
+        self.depth = depth
+        self.parent = parent
+        self.remaining = 0
+
+
+# build a tree from a root whose children were not expanded yet, without recursion.
+# nodes implement _expand() -> children to visit and _finish() called children first.
+# a node is finished, and passed to visitor(node, depth), as soon as its whole subtree is built.
+# with release the children of a node are dropped once the visitor has seen it, so only the
+# subtrees still being built are kept and the visitor is the only consumer of the tree.
+def build(root, order=DFS, visitor=None, release=False):
+    if order not in (DFS, BFS):
+        raise ValueError(f"Unknown traversal order: {order}")
+    if release and visitor is None:
+        raise ValueError("release needs a visitor")
+
+    pending = deque([_Pending(root, 0, None)])
+    while pending:
+        entry = pending.pop() if order == DFS else pending.popleft()
+        children = entry.node._expand()
+        entry.remaining = len(children)
+        if not children:
+            _finish(entry, visitor, release)
+            continue
+        if order == DFS:
+            children = reversed(children)
+        for child in children:
+            pending.append(_Pending(child, entry.depth + 1, entry))
+    return root
+
+
+# finish the entry and every ancestor whose last child it was
+def _finish(entry, visitor, release=False):
+    while entry is not None:
+        entry.node._finish()
+        if visitor is not None:
+            visitor(entry.node, entry.depth)
+        if release:
+            entry.node.children = []
+        entry = entry.parent
+        if entry is not None:
+            entry.remaining -= 1
+            if entry.remaining > 0:
+                return
+
+
+# one visitor calling the given ones in order, None ones are skipped
+def chain(*visitors):
+    visitors = [visitor for visitor in visitors if visitor is not None]
+    if not visitors:
+        return None
+    if len(visitors) == 1:
+        return visitors[0]
+
+    def visit(node, depth):
+        for visitor in visitors:
+            visitor(node, depth)
+    return visit
+
+
+# yield the nodes of the tree in pre-order (dfs) or level order (bfs)
+def walk(root, order=DFS, children=_children):
+    for node, _, _ in walk_with_depth(root, order, children):
+        yield node
+
+
+# yield (node, depth, parent) tuples
+def walk_with_depth(root, order=DFS, children=_children):
+    pending = deque([(root, 0, None)])
+    while pending:
+        node, depth, parent = pending.pop() if order == DFS else pending.popleft()
+        yield node, depth, parent
+        node_children = children(node)
+        if order == DFS:
+            node_children = reversed(node_children)
+        for child in node_children:
+            pending.append((child, depth + 1, node))
+
+
+# yield the nodes so that every node comes after all of its descendants
+def walk_post_order(root, children=_children):
+    stack = [(root, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded:
+            yield node
+            continue
+        stack.append((node, True))
+        for child in reversed(children(node)):
+            stack.append((child, False))
@@ -0,0 +1,428 @@
+import sys
+import threading
+from collections import deque
+
+import numpy as np
+
+from macapptree import serializer
+from macapptree.backend import Point, Size
+
+
+# struct-of-arrays storage for captured trees.
+# nodes are laid out in breadth-first order so the children of a node are contiguous.
+class TreeStore:
+    def __init__(self, size=0):
+        self.parent = np.full(size, -1, dtype=np.int32)
+        self.depth = np.zeros(size, dtype=np.int32)
+        self.child_start = np.zeros(size, dtype=np.int32)
+        self.child_count = np.zeros(size, dtype=np.int32)
+        self.role_id = np.zeros(size, dtype=np.uint16)
+        self.enabled = np.zeros(size, dtype=bool)
+        self.visible = np.zeros(size, dtype=bool)
+        self.pruned = np.zeros(size, dtype=bool)
+        self.truncated = np.zeros(size, dtype=bool)
+        # bboxes are (x1, y1, x2, y2), missing ones are flagged in has_bbox/has_visible_bbox
+        self.bbox = np.zeros((size, 4), dtype=np.int32)
+        self.has_bbox = np.zeros(size, dtype=bool)
+        self.visible_bbox = np.zeros((size, 4), dtype=np.int32)
+        self.has_visible_bbox = np.zeros(size, dtype=bool)
+        # position and absolute position are (x, y), size is (width, height)
+        self.position = np.zeros((size, 2), dtype=np.float64)
+        self.absolute_position = np.zeros((size, 2), dtype=np.float64)
+        self.has_position = np.zeros(size, dtype=bool)
+        self.size = np.zeros((size, 2), dtype=np.float64)
+        self.has_size = np.zeros(size, dtype=bool)
+
+        self.names = [None] * size
+        self.descriptions = [None] * size
+        self.role_descriptions = [None] * size
+        self.values = [None] * size
+        self.identifiers = [""] * size
+        self.content_identifiers = [""] * size
+        # index -> serializer form of an element value, values holds it dumped like to_dict does.
+        # few nodes have one, so it is not a column
+        self.value_trees = {}
+
+        # interned role strings
+        self.roles = []
+        self._role_ids = {}
+
+        # per-root context, stored once instead of on every node
+        self.root_indices = []
+        self.root_screen_rects = []
+        self.root_app_names = []
+        self._root_slots = {}
+
+    def __len__(self):
+        return len(self.parent)
+
+    def intern_role(self, role):
+        role_id = self._role_ids.get(role)
+        if role_id is None:
+            role_id = len(self.roles)
+            self.roles.append(role)
+            self._role_ids[role] = role_id
+        return role_id
+
+    @classmethod
+    def from_elements(cls, roots):
+        # assign indices breadth-first so that children are contiguous
+        order = []
+        parents = []
+        depths = []
+        pending = deque((root, -1, 0) for root in roots)
+        while pending:
+            node, parent, depth = pending.popleft()
+            order.append(node)
+            parents.append(parent)
+            depths.append(depth)
+            index = len(order) - 1
+            for child in getattr(node, "children", None) or []:
+                pending.append((child, index, depth + 1))
+
+        store = cls(len(order))
+        store.parent[:] = parents
+        store.depth[:] = depths
+
+        next_child = len(roots)
+        for index, node in enumerate(order):
+            children = getattr(node, "children", None) or []
+            store.child_start[index] = next_child
+            store.child_count[index] = len(children)
+            next_child += len(children)
+            store._set_node(index, node)
+
+        for index, root in enumerate(roots):
+            store._root_slots[index] = len(store.root_indices)
+            store.root_indices.append(index)
+            store.root_screen_rects.append(getattr(root, "window_screen_rect", None))
+            store.root_app_names.append(getattr(root, "app_name", None))
+        return store
+
+    # change the number of node slots, new slots are empty
+    def _resize(self, size):
+        kept = min(len(self), size)
+        for name, column in list(vars(self).items()):
+            if not isinstance(column, np.ndarray):
+                continue
+            resized = np.zeros((size,) + column.shape[1:], dtype=column.dtype)
+            resized[:kept] = column[:kept]
+            setattr(self, name, resized)
+        self.parent[kept:] = -1
+        for column, empty in ((self.names, None), (self.descriptions, None), (self.role_descriptions, None),
+                              (self.values, None), (self.identifiers, ""), (self.content_identifiers, "")):
+            del column[size:]
+            column.extend([empty] * (size - len(column)))
+        self.value_trees = {index: tree for index, tree in self.value_trees.items() if index < size}
+
+    def _set_node(self, index, node):
+        self.role_id[index] = self.intern_role(node.role)
+        self.enabled[index] = bool(node.enabled)
+        self.visible[index] = bool(getattr(node, "visible", False))
+        self.pruned[index] = bool(getattr(node, "pruned", False))
+        self.truncated[index] = bool(getattr(node, "truncated", False))
+
+        bbox = getattr(node, "bbox", None)
+        if bbox:
+            self.bbox[index] = bbox
+            self.has_bbox[index] = True
+        visible_bbox = getattr(node, "visible_bbox", None)
+        if visible_bbox:
+            self.visible_bbox[index] = visible_bbox
+            self.has_visible_bbox[index] = True
+
+        if node.position is not None:
+            self.position[index] = (node.position.x, node.position.y)
+            self.absolute_position[index] = (node.absolute_position.x, node.absolute_position.y)
+            self.has_position[index] = True
+        if node.size is not None:
+            self.size[index] = (node.size.width, node.size.height)
+            self.has_size[index] = True
+
+        self.names[index] = _intern(node.name)
+        self.descriptions[index] = _intern(node.description)
+        self.role_descriptions[index] = _intern(node.role_description)
+        self.values[index] = node.serialized_value()
+        if hasattr(node.value, "content_identifier"):
+            self.value_trees[index] = serializer.serialize(node.value)
+        self.identifiers[index] = node.identifier
+        self.content_identifiers[index] = node.content_identifier
+
+    def node(self, index):
+        return NodeView(self, index)
+
+    @property
+    def root_nodes(self):
+        return [NodeView(self, index) for index in self.root_indices]
+
+    def nodes(self):
+        return [NodeView(self, index) for index in range(len(self))]
+
+    def root_of(self, index):
+        while self.parent[index] >= 0:
+            index = self.parent[index]
+        return int(index)
+
+    def to_dict(self):
+        return [root.to_dict() for root in self.root_nodes]
+
+    # approximate memory used by the store, in bytes
+    def nbytes(self):
+        arrays = sum(value.nbytes for value in vars(self).values() if isinstance(value, np.ndarray))
+        lists = sum(
+            sys.getsizeof(value)
+            for value in (self.names, self.descriptions, self.role_descriptions,
+                          self.values, self.identifiers, self.content_identifiers, self.value_trees)
+        )
+        return arrays + lists
+
+
+# fills a TreeStore while a tree is built: pass visit as the traversal visitor, then add_root once the
+# root is finished. the children of a node are stored together when the node finishes, so they are
+# contiguous like in from_elements, only the blocks are in the order the nodes finished.
+# with UIElement(..., release=True) each node is dropped once it is stored.
+class TreeStoreBuilder:
+    def __init__(self, capacity=1024):
+        self.store = TreeStore(capacity)
+        self.count = 0
+        # id(node) -> (child_start, child_count, node) of the finished nodes that are not stored yet,
+        # the reference keeps the id from being reused when a build is abandoned
+        self._blocks = {}
+        self._roots = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def _append(self, node, depth):
+        store = self.store
+        index = self.count
+        if index == len(store):
+            store._resize(max(2 * index, 1024))
+        self.count += 1
+        store.depth[index] = depth
+        store._set_node(index, node)
+        start, count, _ = self._blocks.pop(id(node), (index, 0, None))
+        store.child_start[index] = start
+        store.child_count[index] = count
+        store.parent[start:start + count] = index
+        return index
+
+    # traversal visitor: stores the children of a node once the node is finished
+    def visit(self, node, depth):
+        children = getattr(node, "children", None) or []
+        if not children:
+            return
+        with self._lock:
+            start = self.count
+            for child in children:
+                self._append(child, depth + 1)
+            self._blocks[id(node)] = (start, len(children), node)
+
+    # store the root of a tree built with visitor=builder.visit, returns its view
+    def add_root(self, root, window_screen_rect=None, app_name=None):
+        with self._lock:
+            index = self._append(root, 0)
+            store = self.store
+            store._root_slots[index] = len(store.root_indices)
+            store.root_indices.append(index)
+            store.root_screen_rects.append(window_screen_rect)
+            store.root_app_names.append(app_name if app_name is not None else getattr(root, "app_name", None))
+            self._roots[id(root)] = index
+            return NodeView(store, index)
+
+    # view of a root passed to add_root
+    def view(self, root):
+        return NodeView(self.store, self._roots[id(root)])
+
+    # the store trimmed to the stored nodes
+    def build(self):
+        with self._lock:
+            self.store._resize(self.count)
+            return self.store
+
+
+def _intern(value):
+    if isinstance(value, str):
+        return sys.intern(value)
+    return value
+
+
+# read-only view of one node of a TreeStore, exposing the UIElement attributes
+class NodeView:
+    __slots__ = ("store", "index")
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = int(index)
+
+    def __eq__(self, other):
+        return isinstance(other, NodeView) and self.store is other.store and self.index == other.index
+
+    def __hash__(self):
+        return hash((id(self.store), self.index))
+
+    def __repr__(self):
+        return f"NodeView({self.index}, {self.role})"
+
+    @property
+    def role(self):
+        return self.store.roles[self.store.role_id[self.index]]
+
+    @property
+    def name(self):
+        return self.store.names[self.index]
+
+    @property
+    def description(self):
+        return self.store.descriptions[self.index]
+
+    @property
+    def role_description(self):
+        return self.store.role_descriptions[self.index]
+
+    @property
+    def value(self):
+        return self.store.values[self.index]
+
+    # element value in the serializer form, None for other values
+    @property
+    def value_tree(self):
+        return self.store.value_trees.get(self.index)
+
+    @property
+    def enabled(self):
+        return bool(self.store.enabled[self.index])
+
+    @property
+    def visible(self):
+        return bool(self.store.visible[self.index])
+
+    @property
+    def pruned(self):
+        return bool(self.store.pruned[self.index])
+
+    @property
+    def truncated(self):
+        return bool(self.store.truncated[self.index])
+
+    @property
+    def identifier(self):
+        return self.store.identifiers[self.index]
+
+    @property
+    def content_identifier(self):
+        return self.store.content_identifiers[self.index]
+
+    @property
+    def bbox(self):
+        if not self.store.has_bbox[self.index]:
+            return None
+        return self.store.bbox[self.index].tolist()
+
+    @property
+    def visible_bbox(self):
+        if not self.store.has_visible_bbox[self.index]:
+            return None
+        return self.store.visible_bbox[self.index].tolist()
+
+    @property
+    def position(self):
+        if not self.store.has_position[self.index]:
+            return None
+        return Point(*self.store.position[self.index].tolist())
+
+    @property
+    def absolute_position(self):
+        if not self.store.has_position[self.index]:
+            return None
+        return Point(*self.store.absolute_position[self.index].tolist())
+
+    @property
+    def size(self):
+        if not self.store.has_size[self.index]:
+            return None
+        return Size(*self.store.size[self.index].tolist())
+
+    @property
+    def depth(self):
+        return int(self.store.depth[self.index])
+
+    @property
+    def parent(self):
+        parent = self.store.parent[self.index]
+        if parent < 0:
+            return None
+        return NodeView(self.store, parent)
+
+    @property
+    def children(self):
+        start = self.store.child_start[self.index]
+        count = self.store.child_count[self.index]
+        return [NodeView(self.store, index) for index in range(start, start + count)]
+
+    @property
+    def window_screen_rect(self):
+        root = self.store.root_of(self.index)
+        return self.store.root_screen_rects[self.store._root_slots[root]]
+
+    @property
+    def app_name(self):
+        if self.store.parent[self.index] >= 0:
+            return None
+        return self.store.root_app_names[self.store._root_slots[self.index]]
+
+    def to_dict(self):
+        results = {}
+        stack = [(self, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if not expanded:
+                stack.append((node, True))
+                stack.extend((child, False) for child in node.children)
+                continue
+            result = node._node_dict()
+            result["children"] = [results.pop(child.index) for child in node.children]
+            results[node.index] = result
+        return results[self.index]
+
+    def _node_dict(self):
+        store, index = self.store, self.index
+        if store.has_position[index]:
+            absolute_position = "{:.2f};{:.2f}".format(*store.absolute_position[index])
+            position = "{:.2f};{:.2f}".format(*store.position[index])
+        else:
+            absolute_position = ""
+            position = ""
+        if store.has_size[index]:
+            size = "{:.0f};{:.0f}".format(*store.size[index])
+        else:
+            size = ""
+
+        result = {
+            "id": self.identifier,
+            "name": self.name,
+            "role": self.role,
+            "description": self.description,
+            "role_description": self.role_description,
+            "value": self.value,
+            "absolute_position": absolute_position,
+            "position": position,
+            "size": size,
+            "enabled": self.enabled,
+            "bbox": self.bbox,
+            "visible_bbox": self.visible_bbox,
+            "visible": self.visible,
+            "children": None,
+        }
+
+        app_name = self.app_name
+        if app_name is not None and (
+            self.role == "AXWindow" or app_name in ("Dock", "MenuBar (App)", "MenuBar (System)")
+        ):
+            result["app_name"] = app_name
+        if self.pruned:
+            result["pruned"] = True
+        if self.truncated:
+            result["truncated"] = True
+        return result
@@ -1,67 +1,39 @@
 from hashlib import md5
-import ApplicationServices
-import Foundation
-import AppKit
-import re
 import json
 import copy
 
-
-# convert CF attribute to python object
-def CFAttributeToPyObject(attrValue):
-    def list_helper(list_value):
-        list_builder = []
-        for item in list_value:
-            list_builder.append(CFAttributeToPyObject(item))
-        return list_builder
-
-    def number_helper(number_value):
-        success, int_value = Foundation.CFNumberGetValue(
-            number_value, Foundation.kCFNumberIntType, None
-        )
-        if success:
-            return int(int_value)
-
-        success, float_value = Foundation.CFNumberGetValue(
-            number_value, Foundation.kCFNumberDoubleType, None
-        )
-        if success:
-            return float(float_value)
-        return None
-
-    def axuielement_helper(element_value):
-        return element_value
-
-    cf_attr_type = Foundation.CFGetTypeID(attrValue)
-    cf_type_mapping = {
-        Foundation.CFStringGetTypeID(): str,
-        Foundation.CFBooleanGetTypeID(): bool,
-        Foundation.CFArrayGetTypeID(): list_helper,
-        Foundation.CFNumberGetTypeID(): number_helper,
-        ApplicationServices.AXUIElementGetTypeID(): axuielement_helper,
-    }
-    try:
-        return cf_type_mapping[cf_attr_type](attrValue)
-    except KeyError:
-        # did not get a supported CF type. Move on to AX type
-        pass
-
-    ax_attr_type = ApplicationServices.AXValueGetType(attrValue)
-    ax_type_map = {
-        ApplicationServices.kAXValueCGSizeType: Foundation.NSSizeFromString,
-        ApplicationServices.kAXValueCGPointType: Foundation.NSPointFromString,
-        ApplicationServices.kAXValueCFRangeType: Foundation.NSRangeFromString,
-    }
-    try:
-        extracted_str = re.search("{.*}", attrValue.description()).group()
-        return tuple(ax_type_map[ax_attr_type](extracted_str))
-    except KeyError:
-        return None
+from macapptree import backend
+from macapptree import hashing
+from macapptree import traversal
+from macapptree.backend import CFAttributeToPyObject, get_backend
 
 
 # UIElement class which represents accessibility element and all its attributes
 class UIElement:
-    def __init__(self, element, offset_x=0, offset_y=0, max_depth=None, parents_visible_bbox=None):
+    # attributes fetched in a single round trip per node when batching is enabled
+    node_attributes = [
+        backend.AX_ROLE,
+        backend.AX_TITLE,
+        backend.AX_ENABLED,
+        backend.AX_POSITION,
+        backend.AX_SIZE,
+        backend.AX_DESCRIPTION,
+        backend.AX_ROLE_DESCRIPTION,
+        backend.AX_VALUE,
+        backend.AX_CHILDREN,
+    ]
+    batch_attributes = True
+    # order in which the traversal engine visits nodes, traversal.DFS or traversal.BFS
+    traversal_order = traversal.DFS
+    # scheme for identifier and content_identifier, hashing.LEGACY or hashing.MERKLE
+    hash_scheme = hashing.LEGACY
+    # cache.SubtreeCache reusing the subtrees of earlier captures, None to always fetch
+    subtree_cache = None
+    # pruning.VisibilityPruning to keep invisible subtrees as stubs, None to descend everywhere
+    visibility_pruning = None
+
+    def __init__(self, element, offset_x=0, offset_y=0, max_depth=None, parents_visible_bbox=None, expand=True,
+                 visitor=None, budget=None, release=False):
         # set attributes
         self.ax_element = element
         self.content_identifier = ""
@@ -73,29 +45,40 @@ class UIElement:
         self.value = None
         self.max_depth = max_depth
         self.app_name = None  # <-- add here
+        self.action_items = []
+        self.unrolled = False
+        self.pruned = False
+        self.truncated = False
+        self.budget = budget
+        self._complete = False
+        self._children_hint = None
+        self._cache_signal = None
+
+        attributes = self._fetch_attributes(element)
 
         # set role
-        self.role = element_attribute(element, ApplicationServices.kAXRoleAttribute)
+        self.role = attributes.get(backend.AX_ROLE)
         if self.role is None:
             self.role = "No role"
+        if budget is not None:
+            budget.start()
+            budget.charge_node(self.role)
 
         # set name
-        self.name = element_attribute(element, ApplicationServices.kAXTitleAttribute)
+        self.name = attributes.get(backend.AX_TITLE)
         if self.name is not None:
             self.name = self.name.replace(" ", "_")
 
         # set enabled
-        self.enabled = element_attribute(
-            element, ApplicationServices.kAXEnabledAttribute
-        )
+        self.enabled = attributes.get(backend.AX_ENABLED)
         if self.enabled is None:
             self.enabled = False
 
         # set position and size
-        position = element_attribute(element, ApplicationServices.kAXPositionAttribute)
-        size = element_attribute(element, ApplicationServices.kAXSizeAttribute)
+        position = attributes.get(backend.AX_POSITION)
+        size = attributes.get(backend.AX_SIZE)
         start_position = element_value(
-            position, ApplicationServices.kAXValueCGPointType
+            position, backend.AX_VALUE_CGPOINT
         )
 
         # if window, track app_name
@@ -110,7 +93,7 @@ class UIElement:
         if self.position is not None:
             self.position.x -= max(0, offset_x)
             self.position.y -= max(0, offset_y)
-        self.size = element_value(size, ApplicationServices.kAXValueCGSizeType)
+        self.size = element_value(size, backend.AX_VALUE_CGSIZE)
 
         self._set_bboxes(parents_visible_bbox)
 
@@ -130,47 +113,132 @@ class UIElement:
             start_position.y + offset_y + self.size.height / 2,
         )
 
-        self.description = element_attribute(
-            element, ApplicationServices.kAXDescriptionAttribute
-        )
-        self.role_description = element_attribute(
-            element, ApplicationServices.kAXRoleDescriptionAttribute
-        )
-        attribute_value = element_attribute(
-            element, ApplicationServices.kAXValueAttribute
-        )
+        self.description = attributes.get(backend.AX_DESCRIPTION)
+        self.role_description = attributes.get(backend.AX_ROLE_DESCRIPTION)
+        attribute_value = attributes.get(backend.AX_VALUE)
 
         # set value
         self.value = attribute_value
         if attribute_value is not None:
-            if isinstance(attribute_value, Foundation.NSArray):
+            if get_backend().is_array(attribute_value):
                 self.value = []
                 for value in attribute_value:
                     self.value.append(value)
-            if isinstance(attribute_value, ApplicationServices.AXUIElementRef):
-                self.value = UIElement(attribute_value, offset_x, offset_y)
+            if get_backend().is_element(attribute_value):
+                self.value = self._make_child(attribute_value, offset_x, offset_y, None, None, expand)
 
-        # set children
+        # children are built by the traversal engine
+        self._offset = (offset_x, offset_y)
+        self._start_position = start_position
+        # a node at max_depth 0 is never expanded, unbatched its children are not fetched at all
         if self.max_depth is None or self.max_depth > 0:
-            self.children, self.action_items = self._get_children_and_actions(element, start_position, offset_x, offset_y)
+            self._children_hint = attributes.get(backend.AX_CHILDREN) or []
         else:
-            self.children, self.action_items = [], []
-
+            self._children_hint = []
+        self._complete = True
+        if expand:
+            # cached subtrees are reused by later captures and must keep their children
+            if release and self.subtree_cache is not None:
+                raise ValueError("release cannot be combined with a subtree cache")
+            traversal.build(self, self.traversal_order, visitor, release)
+
+    # create the children without expanding them, returns the nodes the traversal should visit next
+    def _expand(self):
+        if not self._complete:
+            return []
+        if self.subtree_cache is not None and self.subtree_cache.cacheable(self) and self._reuse_cached_children():
+            return []
+        if self.visibility_pruning is not None and not self.visibility_pruning.descend(self):
+            self.pruned = True
+            self.visibility_pruning.pruned += 1
+        elif self.budget is not None and self.budget.exhausted():
+            # a leaf has nothing to cut, its actions are not fetched either
+            if self._children_hint:
+                self._truncate()
+        elif self.max_depth is None or self.max_depth > 0:
+            calls = self.budget.attribute_calls if self.budget is not None else 0
+            elements, self.action_items = self._child_elements_and_actions(
+                self.ax_element, self._start_position, self._children_hint
+            )
+            offset_x, offset_y = self._offset
+            child_depth = self.max_depth - 1 if self.max_depth is not None else None
+            self.children = []
+            for child in elements:
+                if self.budget is not None and self.budget.exhausted():
+                    self._truncate()
+                    break
+                self.children.append(
+                    self._make_child(child, offset_x, offset_y, child_depth, self.visible_bbox, False)
+                )
+            if self.budget is not None:
+                self.budget.calls_by_role[self.role] += self.budget.attribute_calls - calls
+        self._children_hint = None
+        if isinstance(self.value, UIElement) and self.value._children_hint is not None:
+            traversal.build(self.value, self.traversal_order)
+        return list(self.children)
+
+    # the capture budget ran out before all children of the node were built
+    def _truncate(self):
+        self.truncated = True
+        self.budget.mark_truncated()
+
+    # take the children from the subtree cache, the value node is still built
+    def _reuse_cached_children(self):
+        self._cache_signal = self.subtree_cache.signal(self)
+        entry = self.subtree_cache.lookup(self.ax_element, self._cache_signal)
+        if entry is None:
+            return False
+        # _finish sorts again; reversed, siblings with equal positions keep their order
+        self.children = entry.children[::-1]
+        self.action_items = list(entry.action_items)
+        self._subtree_nodes = entry.nodes
+        self._uncharged_nodes = 0
+        self._children_hint = None
+        self._cache_signal = None
+        if isinstance(self.value, UIElement) and self.value._children_hint is not None:
+            traversal.build(self.value, self.traversal_order)
+        return True
+
+    # create a child node (or the node of an element value)
+    def _make_child(self, element, offset_x, offset_y, max_depth, visible_bbox, expand):
+        return type(self)(element, offset_x, offset_y, max_depth, visible_bbox, expand=expand, budget=self.budget)
+
+    # called once all children are finished
+    def _finish(self):
+        if not self._complete:
+            return
+        self.children = self._sorted_children(self.children)
         self.calculate_hashes()
-        self.unrolled = False
+        if self._cache_signal is not None:
+            self.subtree_cache.store(self, self._cache_signal)
+            self._cache_signal = None
 
-    def to_dict(self):
-        def children_to_dict(children):
-            result = []
-            for child in children:
-                result.append(child.to_dict())
-            return result
+    # fetch the node attributes, in one call if batching is enabled
+    def _fetch_attributes(self, element):
+        if self.batch_attributes:
+            return get_backend().attributes(element, self.node_attributes)
+        return _LazyAttributes(element)
 
+    def to_dict(self):
+        results = {}
+        for node in traversal.walk_post_order(self):
+            result = node._node_dict()
+            result["children"] = [results[id(child)] for child in node.children]
+            results[id(node)] = result
+        return results[id(self)]
+
+    # value as stored in the dictionary form
+    def serialized_value(self):
         value = self.value
         if isinstance(value, UIElement):
             value = json.dumps(value.to_dict(), indent=4)
-        elif isinstance(value, AppKit.NSDate):
+        elif backend.is_date(value):
             value = str(value)
+        return value
+
+    # dictionary of the node without its children
+    def _node_dict(self):
+        value = self.serialized_value()
 
         if self.absolute_position is not None:
             absolute_position = f"{self.absolute_position.x:.2f};{self.absolute_position.y:.2f}"
@@ -201,7 +269,7 @@ class UIElement:
             "bbox": self.bbox,
             "visible_bbox": self.visible_bbox,
             "visible": self.visible,
-            "children": children_to_dict(self.children),
+            "children": None,
         }
 
         if self.app_name is not None and (
@@ -209,13 +277,17 @@ class UIElement:
         ):
             result["app_name"] = self.app_name
 
+        if self.pruned:
+            result["pruned"] = True
+        if self.truncated:
+            result["truncated"] = True
+
         return result
 
 
     # calculate hash for the element
     def calculate_hashes(self):
-        self.identifier = self.component_hash()
-        self.content_identifier = self.children_content_hash(self.children)
+        hashing.calculate(self, self.hash_scheme)
 
 
     def _set_bboxes(self, parents_visible_bbox):
@@ -242,68 +314,70 @@ class UIElement:
         else:
             self.visible_bbox = self.bbox
 
-    def _get_children_and_actions(self, element, start_position, offset_x, offset_y):
-        action_items = []
+    def _get_children_and_actions(self, element, start_position, offset_x, offset_y, children=None):
+        elements, action_items = self._child_elements_and_actions(element, start_position, children)
         children_all = []
+        if self.max_depth is None or self.max_depth > 0:
+            child_depth = self.max_depth - 1 if self.max_depth is not None else None
+            children_all = [
+                self._make_child(child, offset_x, offset_y, child_depth, self.visible_bbox, True)
+                for child in elements
+            ]
+        return self._sorted_children(children_all), action_items
+
+    # accessibility elements to build the children from, and the element actions
+    def _child_elements_and_actions(self, element, start_position, children=None):
+        action_items = []
+        elements = []
 
         # search for all children
-        children = element_attribute(element, ApplicationServices.kAXChildrenAttribute)
-        error, actions = ApplicationServices.AXUIElementCopyActionNames(element, None)
-        if error == 0 and actions is not None and len(actions) > 0:
+        if children is None:
+            children = element_attribute(element, backend.AX_CHILDREN)
+        actions = get_backend().action_names(element)
+        if actions:
             action_items = actions
 
         if children is not None and len(children) > 0:
+            source = element
             # make children structure flat if it is a group and has only one child
             if self.role == "AXGroup" and len(children) == 1:
-                child_position = element_attribute(
-                    children[0], ApplicationServices.kAXPositionAttribute
-                )
+                child_attributes = self._fetch_attributes(children[0])
                 child_position_value = element_value(
-                    child_position, ApplicationServices.kAXValueCGPointType
-                )
-                child_size = element_attribute(
-                    children[0], ApplicationServices.kAXSizeAttribute
+                    child_attributes.get(backend.AX_POSITION), backend.AX_VALUE_CGPOINT
                 )
                 child_size_value = element_value(
-                    child_size, ApplicationServices.kAXValueCGSizeType
+                    child_attributes.get(backend.AX_SIZE), backend.AX_VALUE_CGSIZE
                 )
                 if (
                         start_position == child_position_value
                         and self.size == child_size_value
                 ):
-                    children_elements = element_attribute(
-                        children[0], ApplicationServices.kAXChildrenAttribute
-                    )
+                    children_elements = child_attributes.get(backend.AX_CHILDREN)
                     if children_elements is not None and len(children_elements) > 0:
-                        found_children = UIElement.children(
-                            children[0], offset_x, offset_y, self.max_depth, self.visible_bbox
-                        )
-                        children_all = found_children
-                    else:
-                        children_all = UIElement.children(element, offset_x, offset_y, self.max_depth, self.visible_bbox)
-                else:
-                    children_all = UIElement.children(element, offset_x, offset_y, self.max_depth, self.visible_bbox)
-            else:
-                children_all = UIElement.children(element, offset_x, offset_y, self.max_depth, self.visible_bbox)
+                        source = children[0]
+                        children = children_elements
+            elements = self._child_ax_elements(source, children)
+
+        return elements, action_items
 
+    @staticmethod
+    def _sorted_children(children_all):
         children_all = [element for element in children_all if element.position is not None]
         children_all = sorted(
             children_all, key=lambda x: (x.position.y, x.position.x)
         )
         children_all.reverse()
-
-        return children_all, action_items
+        return children_all
 
     def recursive_children(self):
-        if len(self.children) == 0:
-            children_all, _ = self._get_children_and_actions(self.ax_element, self.position, 0, 0)
-        else:
-            children_all = self.children
-        recursive_children = []
-        for child in children_all:
-            recursive_children.append(child)
-            recursive_children.extend(child.recursive_children())
-        return recursive_children
+        def children_or_fetch(node):
+            if len(node.children) == 0:
+                children_all, _ = node._get_children_and_actions(node.ax_element, node.position, 0, 0)
+                return children_all
+            return node.children
+
+        recursive_children = list(traversal.walk(self, children=children_or_fetch))
+        return recursive_children[1:]
 
     # calculate hash for the element
     def hash_from_string(self, string):
@@ -359,80 +433,143 @@ class UIElement:
     # search for the root window
     @classmethod
     def find_root_element(cls, element):
-        role = element_attribute(element, ApplicationServices.kAXRoleAttribute)
-        sub_role = element_attribute(element, ApplicationServices.kAXSubroleAttribute)
-        if role == "AXWindow" or sub_role == "AXHostingView":
-            return element
-        else:
-            parent = element_attribute(element, ApplicationServices.kAXParentAttribute)
-            if parent is not None:
-                return cls.find_root_element(parent)
+        while element is not None:
+            role = element_attribute(element, backend.AX_ROLE)
+            sub_role = element_attribute(element, backend.AX_SUBROLE)
+            if role == "AXWindow" or sub_role == "AXHostingView":
+                return element
+            element = element_attribute(element, backend.AX_PARENT)
         return None
 
     # parse children
     @classmethod
     def children(cls, element, offset_x=0, offset_y=0, max_depth=None, visible_bbox=None):
-        children = element_attribute(element, ApplicationServices.kAXChildrenAttribute)
-        visible_children = element_attribute(
-            element, ApplicationServices.kAXVisibleChildrenAttribute
-        )
+        result = []
+        if max_depth is None or max_depth > 0:
+            for child in cls._child_ax_elements(element):
+                child = cls(child, offset_x, offset_y, max_depth - 1 if max_depth is not None else None, visible_bbox)
+                result.append(child)
+        return result
+
+    # children of the accessibility element, visible children if it has none
+    @classmethod
+    def _child_ax_elements(cls, element, children=None):
+        if children is None:
+            children = element_attribute(element, backend.AX_CHILDREN)
         found_children = []
         if children is not None:
             found_children.extend(children)
         else:
+            visible_children = element_attribute(
+                element, backend.AX_VISIBLE_CHILDREN
+            )
             if visible_children is not None:
                 found_children.extend(visible_children)
+        return found_children
+
+
+
+
+# counts the nodes a lazy tree has fetched and expanded so far
+class MaterializationStats:
+    def __init__(self):
+        self.nodes = 0
+        self.expanded = 0
+
+    def __repr__(self):
+        return f"MaterializationStats(nodes={self.nodes}, expanded={self.expanded})"
+
+
+# UIElement that fetches its own attributes right away but builds its children on first access
+class LazyUIElement(UIElement):
+    def __init__(self, element, offset_x=0, offset_y=0, max_depth=None, parents_visible_bbox=None,
+                 expand=True, prefetch=False, stats=None, budget=None):
+        self.prefetch = prefetch
+        self.stats = stats if stats is not None else MaterializationStats()
+        super().__init__(element, offset_x, offset_y, max_depth, parents_visible_bbox, expand=False, budget=budget)
+        self.stats.nodes += 1
+        if self._complete:
+            # children and the content hash are computed on demand
+            self._children = None
+            self._content_identifier = None
+            self.identifier = hashing.identifier(self, self.hash_scheme)
+
+    @property
+    def children(self):
+        if self._children is None:
+            self._materialize(self.prefetch)
+        return self._children
+
+    @children.setter
+    def children(self, value):
+        self._children = value
+
+    @property
+    def materialized(self):
+        return self._children is not None
+
+    @property
+    def content_identifier(self):
+        if self._content_identifier is None:
+            for node in traversal.walk_post_order(self):
+                if node._content_identifier is None:
+                    node._content_identifier = hashing.content_identifier(node, node.children, node.hash_scheme)
+        return self._content_identifier
+
+    @content_identifier.setter
+    def content_identifier(self, value):
+        self._content_identifier = value
+
+    def _materialize(self, prefetch=False):
+        self._children = []
+        self._expand()
+        self._children = self._sorted_children(self._children)
+        self.stats.expanded += 1
+        if prefetch:
+            for child in self._children:
+                if not child.materialized:
+                    child._materialize()
+
+    def _make_child(self, element, offset_x, offset_y, max_depth, visible_bbox, expand):
+        return type(self)(
+            element, offset_x, offset_y, max_depth, visible_bbox,
+            prefetch=self.prefetch, stats=self.stats, budget=self.budget
+        )
 
-        result = []
-        if max_depth is None or max_depth > 0:
-            for child in found_children:
-                child = cls(child, offset_x, offset_y, max_depth - 1 if max_depth is not None else None, visible_bbox)
-                result.append(child)
-        return result
 
+# fetches attributes one at a time on first access (unbatched mode)
+class _LazyAttributes:
+    def __init__(self, element):
+        self.element = element
 
+    def get(self, attribute):
+        return element_attribute(self.element, attribute)
 
 
 # get accessibility element attribute
 def element_attribute(element, attribute):
-    if attribute == ApplicationServices.kAXChildrenAttribute:
-        err, value = ApplicationServices.AXUIElementCopyAttributeValues(
-            element, attribute, 0, 999, None
-        )
-        if err == ApplicationServices.kAXErrorSuccess:
-            if isinstance(value, Foundation.__NSArrayM):
-                return CFAttributeToPyObject(value)
-            else:
-                return value
-    err, value = ApplicationServices.AXUIElementCopyAttributeValue(
-        element, attribute, None
-    )
-    if err == ApplicationServices.kAXErrorSuccess:
-        if isinstance(value, Foundation.__NSArrayM):
-            return CFAttributeToPyObject(value)
-        else:
-            return value
-    return None
+    if attribute == backend.AX_CHILDREN:
+        return get_backend().children(element)
+    return get_backend().attribute(element, attribute)
 
 
 # det accessibility element value
 def element_value(element, type):
-    err, value = ApplicationServices.AXValueGetValue(element, type, None)
-    if err == True:
-        return value
-    return None
+    return get_backend().ax_value(element, type)
 
 
 # get accessibility attribute names
 def element_attribute_names(element):
-    err, value = ApplicationServices.AXUIElementCopyAttributeNames(element, None)
-    if err == ApplicationServices.kAXErrorSuccess:
-        return value
-    return []
+    return get_backend().attribute_names(element)
 
 
 # print node with its children and attributes
 def print_node(node, level=0):
+    for child, depth, _ in traversal.walk_with_depth(node):
+        _print_single_node(child, level + depth)
+
+
+def _print_single_node(node, level):
     # construct name
     name = ""
     if node.name is not None:
@@ -458,15 +595,10 @@ def print_node(node, level=0):
 
     # print node
     print("  " * level + " " + role + position + name)
-    for child in node.children:
-        print_node(child, level + 1)
 
 def _flatten_ui_elements(ui_elements):
     flat = []
-    def recurse(e):
-        flat.append(e)
-        for c in getattr(e, "children", []):
-            recurse(c)
     for root in ui_elements:
-        recurse(root)
+        flat.extend(traversal.walk(root))
     return flat
+
@@ -0,0 +1,492 @@
+import argparse
+import json
+import time
+
+from macapptree import backend
+from macapptree import diff
+from macapptree import traversal
+from macapptree.backend import get_backend
+from macapptree.stream import open_stream
+from macapptree.window_tools import propagate_screen_rect
+
+try:
+    import ApplicationServices
+    import CoreFoundation
+except ImportError:
+    # pyobjc is only available on macOS; notifications can still be replayed without it
+    ApplicationServices = None
+    CoreFoundation = None
+
+
+# notifications that make the watcher refresh part of a tree
+WATCHED_NOTIFICATIONS = [
+    backend.AX_VALUE_CHANGED_NOTIFICATION,
+    backend.AX_CREATED_NOTIFICATION,
+    backend.AX_UI_ELEMENT_DESTROYED_NOTIFICATION,
+    backend.AX_WINDOW_MOVED_NOTIFICATION,
+    backend.AX_WINDOW_RESIZED_NOTIFICATION,
+    backend.AX_FOCUSED_UI_ELEMENT_CHANGED_NOTIFICATION,
+]
+
+# how far a created or unknown element is followed up its parents to find a node of the tree
+MAX_PARENT_LOOKUP = 64
+
+
+# interface for everything that delivers accessibility notifications
+class NotificationSource:
+    # call callback(element, notification) for the notifications of the application
+    def subscribe(self, pid, element, notifications, callback):
+        raise NotImplementedError
+
+    def unsubscribe(self, pid):
+        pass
+
+    def now(self):
+        return time.monotonic()
+
+    # deliver the notifications arriving in the next duration seconds
+    def run(self, duration):
+        raise NotImplementedError
+
+
+# notifications from AXObserver, delivered on the run loop of the thread calling run()
+class AXObserverSource(NotificationSource):
+    def __init__(self):
+        if ApplicationServices is None:
+            raise RuntimeError("pyobjc is required for AXObserver notifications")
+        self._observers = {}
+
+    def subscribe(self, pid, element, notifications, callback):
+        def observer_callback(observer, notified_element, notification, refcon):
+            callback(notified_element, str(notification))
+
+        err, observer = ApplicationServices.AXObserverCreate(pid, observer_callback, None)
+        if err != ApplicationServices.kAXErrorSuccess:
+            raise RuntimeError(f"AXObserverCreate failed for pid {pid}: {err}")
+        for notification in notifications:
+            ApplicationServices.AXObserverAddNotification(observer, element, notification, None)
+        CoreFoundation.CFRunLoopAddSource(
+            CoreFoundation.CFRunLoopGetCurrent(),
+            ApplicationServices.AXObserverGetRunLoopSource(observer),
+            CoreFoundation.kCFRunLoopDefaultMode,
+        )
+        # the callback has to stay alive as long as the observer
+        self._observers[pid] = (observer, element, notifications, observer_callback)
+
+    def unsubscribe(self, pid):
+        entry = self._observers.pop(pid, None)
+        if entry is None:
+            return
+        observer, element, notifications, _ = entry
+        for notification in notifications:
+            ApplicationServices.AXObserverRemoveNotification(observer, element, notification)
+        CoreFoundation.CFRunLoopRemoveSource(
+            CoreFoundation.CFRunLoopGetCurrent(),
+            ApplicationServices.AXObserverGetRunLoopSource(observer),
+            CoreFoundation.kCFRunLoopDefaultMode,
+        )
+
+    def run(self, duration):
+        CoreFoundation.CFRunLoopRunInMode(CoreFoundation.kCFRunLoopDefaultMode, duration, False)
+
+
+# replays recorded notifications on a virtual clock, elements are ReplayElement handles
+class ReplayNotificationSource(NotificationSource):
+    def __init__(self, events):
+        if isinstance(events, str):
+            with open(events, encoding="utf-8") as f:
+                events = json.load(f)
+        self.events = sorted(events, key=lambda event: event["time"])
+        self._next = 0
+        self._clock = 0.0
+        self._subscriptions = {}
+
+    @property
+    def finished(self):
+        return self._next >= len(self.events)
+
+    def subscribe(self, pid, element, notifications, callback):
+        self._subscriptions[int(pid)] = (set(notifications), callback)
+
+    def unsubscribe(self, pid):
+        self._subscriptions.pop(int(pid), None)
+
+    def now(self):
+        return self._clock
+
+    def run(self, duration):
+        end = self._clock + duration
+        while not self.finished and self.events[self._next]["time"] <= end:
+            event = self.events[self._next]
+            self._next += 1
+            self._clock = max(self._clock, event["time"])
+            subscription = self._subscriptions.get(int(event["pid"]))
+            if subscription is None or event["notification"] not in subscription[0]:
+                continue
+            subscription[1](backend.ReplayElement(event["element"]), event["notification"])
+        self._clock = end
+
+
+# records the notifications of another source with the element ids of a RecordingAXBackend
+class RecordingNotificationSource(NotificationSource):
+    def __init__(self, source, recorder, path=None):
+        self.source = source
+        self.recorder = recorder
+        self.path = path
+        self.events = []
+        self._start = source.now()
+
+    def subscribe(self, pid, element, notifications, callback):
+        def record(notified_element, notification):
+            self.events.append({
+                "time": self.source.now() - self._start,
+                "pid": pid,
+                "element": self.recorder._element_id(notified_element),
+                "notification": notification,
+            })
+            callback(notified_element, notification)
+
+        self.source.subscribe(pid, element, notifications, record)
+
+    def unsubscribe(self, pid):
+        self.source.unsubscribe(pid)
+
+    def now(self):
+        return self.source.now()
+
+    def run(self, duration):
+        self.source.run(duration)
+
+    def save(self, path=None):
+        path = path or self.path
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.events, f)
+        return path
+
+
+# published after every flush
+class WatchUpdate:
+    def __init__(self, roots, refreshed, notifications, delta=None, elapsed=0.0):
+        self.roots = roots
+        self.refreshed = refreshed
+        self.notifications = notifications
+        self.delta = delta
+        self.elapsed = elapsed
+
+    def __repr__(self):
+        return (f"WatchUpdate(refreshed={len(self.refreshed)}, notifications={self.notifications}, "
+                f"elapsed={self.elapsed:.3f})")
+
+
+class WatchStats:
+    def __init__(self):
+        self.notifications = 0
+        self.ignored = 0
+        self.flushes = 0
+        self.refreshed_nodes = 0
+        self.refresh_time = 0.0
+
+    def __repr__(self):
+        return (f"WatchStats(notifications={self.notifications}, ignored={self.ignored}, "
+                f"flushes={self.flushes}, refreshed_nodes={self.refreshed_nodes}, "
+                f"refresh_time={self.refresh_time:.3f})")
+
+
+# keeps the trees of an application up to date from its notifications.
+# bursts are coalesced: a flush happens once no notification arrived for `coalesce` seconds,
+# or `max_delay` seconds after the first pending one, and only the affected subtrees are rebuilt.
+class TreeWatcher:
+    def __init__(self, roots, pid, source, callback, coalesce=0.05, max_delay=0.5, deltas=False,
+                 notifications=None):
+        self.roots = list(roots)
+        self.pid = pid
+        self.source = source
+        self.callback = callback
+        self.coalesce = coalesce
+        self.max_delay = max_delay
+        self.deltas = deltas
+        self.notifications = notifications or WATCHED_NOTIFICATIONS
+        self.stats = WatchStats()
+        self._nodes = {}
+        self._parents = {}
+        self._dirty = {}
+        self._pending = 0
+        self._first_event = None
+        self._last_event = None
+        for root in self.roots:
+            self._index(root, None)
+
+    def start(self):
+        element = get_backend().application(self.pid)
+        self.source.subscribe(self.pid, element, self.notifications, self._on_notification)
+
+    def stop(self):
+        self.source.unsubscribe(self.pid)
+
+    # deliver notifications and flush for duration seconds
+    def run(self, duration):
+        end = self.source.now() + duration
+        while True:
+            now = self.source.now()
+            if now >= end:
+                break
+            self.source.run(min(self.coalesce, end - now))
+            now = self.source.now()
+            if self._dirty and (
+                now - self._last_event >= self.coalesce or now - self._first_event >= self.max_delay
+            ):
+                self.flush()
+        if self._dirty:
+            self.flush()
+
+    def _index(self, subtree, parent):
+        for node, _, node_parent in traversal.walk_with_depth(subtree):
+            self._nodes[node.ax_element] = node
+            self._parents[id(node)] = node_parent if node_parent is not None else parent
+
+    def _unindex(self, subtree):
+        for node in traversal.walk(subtree):
+            if self._nodes.get(node.ax_element) is node:
+                del self._nodes[node.ax_element]
+            self._parents.pop(id(node), None)
+
+    def _on_notification(self, element, notification):
+        self.stats.notifications += 1
+        node = self._target(element, notification)
+        if node is None:
+            self.stats.ignored += 1
+            return
+        now = self.source.now()
+        if not self._dirty:
+            self._first_event = now
+        self._last_event = now
+        self._pending += 1
+        self._dirty[id(node)] = node
+
+    # node whose subtree has to be rebuilt for the notification
+    def _target(self, element, notification):
+        node = self._nodes.get(element)
+        if notification == backend.AX_UI_ELEMENT_DESTROYED_NOTIFICATION:
+            if node is None:
+                return None
+            parent = self._parents.get(id(node))
+            return parent if parent is not None else node
+        if node is not None:
+            return node
+        # created elements and elements hidden by group flattening: closest known ancestor
+        for _ in range(MAX_PARENT_LOOKUP):
+            element = get_backend().attribute(element, backend.AX_PARENT)
+            if element is None:
+                return None
+            node = self._nodes.get(element)
+            if node is not None:
+                return node
+        return None
+
+    def _ancestors(self, node):
+        parent = self._parents.get(id(node))
+        while parent is not None:
+            yield parent
+            parent = self._parents.get(id(parent))
+
+    def _path(self, node):
+        path = []
+        parent = self._parents.get(id(node))
+        while parent is not None:
+            path.append(parent.children.index(node))
+            node, parent = parent, self._parents.get(id(parent))
+        path.append(self.roots.index(node))
+        return path[::-1]
+
+    # rebuild the dirty subtrees and publish the update
+    def flush(self):
+        start = time.time()
+        dirty = self._dirty
+        targets = [node for node in dirty.values() if not any(id(a) in dirty for a in self._ancestors(node))]
+        notifications = self._pending
+        self._dirty = {}
+        self._pending = 0
+
+        old = []
+        for node in targets:
+            old_dict = diff.as_dict(node) if self.deltas else None
+            old.append((node, self._path(node), old_dict))
+
+        refreshed = []
+        reordered = set()
+        changed_parents = {}
+        for node, _, _ in old:
+            parent = self._parents.get(id(node))
+            new_node = self._rebuild(node, parent)
+            self._unindex(node)
+            if parent is None:
+                index = self.roots.index(node)
+                if new_node is None:
+                    del self.roots[index]
+                else:
+                    self.roots[index] = new_node
+            else:
+                if self._replace_child(parent, node, new_node):
+                    reordered.add(id(new_node))
+                changed_parents[id(parent)] = parent
+            if new_node is not None:
+                self._index(new_node, parent)
+                refreshed.append(new_node)
+
+        # hashes of the ancestors depend on their children
+        rehashed = set()
+        for parent in changed_parents.values():
+            for node in [parent] + list(self._ancestors(parent)):
+                if id(node) in rehashed:
+                    break
+                node.calculate_hashes()
+                rehashed.add(id(node))
+
+        delta = self._delta(old, refreshed, reordered) if self.deltas else None
+        elapsed = time.time() - start
+        self.stats.flushes += 1
+        self.stats.refreshed_nodes += sum(1 for node in refreshed for _ in traversal.walk(node))
+        self.stats.refresh_time += elapsed
+        self.callback(WatchUpdate(self.roots, refreshed, notifications, delta, elapsed))
+
+    # put the new node in place of the old one, returns True if it moved among its siblings.
+    # siblings keep their order, re-sorting would swap the ones with equal positions.
+    @staticmethod
+    def _replace_child(parent, node, new_node):
+        index = parent.children.index(node)
+        children = parent.children[:index] + parent.children[index + 1:]
+        moved = False
+        if new_node is not None:
+            key = _sort_key(new_node)
+            if key != _sort_key(node):
+                # children are sorted by descending position
+                index = next((i for i, child in enumerate(children) if _sort_key(child) < key), len(children))
+                moved = True
+            children.insert(index, new_node)
+        parent.children = children
+        return moved
+
+    # build the subtree of the node again, None if the element has no frame anymore
+    def _rebuild(self, node, parent):
+        cache = node.subtree_cache
+        if cache is not None:
+            # cached subtrees of the node and its ancestors contain the old node
+            for stale in [node] + list(self._ancestors(node)):
+                cache.invalidate(stale.ax_element)
+        screen_rect = getattr(node, "window_screen_rect", None)
+        if parent is None:
+            # the old visible bbox stands in for the visible part of the window computed at capture time
+            new_node = node._make_child(node.ax_element, 0, 0, node.max_depth, node.visible_bbox, True)
+            new_node.app_name = node.app_name
+            if screen_rect is not None and new_node.absolute_position is not None and new_node.size is not None:
+                x, y = new_node.absolute_position.x, new_node.absolute_position.y
+                screen_rect = [x, y, x + new_node.size.width, y + new_node.size.height]
+        else:
+            offset_x, offset_y = parent._offset
+            new_node = parent._make_child(
+                node.ax_element, offset_x, offset_y, node.max_depth, parent.visible_bbox, True
+            )
+            if new_node.position is None:
+                return None
+        if screen_rect is not None:
+            propagate_screen_rect(new_node, screen_rect)
+        return new_node
+
+    # delta of the flush in the format of macapptree.diff, paths are those of the previous update
+    def _delta(self, old, refreshed, reordered):
+        delta = {"version": diff.DELTA_VERSION, "removed": [], "inserted": [], "moved": [], "modified": []}
+        new_nodes = {node.ax_element: node for node in refreshed}
+        for node, path, old_dict in old:
+            new_node = new_nodes.get(node.ax_element)
+            if new_node is None:
+                delta["removed"].append(path)
+                continue
+            parent = self._parents.get(id(new_node))
+            siblings = parent.children if parent is not None else self.roots
+            parent_path, index = path[:-1], siblings.index(new_node)
+
+            subtree = diff.diff([old_dict], [diff.as_dict(new_node)])
+
+            def remap(sub_path):
+                return path + sub_path[1:]
+
+            delta["removed"].extend(remap(p) for p in subtree["removed"])
+            for change in subtree["modified"]:
+                change["node"] = remap(change["node"])
+                delta["modified"].append(change)
+            for move in subtree["moved"]:
+                move["node"] = remap(move["node"])
+                if move["parent"]:
+                    move["parent"] = remap(move["parent"])
+                else:
+                    move["parent"], move["index"] = parent_path, index
+                delta["moved"].append(move)
+            for insertion in subtree["inserted"]:
+                if insertion["parent"]:
+                    insertion["parent"] = remap(insertion["parent"])
+                else:
+                    insertion["parent"], insertion["index"] = parent_path, index
+                delta["inserted"].append(insertion)
+            root_replaced = [0] in subtree["removed"]
+            if not root_replaced and (id(new_node) in reordered or index != path[-1]):
+                delta["moved"].append({"node": path, "parent": parent_path, "index": index})
+        return delta
+
+
+def _sort_key(node):
+    return (node.position.y, node.position.x)
+
+
+# capture an application and write every update of its trees as one JSON line
+def watch_app(app_bundle, output_file, duration, max_depth=None, deltas=False, coalesce=0.05, max_delay=0.5):
+    import AppKit
+    import macapptree.apps as apps
+    from macapptree.main import process_app
+    from macapptree.window_tools import _build_global_visible_index, store_screen_scaling_factor
+
+    store_screen_scaling_factor()
+    app = apps.application_for_bundle(app_bundle, AppKit.NSWorkspace.sharedWorkspace())
+    if app is None:
+        raise RuntimeError(f"App {app_bundle} not found or not running.")
+    roots, _ = process_app(app_bundle, max_depth, global_vis_index=_build_global_visible_index([app_bundle]))
+
+    with open_stream(output_file, "w") as f:
+        def write(record):
+            f.write(json.dumps(record, ensure_ascii=False))
+            f.write("\n")
+            f.flush()
+
+        def publish(update):
+            record = {"time": time.time(), "notifications": update.notifications, "elapsed": update.elapsed}
+            if update.delta is not None:
+                record["delta"] = update.delta
+            else:
+                record["trees"] = [diff.as_dict(root) for root in update.roots]
+            write(record)
+
+        write({"time": time.time(), "trees": [diff.as_dict(root) for root in roots]})
+        watcher = TreeWatcher(roots, app.processIdentifier(), AXObserverSource(), publish,
+                              coalesce=coalesce, max_delay=max_delay, deltas=deltas)
+        watcher.start()
+        try:
+            watcher.run(duration)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.stop()
+    print(watcher.stats)
+    return watcher.stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-a", type=str, required=True, help="The application bundle identifier")
+    parser.add_argument("--oa", type=str, required=True, help="Output file, one JSON update per line")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds to watch the application for")
+    parser.add_argument("--max-depth", type=int, default=None, help="Maximum depth of the accessibility tree")
+    parser.add_argument("--deltas", action="store_true", help="Write deltas against the previous update instead of trees")
+    parser.add_argument("--coalesce", type=float, default=0.05, help="Quiet time in seconds before a burst is flushed")
+    parser.add_argument("--max-delay", type=float, default=0.5, help="Longest time in seconds a notification waits for a flush")
+    args = parser.parse_args()
+
+    watch_app(args.a, args.oa, args.duration, args.max_depth, args.deltas, args.coalesce, args.max_delay)
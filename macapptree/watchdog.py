@@ -0,0 +1,130 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from macapptree.backend import AX_ERROR_CANNOT_COMPLETE, DelegatingAXBackend
+from macapptree.exceptions import AppNotRespondingException
+
+
+# default number of consecutive timeouts after which an app is considered hung
+MAX_TIMEOUTS = 3
+
+
+class _AppState:
+    __slots__ = ("app", "timeout", "start", "calls", "timeouts", "consecutive", "hung")
+
+    def __init__(self, app, timeout, start):
+        self.app = app
+        self.timeout = timeout
+        self.start = start
+        self.calls = 0
+        self.timeouts = 0
+        self.consecutive = 0
+        self.hung = False
+
+
+# bounds the accessibility calls made for each app and gives up on apps that stop replying.
+# inside watching(app, application) every call waits at most the app's messaging timeout; after
+# max_timeouts consecutive timeouts the app is marked as hung and its remaining calls raise
+# AppNotRespondingException without reaching the app. calls made outside watching() are forwarded as is.
+class HangWatchdog(DelegatingAXBackend):
+    def __init__(self, backend=None, timeout=None, max_timeouts=MAX_TIMEOUTS, app_timeouts=None,
+                 clock=time.monotonic):
+        super().__init__(backend)
+        # seconds, None keeps the system default
+        self.timeout = timeout
+        self.max_timeouts = max_timeouts
+        # app -> seconds, overrides timeout
+        self.app_timeouts = dict(app_timeouts or {})
+        self.clock = clock
+        # app -> {"timeouts", "calls", "elapsed"} when it was marked as hung
+        self.hung = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def timeout_for(self, app):
+        return self.app_timeouts.get(app, self.timeout)
+
+    # attribute the calls of the current thread to the app while the block runs
+    @contextmanager
+    def watching(self, app, application=None):
+        timeout = self.timeout_for(app)
+        if timeout is not None and application is not None:
+            self.backend.set_messaging_timeout(application, timeout)
+        previous = getattr(self._local, "state", None)
+        state = self._local.state = _AppState(app, timeout, self.clock())
+        # an app found hung earlier in the capture is not waited for again
+        state.hung = app in self.hung
+        try:
+            yield state
+        finally:
+            self._local.state = previous
+
+    def is_hung(self, app):
+        return app in self.hung
+
+    def report(self):
+        return {app: dict(info) for app, info in self.hung.items()}
+
+    def _call(self, replied_timeout, method, *args):
+        state = getattr(self._local, "state", None)
+        if state is None:
+            return method(*args)
+        if state.hung:
+            raise AppNotRespondingException(state.app)
+        start = self.clock()
+        result = method(*args)
+        # calls without an error code in their reply are judged by how long they took
+        timed_out = replied_timeout(result) or (
+            state.timeout is not None and self.clock() - start >= state.timeout
+        )
+        self._observe(state, timed_out)
+        return result
+
+    def _observe(self, state, timed_out):
+        state.calls += 1
+        if not timed_out:
+            state.consecutive = 0
+            return
+        state.timeouts += 1
+        state.consecutive += 1
+        if state.consecutive < self.max_timeouts:
+            return
+        state.hung = True
+        with self._lock:
+            self.hung[state.app] = {
+                "timeouts": state.timeouts,
+                "calls": state.calls,
+                "elapsed": self.clock() - state.start,
+            }
+        raise AppNotRespondingException(state.app)
+
+    def copy_attribute(self, element, attribute):
+        return self._call(_reply_timed_out, self.backend.copy_attribute, element, attribute)
+
+    def copy_multiple_attributes(self, element, attributes):
+        return self._call(_replies_timed_out, self.backend.copy_multiple_attributes, element, attributes)
+
+    def children(self, element):
+        return self._call(_no_reply_code, self.backend.children, element)
+
+    def action_names(self, element):
+        return self._call(_no_reply_code, self.backend.action_names, element)
+
+    def attribute_names(self, element):
+        return self._call(_no_reply_code, self.backend.attribute_names, element)
+
+    def element_at_position(self, x, y):
+        return self._call(_no_reply_code, self.backend.element_at_position, x, y)
+
+
+def _reply_timed_out(reply):
+    return reply[0] == AX_ERROR_CANNOT_COMPLETE
+
+
+def _replies_timed_out(replies):
+    return any(err == AX_ERROR_CANNOT_COMPLETE for err, _ in replies)
+
+
+def _no_reply_code(result):
+    return False
@@ -0,0 +1,148 @@
+import numpy as np
+
+
+# the on-screen windows of the captured apps (window_tools._build_global_visible_index), grouped by pid once
+class VisibleWindowIndex:
+    def __init__(self, entries):
+        self.entries = list(entries)
+        self.by_pid = {}
+        for entry in self.entries:
+            self.by_pid.setdefault(int(entry["pid"]), []).append(entry)
+
+    def for_pid(self, pid):
+        return self.by_pid.get(int(pid), [])
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __repr__(self):
+        return f"VisibleWindowIndex(windows={len(self.entries)}, apps={len(self.by_pid)})"
+
+
+# accept a plain list of entries where an index is expected
+def as_index(global_vis_index):
+    if isinstance(global_vis_index, VisibleWindowIndex):
+        return global_vis_index
+    return VisibleWindowIndex(global_vis_index or [])
+
+
+# (x, y, width, height) bounds to (x1, y1, x2, y2) boxes
+def bounds_to_boxes(bounds):
+    boxes = np.array(bounds, dtype=np.float64).reshape(-1, 4)
+    boxes[:, 2:] += boxes[:, :2]
+    return boxes
+
+
+# intersection over union of every box of a (n, 4) against every box of b (m, 4), like window_tools._iou
+def iou_matrix(a, b):
+    a = np.asarray(a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float64).reshape(-1, 4)
+    iw = np.minimum(a[:, None, 2], b[None, :, 2]) - np.maximum(a[:, None, 0], b[None, :, 0])
+    ih = np.minimum(a[:, None, 3], b[None, :, 3]) - np.maximum(a[:, None, 1], b[None, :, 1])
+    inter = np.maximum(iw, 0) * np.maximum(ih, 0)
+    area_a = np.maximum(a[:, 2] - a[:, 0], 0) * np.maximum(a[:, 3] - a[:, 1], 0)
+    area_b = np.maximum(b[:, 2] - b[:, 0], 0) * np.maximum(b[:, 3] - b[:, 1], 0)
+    union = area_a[:, None] + area_b[None, :] - inter + 1e-9
+    return np.where(inter > 0, inter / union, 0.0)
+
+
+# one-to-one assignment of rows to columns with the largest total score (Hungarian method with
+# potentials, the inner loop runs over all columns at once). returns (row, column) pairs; when the
+# matrix is not square the larger side keeps some rows or columns unassigned
+def assign(scores):
+    scores = np.asarray(scores, dtype=np.float64)
+    if scores.ndim != 2 or not scores.size:
+        return []
+    transposed = scores.shape[0] > scores.shape[1]
+    # the usual case: every row has its best score in a different column, which no assignment beats
+    if not transposed:
+        best = np.argmax(scores, axis=1)
+        if len(np.unique(best)) == len(best):
+            return [(row, int(column)) for row, column in enumerate(best)]
+    cost = -(scores.T if transposed else scores)
+    rows, columns = cost.shape
+
+    # index 0 is a virtual column; row_of[j] is the 1-based row assigned to column j
+    u = np.zeros(rows + 1)
+    v = np.zeros(columns + 1)
+    row_of = np.zeros(columns + 1, dtype=np.int64)
+    way = np.zeros(columns + 1, dtype=np.int64)
+    for row in range(1, rows + 1):
+        row_of[0] = row
+        column = 0
+        min_reduced = np.full(columns + 1, np.inf)
+        used = np.zeros(columns + 1, dtype=bool)
+        # grow an alternating path from the new row until it reaches a free column
+        while True:
+            used[column] = True
+            current_row = row_of[column]
+            free = ~used
+            free[0] = False
+            reduced = cost[current_row - 1] - u[current_row] - v[1:]
+            better = free[1:] & (reduced < min_reduced[1:])
+            min_reduced[1:][better] = reduced[better]
+            way[1:][better] = column
+            candidates = np.where(free, min_reduced, np.inf)
+            next_column = int(np.argmin(candidates))
+            delta = candidates[next_column]
+            u[row_of[used]] += delta
+            v[used] -= delta
+            min_reduced[free] -= delta
+            column = next_column
+            if row_of[column] == 0:
+                break
+        # flip the path
+        while column:
+            previous = way[column]
+            row_of[column] = row_of[previous]
+            column = previous
+
+    pairs = [(int(row_of[j]) - 1, j - 1) for j in range(1, columns + 1) if row_of[j]]
+    if transposed:
+        pairs = [(column, row) for row, column in pairs]
+    return sorted(pairs)
+
+
+# match the accessibility windows of an app to its window server entries, one to one.
+# ax_rects are (x1, y1, x2, y2) or None, ax_numbers the CGWindowIDs of the windows where known.
+# windows with a known number take the entry with that number; the others share the remaining
+# entries by the largest total IoU, pairs with an IoU of at most min_iou stay unmatched.
+# returns the matched entry or None for every window
+def match_windows(ax_rects, cg_entries, ax_numbers=None, min_iou=0.0):
+    matches = [None] * len(ax_rects)
+    by_number = {}
+    for index, entry in enumerate(cg_entries):
+        if entry.get("window_number") is not None:
+            by_number[int(entry["window_number"])] = index
+
+    taken = set()
+    pending = []
+    for window, rect in enumerate(ax_rects):
+        number = ax_numbers[window] if ax_numbers is not None else None
+        index = by_number.get(int(number)) if number is not None else None
+        if index is not None and index not in taken:
+            matches[window] = cg_entries[index]
+            taken.add(index)
+        elif rect:
+            pending.append(window)
+
+    remaining = [index for index in range(len(cg_entries)) if index not in taken]
+    if not pending or not remaining:
+        return matches
+    scores = iou_matrix(
+        [ax_rects[window] for window in pending],
+        bounds_to_boxes([cg_entries[index]["bounds"] for index in remaining]),
+    )
+    # windows and entries without a possible match do not take part in the assignment
+    rows = np.flatnonzero((scores > min_iou).any(axis=1))
+    columns = np.flatnonzero((scores > min_iou).any(axis=0))
+    pending = [pending[row] for row in rows]
+    remaining = [remaining[column] for column in columns]
+    scores = scores[np.ix_(rows, columns)]
+    for row, column in assign(scores):
+        if scores[row, column] > min_iou:
+            matches[pending[row]] = cg_entries[remaining[column]]
+    return matches
@@ -1,18 +1,19 @@
-import AppKit
-import shutil
+import numpy as np
+from PIL import Image, ImageColor, ImageDraw
 
-from PIL import Image, ImageDraw
-from time import sleep
+from macapptree import traversal
 
-from macapptree.apps import get_visible_windows_for_bundles
-from macapptree.screenshot_app_window import rect_subtract
+try:
+    import AppKit
+except ImportError:
+    # pyobjc is only available on macOS; captured trees can still be segmented without it
+    AppKit = None
 
 _screen_scaling_factor = 1
 
 def propagate_screen_rect(ui_element, screen_rect_tl):
-    ui_element.window_screen_rect = screen_rect_tl
-    for child in getattr(ui_element, "children", []):
-        propagate_screen_rect(child, screen_rect_tl)
+    for node in traversal.walk(ui_element):
+        node.window_screen_rect = screen_rect_tl
 
 # get intersection over union for two bboxes
 def _iou(a, b):
@@ -59,106 +60,71 @@ def windows_are_equal(window1, window2):
     return False
 
 
+# outline color of every role in the segmentation, other roles are red
+ROLE_COLORS = {
+    "AXButton": "blue",
+    "AXTextField": "green",
+    "AXStaticText": "yellow",
+    "AXImage": "purple",
+    "AXGroup": "orange",
+    "AXScrollBar": "brown",
+    "AXRow": "pink",
+    "AXColumn": "cyan",
+    "AXCell": "magenta",
+    "AXTable": "lightblue",
+    "AXOutline": "lightgreen",
+    "AXLayoutArea": "lightyellow",
+    "AXLayoutItem": "lavender",
+    "AXHandle": "peachpuff",
+    "AXSplitter": "lightsalmon",
+    "AXIncrementor": "lightpink",
+    "AXBusyIndicator": "lightcyan",
+    "AXProgressIndicator": "plum",
+    "AXToolbar": "darkred",
+    "AXPopover": "darkblue",
+    "AXMenu": "darkgreen",
+    "AXMenuItem": "olive",
+    "AXMenuBar": "rebeccapurple",
+    "AXMenuBarItem": "darkorange",
+    "AXMenuButton": "saddlebrown",
+    "AXMenuItemCheckbox": "palevioletred",
+    "AXMenuItemRadio": "darkcyan",
+    "AXMenuItemPopover": "darkmagenta",
+    "AXMenuItemSplitter": "black",
+    "AXMenuItemTable": "white",
+    "AXMenuItemTextField": "lightgray",
+    "AXMenuItemStaticText": "darkgray",
+    "AXMenuItemImage": "salmon",
+    "AXMenuItemGroup": "lightblue",
+    "AXMenuItemScrollBar": "lightgreen",
+    "AXMenuItemRow": "lightyellow",
+    "AXMenuItemColumn": "lavender",
+    "AXMenuItemCell": "peachpuff",
+    "AXMenuItemOutline": "burlywood",
+    "AXMenuItemLayoutArea": "lightpink",
+    "AXMenuItemLayoutItem": "lightcyan",
+    "AXMenuItemHandle": "plum",
+    "AXMenuItemIncrementor": "darkblue",
+    "AXMenuItemBusyIndicator": "darkgreen",
+    "AXMenuItemProgressIndicator": "darkgoldenrod",
+    "AXMenuItemToolbar": "rebeccapurple",
+}
+DEFAULT_ROLE_COLOR = "red"
+
+# role -> index into ROLE_PALETTE, the last row of the palette is the default color
+ROLE_IDS = {role: index for index, role in enumerate(ROLE_COLORS)}
+ROLE_PALETTE = np.array(
+    [ImageColor.getrgb(color) for color in ROLE_COLORS.values()] + [ImageColor.getrgb(DEFAULT_ROLE_COLOR)],
+    dtype=np.uint8,
+)
+
+# outline width in device pixels
+SEGMENT_OUTLINE_WIDTH = 2
+
+
 # get color for the role
 def color_for_role(role):
-    color = "red"
-    if role == "AXButton":
-        color = "blue"
-    elif role == "AXTextField":
-        color = "green"
-    elif role == "AXStaticText":
-        color = "yellow"
-    elif role == "AXImage":
-        color = "purple"
-    elif role == "AXGroup":
-        color = "orange"
-    elif role == "AXScrollBar":
-        color = "brown"
-    elif role == "AXRow":
-        color = "pink"
-    elif role == "AXColumn":
-        color = "cyan"
-    elif role == "AXCell":
-        color = "magenta"
-    elif role == "AXTable":
-        color = "lightblue"
-    elif role == "AXOutline":
-        color = "lightgreen"
-    elif role == "AXLayoutArea":
-        color = "lightyellow"
-    elif role == "AXLayoutItem":
-        color = "lavender"
-    elif role == "AXHandle":
-        color = "peachpuff"
-    elif role == "AXSplitter":
-        color = "lightsalmon"
-    elif role == "AXIncrementor":
-        color = "lightpink"
-    elif role == "AXBusyIndicator":
-        color = "lightcyan"
-    elif role == "AXProgressIndicator":
-        color = "plum"
-    elif role == "AXToolbar":
-        color = "darkred"
-    elif role == "AXPopover":
-        color = "darkblue"
-    elif role == "AXMenu":
-        color = "darkgreen"
-    elif role == "AXMenuItem":
-        color = "olive"
-    elif role == "AXMenuBar":
-        color = "rebeccapurple"
-    elif role == "AXMenuBarItem":
-        color = "darkorange"
-    elif role == "AXMenuButton":
-        color = "saddlebrown"
-    elif role == "AXMenuItemCheckbox":
-        color = "palevioletred"
-    elif role == "AXMenuItemRadio":
-        color = "darkcyan"
-    elif role == "AXMenuItemPopover":
-        color = "darkmagenta"
-    elif role == "AXMenuItemSplitter":
-        color = "black"
-    elif role == "AXMenuItemTable":
-        color = "white"
-    elif role == "AXMenuItemTextField":
-        color = "lightgray"
-    elif role == "AXMenuItemStaticText":
-        color = "darkgray"
-    elif role == "AXMenuItemImage":
-        color = "salmon"
-    elif role == "AXMenuItemGroup":
-        color = "lightblue"
-    elif role == "AXMenuItemScrollBar":
-        color = "lightgreen"
-    elif role == "AXMenuItemRow":
-        color = "lightyellow"
-    elif role == "AXMenuItemColumn":
-        color = "lavender"
-    elif role == "AXMenuItemCell":
-        color = "peachpuff"
-    elif role == "AXMenuItemOutline":
-        color = "burlywood"
-    elif role == "AXMenuItemLayoutArea":
-        color = "lightpink"
-    elif role == "AXMenuItemLayoutItem":
-        color = "lightcyan"
-    elif role == "AXMenuItemHandle":
-        color = "plum"
-    elif role == "AXMenuItemSplitter":
-        color = "darkred"
-    elif role == "AXMenuItemIncrementor":
-        color = "darkblue"
-    elif role == "AXMenuItemBusyIndicator":
-        color = "darkgreen"
-    elif role == "AXMenuItemProgressIndicator":
-        color = "darkyellow"
-    elif role == "AXMenuItemToolbar":
-        color = "rebeccapurple"
-    elif role == "AXMenuItemPopover":
-        color = "darkorange"
-    return color
+    return ROLE_COLORS.get(role, DEFAULT_ROLE_COLOR)
 
 
 # segment the window components
@@ -169,16 +135,23 @@ def segment_window_components(window, image_path: str):
         return
 
     segment_image_path = image_path.replace(".png", "_segmented.png")
-    shutil.copy2(image_path, segment_image_path)
-    sleep(0.5)
-
-    # segment the image
-    segment_image(segment_image_path, window)
-    sleep(0.5)
+    with Image.open(image_path) as img:
+        segment_window_image(window, img).save(segment_image_path)
 
     return segment_image_path
 
+
+# copy of the window image with the components painted on it, nothing is written to disk
+def segment_window_image(window, image, scale=None):
+    segmented = image.copy()
+    segment_image(None, window, ImageDraw.Draw(segmented), segmented, scale)
+    return segmented
+
 def _build_global_visible_index(bundle_ids):
+    from macapptree.apps import get_visible_windows_for_bundles
+    from macapptree.screenshot_app_window import rect_subtract
+    from macapptree.window_matching import VisibleWindowIndex
+
     windows = get_visible_windows_for_bundles(bundle_ids) 
     seen = []
     out = []
@@ -186,60 +159,75 @@ def _build_global_visible_index(bundle_ids):
         x, y, W, H = w["bounds"]
         full = (x, y, W, H)
         remaining = rect_subtract(full, seen)
+        entry = {"pid": w["pid"], "window_number": w["window_number"], "bounds": full, "visible": remaining}
         if remaining:
-            out.append({"pid": w["pid"], "bounds": full, "visible": remaining})
             seen.append(full)
-        else:
-            out.append({"pid": w["pid"], "bounds": full, "visible": []})
-    return out
+        out.append(entry)
+    return VisibleWindowIndex(out)
 
 
 # paint all children to a different color on the screenshot
-def segment_image(image_path, window_element, image_drawer=None, img=None):
-    if image_path is None:
+def segment_image(image_path, window_element, image_drawer=None, img=None, scale=None):
+    if image_path is None and image_drawer is None:
         return
+    scale = _screen_scaling_factor if scale is None else scale
 
-    if image_drawer is None:
+    owns_image = image_drawer is None
+    if owns_image:
         img = Image.open(image_path)
         image_drawer = ImageDraw.Draw(img)
 
-    # iterate over all children
-    for child in getattr(window_element, "children", []):
-        if getattr(child, "children", None):
-            segment_image(image_path, child, image_drawer=image_drawer, img=img)
+    boxes, heights, role_ids = flatten_segments(window_element)
+    draw_segments(image_drawer, segment_pixel_boxes(boxes, heights, scale), role_ids)
+
+    if owns_image:
+        print(f"Saving segmented image to {image_path}")
+        img.save(image_path)
 
-        if not child.visible:
-            continue
 
+# the boxes segment_image draws as arrays: visible bboxes (n, 4) in points, node heights and role ids.
+# the tree is walked once, children come before their parents so that parents are drawn on top
+def flatten_segments(window_element):
+    boxes = []
+    heights = []
+    role_ids = []
+    default_id = len(ROLE_IDS)
+    for child in traversal.walk_post_order(window_element):
+        if child is window_element or not child.visible:
+            continue
         bbox = child.visible_bbox
         if not bbox:
             continue
-
         size = child.size
         if size is None or size.width == 0 or size.height == 0:
             continue
-
-        height_offset = 0 if size.height < 2 else 2
-
-        # convert to device pixels 
-        x1, y1, x2, y2 = bbox
-        rx1 = int(x1 * _screen_scaling_factor)
-        ry1 = int(y1 * _screen_scaling_factor)
-        rx2 = int(x2 * _screen_scaling_factor) - 1
-        ry2 = int(y2 * _screen_scaling_factor) - height_offset + 1
-
-        if rx2 < rx1:
-            rx2 = rx1
-        if ry2 < ry1:
-            ry2 = ry1
-
-        color = color_for_role(getattr(child, "role", ""))
-
-        try:
-            image_drawer.rectangle([(rx1, ry1), (rx2, ry2)], outline=color, width=2)
-        except Exception as e:
-            print(f"Error drawing rectangle: {e}")
-
-    if image_drawer is None:
-        print(f"Saving segmented image to {image_path}")
-        img.save(image_path)
+        boxes.append(bbox)
+        heights.append(size.height)
+        role_ids.append(ROLE_IDS.get(getattr(child, "role", ""), default_id))
+    return (
+        np.array(boxes, dtype=np.float64).reshape(-1, 4),
+        np.array(heights, dtype=np.float64),
+        np.array(role_ids, dtype=np.intp),
+    )
+
+
+# convert the boxes to inclusive device pixel rectangles, all at once
+def segment_pixel_boxes(boxes, heights, scale):
+    # int() truncates towards zero like astype
+    pixels = (boxes * scale).astype(np.int64)
+    height_offset = np.where(heights < 2, 0, 2)
+    pixels[:, 2] -= 1
+    pixels[:, 3] += 1 - height_offset
+    np.maximum(pixels[:, 2], pixels[:, 0], out=pixels[:, 2])
+    np.maximum(pixels[:, 3], pixels[:, 1], out=pixels[:, 3])
+    return pixels
+
+
+# outline the rectangles in order with the palette colors of their roles.
+# the outlines are rasterized by PIL: NumPy slice fills, per box or for all outline pixels at once,
+# take 2.5-3x as long, and copying the image to an array and back alone costs half of PIL's
+# time (python -m benchmarks.segments)
+def draw_segments(image_drawer, pixel_boxes, role_ids):
+    colors = [tuple(color) for color in ROLE_PALETTE[role_ids].tolist()]
+    for box, color in zip(pixel_boxes.tolist(), colors):
+        image_drawer.rectangle(box, outline=color, width=SEGMENT_OUTLINE_WIDTH)
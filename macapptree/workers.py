@@ -0,0 +1,22 @@
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+# call process(app_bundle) for every app, concurrently when workers > 1.
+# returns (result, elapsed seconds) per app in the order of app_bundles, whatever order they finish in
+def run_apps(app_bundles, process, workers=1, clock=time.time):
+    def timed(app_bundle):
+        print(f"Processing app: {app_bundle}")
+        start = clock()
+        result = process(app_bundle)
+        elapsed = clock() - start
+        print(f"Processed {app_bundle} in {elapsed:.2f}s")
+        return result, elapsed
+
+    if workers > 1 and len(app_bundles) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # the workers use the backend and capture source of the caller
+            futures = [pool.submit(contextvars.copy_context().run, timed, app_bundle) for app_bundle in app_bundles]
+            return [future.result() for future in futures]
+    return [timed(app_bundle) for app_bundle in app_bundles]
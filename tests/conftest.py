@@ -0,0 +1,50 @@
+import pytest
+
+from macapptree.backend import ReplayAXBackend, use_backend
+from macapptree.uielement import UIElement
+
+
+ROLES = ("AXGroup", "AXButton", "AXStaticText", "AXTextField", "AXImage")
+
+
+# recording of one app (pid 1) with a window whose tree has the given depth and fanout.
+# titles maps a node id to a replacement title, to make a changed snapshot of the same tree
+def make_recording(depth, fanout, titles=None):
+    titles = titles or {}
+    elements = {"0": {"attributes": {"AXWindows": [0, [{"$element": 1}]]}}}
+    pending = [(1, 0, 0.0, 0.0, 800.0, 600.0)]
+    next_id = 2
+    while pending:
+        node_id, level, x, y, width, height = pending.pop()
+        children = []
+        if level < depth:
+            child_width = width / fanout
+            for index in range(fanout):
+                children.append(next_id)
+                pending.append((next_id, level + 1, x + index * child_width, y + 2, child_width - 1, height - 4))
+                next_id += 1
+        elements[str(node_id)] = {
+            "attributes": {
+                "AXRole": [0, "AXWindow" if node_id == 1 else ROLES[node_id % len(ROLES)]],
+                "AXTitle": [0, titles.get(node_id, f"node {node_id}")],
+                "AXPosition": [0, {"$point": [x, y]}],
+                "AXSize": [0, {"$size": [width, height]}],
+                "AXEnabled": [0, True],
+                "AXDescription": [0, f"description {node_id}"],
+            },
+            "children": [{"$element": child} for child in children],
+        }
+    return {"elements": elements, "applications": {"1": 0}}
+
+
+# the window of a recording as a UIElement tree
+def build_window(recording, **kwargs):
+    replay = ReplayAXBackend(recording)
+    with use_backend(replay):
+        window = replay.attribute(replay.application(1), "AXWindows")[0]
+        return UIElement(window, **kwargs)
+
+
+@pytest.fixture
+def recording():
+    return make_recording(4, 4)
@@ -0,0 +1,161 @@
+import importlib.util
+import sys
+import types
+
+import pytest
+
+from conftest import make_recording
+
+import macapptree.backend as backend
+from macapptree import traversal
+from macapptree.backend import CountingAXBackend, ReplayAXBackend, RecordingAXBackend, use_backend, get_backend, set_backend
+from macapptree.uielement import UIElement
+
+
+# stand-ins for the pyobjc modules, just enough for the LiveAXBackend method bodies
+class NSArray(list):
+    pass
+
+
+class NSArrayM(NSArray):
+    pass
+
+
+class AXValueRef:
+    pass
+
+
+CF_STRING, CF_BOOLEAN, CF_ARRAY, CF_NUMBER, AX_ELEMENT = range(1, 6)
+
+
+def _stub_modules():
+    foundation = types.ModuleType("Foundation")
+    foundation.NSArray = NSArray
+    setattr(foundation, "__NSArrayM", NSArrayM)
+    foundation.CFGetTypeID = lambda value: CF_ARRAY if isinstance(value, NSArray) else CF_STRING
+    foundation.CFStringGetTypeID = lambda: CF_STRING
+    foundation.CFBooleanGetTypeID = lambda: CF_BOOLEAN
+    foundation.CFArrayGetTypeID = lambda: CF_ARRAY
+    foundation.CFNumberGetTypeID = lambda: CF_NUMBER
+
+    services = types.ModuleType("ApplicationServices")
+    services.kAXErrorSuccess = 0
+    services.kAXChildrenAttribute = backend.AX_CHILDREN
+    services.AXValueRef = AXValueRef
+    services.AXUIElementGetTypeID = lambda: AX_ELEMENT
+    services.AXValueGetType = lambda value: 0
+    services.AXUIElementCopyAttributeValue = lambda element, attribute, _: (0, NSArrayM(["a", "b"]))
+    services.AXUIElementCopyMultipleAttributeValues = (
+        lambda element, attributes, options, _: (0, [NSArrayM(["c"]), "title"])
+    )
+    services.AXUIElementCopyAttributeValues = (
+        lambda element, attribute, index, count, _: (0, NSArrayM(["d", "e"]))
+    )
+
+    appkit = types.ModuleType("AppKit")
+    appkit.NSDate = type("NSDate", (), {})
+    return {"Foundation": foundation, "ApplicationServices": services, "AppKit": appkit}
+
+
+# a separate copy of macapptree.backend imported with the stand-ins, the real module is left alone
+@pytest.fixture
+def live_backend_module(monkeypatch):
+    for name, module in _stub_modules().items():
+        monkeypatch.setitem(sys.modules, name, module)
+    spec = importlib.util.spec_from_file_location("_live_backend_under_test", backend.__file__)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_live_backend_converts_arrays(live_backend_module):
+    live = live_backend_module.LiveAXBackend()
+    assert live.copy_attribute("element", "AXChildren") == (0, ["a", "b"])
+    assert live.copy_multiple_attributes("element", ["AXChildren", "AXTitle"]) == [(0, ["c"]), (0, "title")]
+    assert live.children("element") == ["d", "e"]
+    assert live.is_array(NSArray())
+    assert live.is_date(sys.modules["AppKit"].NSDate())
+
+
+# an AXValueRef carrying an error code, as AXUIElementCopyMultipleAttributeValues reports failed attributes
+class ErrorValue(AXValueRef):
+    def __init__(self, code):
+        self.code = code
+
+
+def test_live_backend_batch_errors(live_backend_module, monkeypatch):
+    services = sys.modules["ApplicationServices"]
+    monkeypatch.setattr(services, "AXValueGetType",
+                        lambda value: backend.AX_VALUE_AXERROR if isinstance(value, ErrorValue) else 0)
+    monkeypatch.setattr(services, "AXValueGetValue", lambda value, type, _: (True, value.code), raising=False)
+    monkeypatch.setattr(services, "AXUIElementCopyMultipleAttributeValues", lambda element, attributes, options, _: (
+        0, [ErrorValue(backend.AX_ERROR_NO_VALUE), ErrorValue(backend.AX_ERROR_CANNOT_COMPLETE), "title"]
+    ))
+    live = live_backend_module.LiveAXBackend()
+    # missing values stay errors, transient errors are fetched again on their own
+    assert live.copy_multiple_attributes("element", ["AXValue", "AXChildren", "AXTitle"]) == [
+        (backend.AX_ERROR_NO_VALUE, None), (0, ["a", "b"]), (0, "title")
+    ]
+
+    # a failed batch falls back to one call per attribute
+    monkeypatch.setattr(services, "AXUIElementCopyMultipleAttributeValues",
+                        lambda element, attributes, options, _: (backend.AX_ERROR_CANNOT_COMPLETE, None))
+    assert live.copy_multiple_attributes("element", ["AXChildren", "AXTitle"]) == [(0, ["a", "b"])] * 2
+
+
+# one batch per node and one action names call per expanded node, against one call per attribute
+@pytest.mark.parametrize("max_depth", [None, 2])
+def test_batched_capture_round_trips(monkeypatch, max_depth):
+    recording = make_recording(3, 3)
+    trees = {}
+    calls = {}
+    for batch in (True, False):
+        monkeypatch.setattr(UIElement, "batch_attributes", batch)
+        counting = CountingAXBackend(ReplayAXBackend(recording))
+        with use_backend(counting):
+            window = counting.attribute(counting.application(1), "AXWindows")[0]
+            counting.reset()
+            trees[batch] = UIElement(window, max_depth=max_depth)
+        calls[batch] = counting.calls
+
+    nodes = list(traversal.walk(trees[True]))
+    expanded = sum(1 for _, depth, _ in traversal.walk_with_depth(trees[True]) if max_depth is None or depth < max_depth)
+    assert trees[True].to_dict() == trees[False].to_dict()
+    assert calls[True] == {"copy_multiple_attributes": len(nodes), "action_names": expanded}
+    assert calls[False]["copy_attribute"] > 5 * len(nodes)
+    assert calls[False]["action_names"] == expanded
+    assert calls[False]["children"] == expanded
+
+
+def _recording():
+    return {
+        "elements": {
+            "0": {"attributes": {"AXWindows": [0, [{"$element": 1}]]}},
+            "1": {
+                "attributes": {
+                    "AXRole": [0, "AXWindow"],
+                    "AXTitle": [0, "Window"],
+                    "AXPosition": [0, {"$point": [0, 0]}],
+                    "AXSize": [0, {"$size": [100, 50]}],
+                    "AXValue": [0, "text"],
+                    "AXEnabled": [0, True],
+                },
+                "children": [],
+            },
+        },
+        "applications": {"1": 0},
+    }
+
+
+def test_to_dict_after_replay_needs_no_live_backend():
+    replay = ReplayAXBackend(_recording())
+    with use_backend(replay):
+        window = UIElement(replay.attribute(replay.application(1), "AXWindows")[0])
+    previous = backend._backend
+    set_backend(None)
+    try:
+        # without pyobjc a live backend cannot be created, to_dict must not need one
+        assert window.to_dict()["value"] == "text"
+        assert backend._backend is None
+    finally:
+        set_backend(previous)
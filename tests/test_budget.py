@@ -0,0 +1,129 @@
+import pytest
+
+from conftest import make_recording
+from macapptree import budget as capture_budget
+from macapptree import traversal
+from macapptree.backend import DelegatingAXBackend, ReplayAXBackend, use_backend
+from macapptree.budget import CaptureBudget
+from macapptree.uielement import UIElement
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+# every round trip takes the given seconds on the fake clock
+class TickingAXBackend(DelegatingAXBackend):
+    def __init__(self, backend, clock, seconds):
+        super().__init__(backend)
+        self.clock = clock
+        self.seconds = seconds
+
+    def copy_multiple_attributes(self, element, attributes):
+        self.clock.now += self.seconds
+        return super().copy_multiple_attributes(element, attributes)
+
+    def action_names(self, element):
+        self.clock.now += self.seconds
+        return super().action_names(element)
+
+
+# the window of the recording built under the budget, with the calls charged to it
+def _capture(recording, budget, backend=None):
+    replay = ReplayAXBackend(recording)
+    window = replay.attribute(replay.application(1), "AXWindows")[0]
+    with use_backend(budget.track(backend or replay)):
+        return UIElement(window, budget=budget.start())
+
+
+def _children_ids(node):
+    return [child.ax_element.element_id for child in node.children]
+
+
+# the partial tree is the full one with the children of the truncated nodes cut
+def _check_truncation(window, budget, full):
+    full_nodes = {node.ax_element.element_id: node for node in traversal.walk(full)}
+    truncated = 0
+    for node in traversal.walk(window):
+        expected = _children_ids(full_nodes[node.ax_element.element_id])
+        if node.truncated:
+            truncated += 1
+            assert len(node.children) < len(expected)
+            assert set(_children_ids(node)) <= set(expected)
+        else:
+            assert _children_ids(node) == expected
+    assert truncated == budget.truncated > 0
+    assert sum(1 for node in traversal.walk(window)) == budget.nodes
+    assert sum(budget.nodes_by_role.values()) == budget.nodes
+    dumped = [window.to_dict()]
+    marked = 0
+    while dumped:
+        node = dumped.pop()
+        marked += node.get("truncated", False)
+        dumped.extend(node["children"])
+    assert marked == truncated
+
+
+@pytest.fixture
+def full(recording):
+    return _capture(recording, CaptureBudget())
+
+
+def test_unlimited_budget_captures_everything(recording, full):
+    budget = CaptureBudget()
+    window = _capture(recording, budget)
+    assert window.to_dict() == full.to_dict()
+    assert budget.reason is None and budget.truncated == 0
+    assert budget.nodes == sum(1 for _ in traversal.walk(full))
+
+
+@pytest.mark.parametrize("max_nodes", [1, 5, 17, 100])
+def test_node_limit(recording, full, max_nodes):
+    budget = CaptureBudget(max_nodes=max_nodes)
+    window = _capture(recording, budget)
+    assert budget.reason == capture_budget.MAX_NODES
+    assert budget.nodes == max_nodes
+    _check_truncation(window, budget, full)
+
+
+@pytest.mark.parametrize("max_attribute_calls", [2, 17, 50, 100])
+def test_attribute_call_limit(recording, full, max_attribute_calls):
+    budget = CaptureBudget(max_attribute_calls=max_attribute_calls)
+    window = _capture(recording, budget)
+    assert budget.reason == capture_budget.MAX_ATTRIBUTE_CALLS
+    assert budget.attribute_calls <= max_attribute_calls
+    _check_truncation(window, budget, full)
+
+
+def test_deadline(recording, full):
+    clock = FakeClock()
+    budget = CaptureBudget(deadline=1.0, clock=clock)
+    backend = TickingAXBackend(ReplayAXBackend(recording), clock, 0.01)
+    window = _capture(recording, budget, backend)
+    assert budget.reason == capture_budget.DEADLINE
+    # the call that crossed the deadline is the last one
+    assert budget.elapsed == pytest.approx(1.0)
+    _check_truncation(window, budget, full)
+
+
+# max_depth cuts are what the caller asked for and stay unmarked, budget limits still apply below it
+def test_depth_limit(recording, full):
+    replay = ReplayAXBackend(recording)
+    window = replay.attribute(replay.application(1), "AXWindows")[0]
+    budget = CaptureBudget()
+    with use_backend(budget.track(replay)):
+        shallow = UIElement(window, max_depth=2, budget=budget.start())
+    assert max(depth for _, depth, _ in traversal.walk_with_depth(shallow)) == 2
+    assert budget.nodes == 1 + 4 + 16 and budget.truncated == 0
+    assert not any(node.truncated for node in traversal.walk(shallow))
+
+    budget = CaptureBudget(max_nodes=10)
+    with use_backend(budget.track(replay)):
+        limited = UIElement(window, max_depth=2, budget=budget.start())
+    assert budget.nodes == 10 and budget.reason == capture_budget.MAX_NODES
+    assert max(depth for _, depth, _ in traversal.walk_with_depth(limited)) <= 2
+    assert budget.truncated == sum(node.truncated for node in traversal.walk(limited)) > 0
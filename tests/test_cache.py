@@ -0,0 +1,154 @@
+import pytest
+
+from conftest import build_window, make_recording
+from macapptree import traversal
+from macapptree.backend import CountingAXBackend, ReplayAXBackend, use_backend
+from macapptree.cache import BYTES_PER_NODE, SubtreeCache
+from macapptree.uielement import UIElement
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def cache(monkeypatch, clock):
+    cache = SubtreeCache(ttl=10.0, min_nodes=5, clock=clock)
+    monkeypatch.setattr(UIElement, "subtree_cache", cache)
+    return cache
+
+
+# the window of a recording with 4 cached 21-node subtrees, each holding 4 cached 5-node subtrees
+@pytest.fixture
+def recording():
+    return make_recording(3, 4)
+
+
+def _capture(recording):
+    counting = CountingAXBackend(ReplayAXBackend(recording))
+    with use_backend(counting):
+        window = counting.attribute(counting.application(1), "AXWindows")[0]
+        return UIElement(window), counting.round_trips
+
+
+def _uncached(recording, monkeypatch):
+    with monkeypatch.context() as patch:
+        patch.setattr(UIElement, "subtree_cache", None)
+        return build_window(recording).to_dict()
+
+
+def _attributes(recording, element_id):
+    return recording["elements"][str(element_id)]["attributes"]
+
+
+def test_unchanged_subtrees_are_reused(cache, recording, monkeypatch):
+    first, first_trips = _capture(recording)
+    # every node below the window is looked up, subtrees of 5 nodes and more are stored
+    assert cache.stats.hits == 0 and cache.stats.misses == 84 and cache.stats.stores == 20
+    assert len(cache) == 20 and cache.nbytes == 4 * 21 * BYTES_PER_NODE
+
+    second, second_trips = _capture(recording)
+    assert cache.stats.hits == 4 and cache.stats.reused_nodes == 4 * 20
+    # the window and its children are fetched again, their subtrees are shared with the first capture
+    assert second_trips < first_trips / 4
+    assert second is not first
+    for old, new in zip(first.children, second.children):
+        assert new is not old and new.children == old.children
+        assert all(a is b for a, b in zip(new.children, old.children))
+    assert second.to_dict() == first.to_dict() == _uncached(recording, monkeypatch)
+
+
+@pytest.mark.parametrize("change", ["position", "size", "children"])
+def test_layout_changes_invalidate(cache, recording, monkeypatch, change):
+    first, _ = _capture(recording)
+    node = first.children[0]
+    element_id = node.ax_element.element_id
+    attributes = _attributes(recording, element_id)
+    if change == "position":
+        x, y = attributes["AXPosition"][1]["$point"]
+        attributes["AXPosition"] = [0, {"$point": [x, y + 1]}]
+    elif change == "size":
+        width, height = attributes["AXSize"][1]["$size"]
+        attributes["AXSize"] = [0, {"$size": [width, height - 1]}]
+    else:
+        recording["elements"][str(element_id)]["children"].pop()
+
+    second, _ = _capture(recording)
+    assert second.to_dict() == _uncached(recording, monkeypatch)
+    changed = next(child for child in second.children if child.ax_element.element_id == element_id)
+    # the changed node is rebuilt, its children are looked up again and reused as they did not change
+    assert cache.stats.invalidations == 1 and cache.stats.misses == 84 + 1
+    assert cache.stats.hits == 3 + len(changed.children)
+    old_children = {child.ax_element: child for child in node.children}
+    for child in changed.children:
+        assert child is not old_children[child.ax_element]
+        assert all(a is b for a, b in zip(child.children, old_children[child.ax_element].children))
+
+
+def test_deeper_changes_are_stale_until_the_ttl(cache, clock, recording, monkeypatch):
+    first, _ = _capture(recording)
+    leaf = first.children[0].children[0].children[0]
+    _attributes(recording, leaf.ax_element.element_id)["AXTitle"] = [0, "renamed"]
+
+    clock.now = 9.0
+    stale, _ = _capture(recording)
+    # the reused subtree is the one of the first capture, with the old title
+    assert stale.children[0].children[0].children[0] is leaf
+    assert leaf.name == f"node_{leaf.ax_element.element_id}"
+    assert stale.to_dict() != _uncached(recording, monkeypatch)
+
+    clock.now = 10.5
+    fresh, _ = _capture(recording)
+    assert cache.stats.expirations == 20
+    assert fresh.children[0].children[0].children[0].name == "renamed"
+    assert fresh.to_dict() == _uncached(recording, monkeypatch)
+
+
+def test_invalidate(cache, recording):
+    first, _ = _capture(recording)
+    # the entry's own charge goes, the entries of its children stay
+    cache.invalidate(first.children[0].ax_element)
+    assert len(cache) == 19 and cache.nbytes == (4 * 21 - 1) * BYTES_PER_NODE
+    cache.invalidate()
+    assert len(cache) == 0 and cache.nbytes == 0
+    _capture(recording)
+    assert cache.stats.hits == 0
+
+
+class _Node:
+    def __init__(self, element, nodes):
+        self.ax_element = element
+        self.children = [_Leaf() for _ in range(nodes - 1)]
+        self.action_items = []
+
+
+class _Leaf:
+    _subtree_nodes = 1
+    _uncharged_nodes = 1
+
+
+def test_least_recently_used_entries_are_evicted(clock):
+    cache = SubtreeCache(max_entries=3, min_nodes=1, clock=clock)
+    for element in "abc":
+        cache.store(_Node(element, 2), "signal")
+    assert cache.lookup("a", "signal") is not None
+    cache.store(_Node("d", 2), "signal")
+    assert cache.stats.evictions == 1
+    assert cache.lookup("b", "signal") is None
+    assert [cache.lookup(element, "signal") is not None for element in "acd"] == [True, True, True]
+
+    # the memory bound evicts as well, from the least recently used end
+    cache = SubtreeCache(max_entries=None, max_bytes=10 * BYTES_PER_NODE, min_nodes=1, clock=clock)
+    for element in "abc":
+        cache.store(_Node(element, 4), "signal")
+    assert len(cache) == 2 and cache.nbytes == 8 * BYTES_PER_NODE
+    assert cache.lookup("a", "signal") is None
@@ -0,0 +1,149 @@
+import threading
+
+import numpy as np
+import pytest
+
+from conftest import build_window, make_recording
+from macapptree.capture import CaptureSession, CaptureSource, FrameCaptureSource, crop_to_window, get_source, use_source
+from macapptree.window_tools import segment_window_image
+
+
+# a 1440x900 point screen at scale 2 whose pixels encode their own coordinates
+@pytest.fixture
+def frame():
+    ys, xs = np.mgrid[0:1800, 0:2880]
+    return np.stack([xs % 256, ys % 256, xs // 256 + 16 * (ys // 256)], axis=-1).astype(np.uint8)
+
+
+def test_grab_areas(frame):
+    source = FrameCaptureSource(frame, scale=2.0)
+    assert source.screen_bounds() == (0, 0, 1440, 900)
+    assert source.grab().size == (2880, 1800)
+    area = source.grab_array((100, 50.5, 300, 200))
+    assert np.array_equal(area, frame[101:501, 200:800])
+    # inside the frame, areas are views and not copies
+    assert np.shares_memory(area, frame)
+
+
+def test_areas_outside_the_frame_are_black(frame):
+    source = FrameCaptureSource(frame, scale=2.0)
+    area = source.grab_array((1400, -10, 100, 30))
+    assert area.shape == (60, 200, 3)
+    assert np.array_equal(area[20:, :80], frame[:40, 2800:])
+    assert not area[:20].any() and not area[:, 80:].any()
+
+
+def test_displays_with_an_origin(frame):
+    source = FrameCaptureSource(frame, scale=2.0, bounds=(-1440, 0, 1440, 900))
+    assert np.array_equal(source.grab_array((-1340, 50, 300, 200)), frame[100:500, 200:800])
+
+
+def test_crop_matches_grab(frame):
+    source = FrameCaptureSource(frame, scale=2.0)
+    window_coords = (120.25, 80, 640, 480)
+    cropped = crop_to_window(source.grab(), window_coords, source.scale)
+    assert np.array_equal(np.asarray(cropped), np.asarray(source.grab(window_coords)))
+
+
+def test_window_frames(frame):
+    window = np.full((20, 30, 3), 7, dtype=np.uint8)
+    source = FrameCaptureSource(frame, scale=2.0, windows={42: window})
+    assert np.array_equal(np.asarray(source.grab_window(42, (0, 0, 15, 10))), window)
+    # other windows are what the screen shows in their bounds
+    assert np.array_equal(np.asarray(source.grab_window(43, (10, 10, 15, 10))), frame[20:40, 20:50])
+
+
+def test_use_source(frame):
+    source = FrameCaptureSource(frame)
+    with use_source(source):
+        assert get_source() is source
+
+
+def test_segment_a_cropped_window(frame):
+    source = FrameCaptureSource(frame, scale=2.0)
+    cropped = source.grab((100, 50, 800, 600))
+    before = np.asarray(cropped).copy()
+    window = build_window(make_recording(2, 3))
+    segmented = np.asarray(segment_window_image(window, cropped, scale=2.0))
+    # painted on a copy, at device pixels
+    assert np.array_equal(np.asarray(cropped), before)
+    assert segmented.shape == before.shape
+    assert not np.array_equal(segmented, before)
+
+
+# a 2x main display with a 1x display to its right, counting what it grabs
+class TwoDisplays(CaptureSource):
+    scale = 2.0
+
+    def __init__(self, frame):
+        self.main = FrameCaptureSource(frame, scale=2.0)
+        side = np.full((600, 500, 3), 9, dtype=np.uint8)
+        self.side = FrameCaptureSource(side, scale=1.0, bounds=(1440, 0, 500, 600))
+        self.grabs = []
+
+    def screen_bounds(self):
+        return self.main.bounds
+
+    def displays(self):
+        return [self.main.bounds, self.side.bounds]
+
+    def grab_array(self, bounds=None):
+        self.grabs.append(bounds)
+        display = self.side if bounds is not None and bounds[0] >= 1440 else self.main
+        return display.grab_array(bounds).copy()
+
+    def grab_window_array(self, window_id, bounds):
+        self.grabs.append(("window", window_id))
+        return self.grab_array(bounds)
+
+
+def test_session_grabs_each_display_once(frame):
+    source = TwoDisplays(frame)
+    session = CaptureSession(source)
+    crops = [session.grab_array(area) for area in ((100, 50, 800, 600), (0, 0, 1440, 25), (1500, 100, 200, 50))]
+    crops.append(session.grab_array())
+    assert source.grabs == [(0, 0, 1440, 900), (1440, 0, 500, 600)]
+    assert (session.grabs, session.crops) == (2, 4)
+    assert session.displays() == [(0, 0, 1440, 900), (1440, 0, 500, 600)]
+
+    # the crops are read-only views of the display they overlap most, at its own scale
+    assert np.array_equal(crops[0], frame[100:1300, 200:1800])
+    assert crops[2].shape == (50, 200, 3) and (crops[2] == 9).all()
+    assert np.array_equal(crops[3], frame)
+    main, side = session.frames()
+    assert all(np.shares_memory(crop, main.frame) for crop in (crops[0], crops[1], crops[3]))
+    assert np.shares_memory(crops[2], side.frame)
+    with pytest.raises(ValueError):
+        crops[0][0, 0] = 0
+    straddling = session.grab_array((1400, 0, 200, 10))
+    assert straddling.shape == (10, 200, 3) and (straddling[:, 40:] == 9).all()
+
+
+def test_session_refresh_and_windows(frame):
+    source = TwoDisplays(frame)
+    session = CaptureSession(source)
+    session.grab((0, 0, 10, 10))
+    session.grab_window(7, (0, 0, 10, 10))
+    assert source.grabs[2:] == [("window", 7), (0, 0, 10, 10)]
+    # after a refresh, like revealing the dock, the displays are grabbed again
+    session.refresh()
+    session.grab((0, 0, 10, 10))
+    assert session.grabs == 4 and len(source.grabs) == 6
+
+
+def test_concurrent_crops_share_the_frames(frame):
+    source = TwoDisplays(frame)
+    session = CaptureSession(source)
+    start = threading.Barrier(8)
+    results = []
+
+    def crop(index):
+        start.wait(5)
+        results.append(session.grab_array((index * 10, 0, 10, 10)))
+
+    threads = [threading.Thread(target=crop, args=(index,)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert len(results) == 8 and session.grabs == 2 and len(source.grabs) == 2
@@ -0,0 +1,69 @@
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import macapptree.backend as backend
+import macapptree.capture as capture
+from macapptree.backend import MemoAXBackend, ReplayAXBackend, get_backend, set_backend, use_backend
+from macapptree.capture import CaptureSession, FrameCaptureSource, get_source, set_source, use_source
+
+
+@pytest.fixture
+def defaults():
+    previous_backend, previous_source = backend._backend, capture._source
+    default_backend = ReplayAXBackend({"elements": {}})
+    default_source = FrameCaptureSource(np.zeros((20, 40, 3), dtype=np.uint8))
+    set_backend(default_backend)
+    set_source(default_source)
+    yield default_backend, default_source
+    set_backend(previous_backend)
+    set_source(previous_source)
+
+
+# two captures overlapping like concurrent server requests: a starts, b starts, a ends, b ends
+def _overlapping_captures():
+    a_entered, b_entered, a_done = threading.Event(), threading.Event(), threading.Event()
+    seen = {}
+
+    def capture_a():
+        with use_backend(MemoAXBackend(get_backend())) as memo, use_source(CaptureSession(get_source())) as session:
+            a_entered.set()
+            b_entered.wait(5)
+            seen["a"] = (get_backend() is memo, get_source() is session)
+        a_done.set()
+
+    def capture_b():
+        a_entered.wait(5)
+        with use_backend(MemoAXBackend(get_backend())) as memo, use_source(CaptureSession(get_source())) as session:
+            b_entered.set()
+            a_done.wait(5)
+            seen["b"] = (get_backend() is memo, get_source() is session)
+
+    threads = [threading.Thread(target=capture_a), threading.Thread(target=capture_b)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return seen
+
+
+def test_overlapping_captures_restore_the_globals(defaults):
+    default_backend, default_source = defaults
+    seen = _overlapping_captures()
+    assert seen == {"a": (True, True), "b": (True, True)}
+    assert get_backend() is default_backend
+    assert get_source() is default_source
+
+
+def test_use_backend_is_not_visible_to_other_threads(defaults):
+    default_backend, default_source = defaults
+    memo = MemoAXBackend(default_backend)
+    with use_backend(memo):
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            assert pool.submit(get_backend).result() is default_backend
+            # process_apps runs its workers in a copy of the caller's context
+            assert pool.submit(contextvars.copy_context().run, get_backend).result() is memo
+    assert get_backend() is default_backend
@@ -0,0 +1,82 @@
+import copy
+import json
+
+import pytest
+
+from macapptree import diff, hashing
+from macapptree.uielement import UIElement
+
+from conftest import build_window, make_recording
+
+
+@pytest.fixture
+def merkle(monkeypatch):
+    monkeypatch.setattr(UIElement, "hash_scheme", hashing.MERKLE)
+
+
+def _snapshots(titles):
+    return build_window(make_recording(5, 4)), build_window(make_recording(5, 4, titles))
+
+
+def test_merkle_diff_matches_full_diff_and_applies(merkle):
+    old, new = _snapshots({7: "renamed", 300: "changed too"})
+    delta = diff.diff([old], [new])
+    assert delta == diff.diff([old], [new], exact=True)
+    assert diff.delta_size(delta) == 2
+    rebuilt = diff.apply([diff.as_dict(old)], json.loads(json.dumps(delta)))
+    assert rebuilt == [diff.as_dict(new)]
+
+
+def test_merkle_diff_only_visits_changed_paths(merkle, monkeypatch):
+    old, new = _snapshots({7: "renamed"})
+    visited = []
+    fields = diff._ElementTrees.fields
+    monkeypatch.setattr(diff._ElementTrees, "fields", lambda self, node: visited.append(node) or fields(self, node))
+    delta = diff.diff([old], [new])
+    assert diff.delta_size(delta) == 1
+    # the changed node and its ancestors, on both sides, out of 1365 nodes per tree
+    assert len(visited) <= 2 * 6
+
+
+def test_dumps_are_compared_in_full():
+    old, new = _snapshots({7: "renamed"})
+    old_dict, new_dict = diff.as_dict(old), diff.as_dict(new)
+    delta = diff.diff([old_dict], [new_dict])
+    assert diff.apply([copy.deepcopy(old_dict)], delta) == [new_dict]
+
+
+def _moved(recording, dx, dy):
+    recording = copy.deepcopy(recording)
+    for element in recording["elements"].values():
+        position = element["attributes"].get("AXPosition")
+        if position:
+            x, y = position[1]["$point"]
+            position[1]["$point"] = [x + dx, y + dy]
+    return recording
+
+
+# fields outside the content identifier: absolute positions, visible bboxes and visibility
+@pytest.mark.parametrize("change", ["moved", "clipped"])
+def test_merkle_diff_covers_layout_fields(merkle, change):
+    recording = make_recording(3, 3)
+    old = build_window(recording, parents_visible_bbox=[0, 0, 800, 600])
+    if change == "moved":
+        new = build_window(_moved(recording, 100, 50), parents_visible_bbox=[0, 0, 800, 600])
+    else:
+        new = build_window(recording, parents_visible_bbox=[0, 0, 400, 300])
+    assert old.content_identifier == new.content_identifier
+    delta = diff.diff([old], [new])
+    assert delta == diff.diff([old], [new], exact=True)
+    assert diff.delta_size(delta) > 0
+    assert diff.apply([old], delta) == [diff.as_dict(new)]
+
+
+def test_rehash_updates_dump_identifiers(merkle):
+    old = build_window(make_recording(3, 3))
+    new = build_window(make_recording(3, 3))
+    leaf = new.children[0].children[0].children[0]
+    leaf.visible_bbox = [0, 0, 1, 1]
+    hashing.rehash(new, hashing.MERKLE)
+    delta = diff.diff([old], [new])
+    assert [change["fields"] for change in delta["modified"]] == [{"visible_bbox": [0, 0, 1, 1]}]
+    assert diff.apply([old], delta) == [diff.as_dict(new)]
@@ -0,0 +1,66 @@
+from hashlib import md5
+
+import pytest
+
+from conftest import build_window, make_recording
+from macapptree import hashing, traversal
+from macapptree.uielement import UIElement
+
+
+def _md5(string):
+    return md5(string.encode()).hexdigest() if string else ""
+
+
+# the md5 identifiers as earlier versions computed them
+def _legacy(node):
+    identifier = _md5(f"{node.position.x:.0f};{node.position.y:.0f}"
+                      f"{node.size.width:.0f};{node.size.height:.0f}{node.enabled}{node.role}")
+    if not node.children:
+        return identifier, ""
+    content = _md5("".join(sorted(child.content_identifier for child in node.children)))
+    structure = _md5("".join(child.identifier for child in node.children))
+    return identifier, _md5(content.join(structure))
+
+
+def test_legacy_identifiers_are_unchanged(recording):
+    window = build_window(recording)
+    for node in traversal.walk(window):
+        assert (node.identifier, node.content_identifier) == _legacy(node)
+    # pinned, so a change of the formatting shows up as well
+    assert window.identifier == _md5("0;0800;600TrueAXWindow") == "279b2ce0cec6212963fa27d75794d6f4"
+    assert window.content_identifier == "e4570710d965abbbb138f1e24197b68a"
+
+@pytest.fixture
+def merkle(monkeypatch):
+    monkeypatch.setattr(UIElement, "hash_scheme", hashing.MERKLE)
+
+
+def test_rehash_reuses_unchanged_subtrees(merkle, recording):
+    window = build_window(recording)
+    nodes = list(traversal.walk(window))
+    before = {id(node): (node.identifier, node.content_identifier) for node in nodes}
+    assert hashing.rehash(window, hashing.MERKLE) == len(nodes)
+
+    leaf = window.children[1].children[2].children[0].children[3]
+    leaf.name = "renamed"
+    path = [window, window.children[1], window.children[1].children[2],
+            window.children[1].children[2].children[0], leaf]
+    assert hashing.rehash(window, hashing.MERKLE) == len(nodes) - len(path)
+    for node in nodes:
+        changed = (node.identifier, node.content_identifier) != before[id(node)]
+        assert changed == any(node is ancestor for ancestor in path)
+    # the identifier only covers the frame, role and enabled state
+    assert leaf.identifier == before[id(leaf)][0]
+
+    # the same tree built from scratch hashes the same
+    renamed = build_window(make_recording(4, 4, {leaf.ax_element.element_id: "renamed"}))
+    assert [node.content_identifier for node in traversal.walk(renamed)] == \
+        [node.content_identifier for node in traversal.walk(window)]
+
+
+def test_hash_key_is_a_digest(merkle, recording):
+    window = build_window(recording)
+    assert all(len(node._hash_key) == 2 * hashing.DIGEST_SIZE for node in traversal.walk(window))
+    # fields outside the identifiers still invalidate the key
+    window.children[0].visible = not window.children[0].visible
+    assert hashing.rehash(window, hashing.MERKLE) == sum(1 for _ in traversal.walk(window)) - 2
@@ -0,0 +1,77 @@
+import numpy as np
+
+from conftest import build_window, make_recording
+from macapptree import labels
+
+
+# a window with two columns of two leaves, the left column widened over the right one
+def _window():
+    recording = make_recording(2, 2)
+    recording["elements"]["2"]["attributes"]["AXSize"] = [0, {"$size": [600.0, 596.0]}]
+    return build_window(recording)
+
+
+def _dump_node(dump, path):
+    for index in path.split("/") if path else []:
+        dump = dump["children"][int(index)]
+    return dump
+
+
+# the node covering each pixel: the deepest visible one, the last in pre-order among equals
+def _expected_instances(dump, masks, shape, scale):
+    expected = np.zeros(shape, dtype=np.int64)
+    best_depth = np.full(shape, -1)
+    pending = [(dump, 0)]
+    while pending:
+        node, depth = pending.pop()
+        if node["visible"] and node["id"] in masks.node_ids:
+            x1, y1, x2, y2 = (int(value * scale) for value in node["visible_bbox"])
+            area = (slice(y1, y2), slice(x1, x2))
+            # visited in pre-order, so a node at the same depth is always later
+            wins = best_depth[area] <= depth
+            expected[area][wins] = masks.node_ids.index(node["id"]) + 1
+            best_depth[area][wins] = depth
+        pending.extend((child, depth + 1) for child in reversed(node["children"]))
+    return expected
+
+
+def test_masks_match_the_dump():
+    window = _window()
+    dump = window.to_dict()
+    masks = labels.label_masks(window, (600, 800))
+
+    # every instance is the dump node at its path
+    assert len(masks.node_ids) == 7
+    for node_id, path, role in zip(masks.node_ids, masks.node_paths, masks.roles):
+        node = _dump_node(dump, path)
+        assert (node["id"], node["role"]) == (node_id, role)
+
+    assert np.array_equal(masks.instance_mask, _expected_instances(dump, masks, (600, 800), 1.0))
+    role_ids = [labels.ROLE_CLASSES.index(role) if role in labels.ROLE_CLASSES else labels.OTHER_ROLE
+                for role in masks.roles]
+    assert np.array_equal(masks.role_mask, np.array([labels.BACKGROUND] + role_ids)[masks.instance_mask])
+
+
+def test_depth_order_resolves_overlaps():
+    window = _window()
+    masks = labels.label_masks(window, (600, 800))
+    instance = masks.instance_mask[300, 450]
+    # the widened left column comes later in pre-order, the leaf of the right column is deeper and wins
+    widened = masks.node_paths.index("1")
+    assert masks.node_paths[instance - 1] == "0/1"
+    assert masks.instance_mask[300, 601] != widened + 1
+    assert (masks.instance_mask == widened + 1).any()
+    # between the leaves only the columns and the window show
+    assert masks.node_paths[masks.instance_mask[1, 10] - 1] == ""
+
+
+def test_device_pixels_and_round_trip(tmp_path):
+    window = _window()
+    masks = labels.label_masks(window, (600, 800))
+    retina = labels.label_masks(window, (1200, 1600), scale=2.0)
+    assert np.array_equal(retina.instance_mask[::2, ::2], masks.instance_mask)
+
+    loaded = labels.load(masks.save(str(tmp_path / "labels.npz")))
+    assert np.array_equal(loaded.instance_mask, masks.instance_mask)
+    assert np.array_equal(loaded.role_mask, masks.role_mask)
+    assert (loaded.node_ids, loaded.node_paths, loaded.roles) == (masks.node_ids, masks.node_paths, masks.roles)
@@ -0,0 +1,86 @@
+import pytest
+
+from conftest import build_window
+from macapptree import traversal
+from macapptree.backend import CountingAXBackend, ReplayAXBackend, use_backend
+from macapptree.uielement import LazyUIElement, UIElement
+
+
+@pytest.fixture
+def counting(recording):
+    return CountingAXBackend(ReplayAXBackend(recording))
+
+
+def _window(counting):
+    return counting.attribute(counting.application(1), "AXWindows")[0]
+
+
+def _lazy(counting, **kwargs):
+    window = _window(counting)
+    counting.reset()
+    return LazyUIElement(window, **kwargs)
+
+
+def test_same_tree_as_eager(recording, counting):
+    with use_backend(counting):
+        lazy = _lazy(counting)
+        assert lazy.to_dict() == build_window(recording).to_dict()
+        assert lazy.content_identifier == build_window(recording).content_identifier
+    assert lazy.stats.nodes == lazy.stats.expanded == sum(1 for _ in traversal.walk(lazy))
+
+
+def test_children_are_fetched_on_access(counting):
+    with use_backend(counting):
+        window = _lazy(counting)
+        # only the window attributes, in one round trip
+        assert counting.round_trips == 1
+        assert (window.stats.nodes, window.stats.expanded) == (1, 0)
+        assert not window.materialized and window.identifier
+
+        children = window.children
+        assert window.materialized and not any(child.materialized for child in children)
+        assert (window.stats.nodes, window.stats.expanded) == (5, 1)
+        # the window actions and one batch per child
+        assert counting.round_trips == 1 + 1 + 4
+
+        counting.reset()
+        assert window.children is children and counting.round_trips == 0
+        children[0].children
+        assert (window.stats.nodes, window.stats.expanded) == (9, 2)
+        assert counting.round_trips == 1 + 4
+
+
+def test_prefetch_builds_the_next_level(counting):
+    with use_backend(counting):
+        window = _lazy(counting, prefetch=True)
+        window.children
+        assert all(child.materialized for child in window.children)
+        assert not any(grandchild.materialized for child in window.children for grandchild in child.children)
+        assert (window.stats.nodes, window.stats.expanded) == (1 + 4 + 16, 5)
+
+
+def test_content_identifier_materializes_the_subtree(counting):
+    with use_backend(counting):
+        window = _lazy(counting)
+        child = window.children[0]
+        child.content_identifier
+    assert all(node.materialized for node in traversal.walk(child))
+    assert not any(sibling.materialized for sibling in window.children[1:])
+    assert window.stats.expanded == 1 + 1 + 4 + 16 + 64
+
+
+@pytest.mark.parametrize("batch", [True, False])
+def test_max_depth_leaves_fetch_no_children(monkeypatch, counting, batch):
+    monkeypatch.setattr(UIElement, "batch_attributes", batch)
+    with use_backend(counting):
+        window = _window(counting)
+        counting.reset()
+        leaf = UIElement(window, max_depth=0)
+        assert counting.calls["children"] == 0 and not leaf.children
+
+        counting.reset()
+        shallow = LazyUIElement(window, max_depth=1)
+        shallow.to_dict()
+    # batched the children come with the attributes, unbatched only the window asks for them
+    assert counting.calls["children"] == (0 if batch else 1)
+    assert len(shallow.children) == 4 and not any(child.children for child in shallow.children)
@@ -0,0 +1,89 @@
+import pytest
+
+from conftest import make_recording
+from macapptree import backend
+from macapptree.backend import CountingAXBackend, DelegatingAXBackend, MemoAXBackend, ReplayAXBackend, use_backend
+from macapptree.uielement import UIElement
+
+
+# fails the first call for every attribute of an element, like an app that is still busy
+class BusyAXBackend(DelegatingAXBackend):
+    def __init__(self, backend):
+        super().__init__(backend)
+        self.seen = set()
+
+    def copy_attribute(self, element, attribute):
+        if (element, attribute) not in self.seen:
+            self.seen.add((element, attribute))
+            return backend.AX_ERROR_CANNOT_COMPLETE, None
+        return super().copy_attribute(element, attribute)
+
+
+def _build(ax, **kwargs):
+    with use_backend(ax):
+        return UIElement(ax.attribute(ax.application(1), "AXWindows")[0], **kwargs)
+
+
+@pytest.mark.parametrize("batch", [True, False])
+def test_every_reply_crosses_once(monkeypatch, batch):
+    monkeypatch.setattr(UIElement, "batch_attributes", batch)
+    counting = CountingAXBackend(ReplayAXBackend(make_recording(3, 3)))
+    memo = MemoAXBackend(counting)
+    window = _build(memo)
+    calls = counting.round_trips
+    assert memo.calls_saved == 0
+
+    # a second build and the children refetched by recursive_children come from the memo
+    again = _build(memo)
+    with use_backend(memo):
+        descendants = window.recursive_children()
+    assert counting.round_trips == calls
+    assert again.to_dict() == window.to_dict()
+    assert len(descendants) == 1 + 3 + 9 + 27 - 1
+    assert memo.calls_saved > 0
+    assert sum(memo.fetched.values()) == sum(counting.attribute_calls.values()) + counting.calls["action_names"]
+
+
+def test_batches_fetch_only_missing_attributes():
+    counting = CountingAXBackend(ReplayAXBackend(make_recording(1, 1)))
+    memo = MemoAXBackend(counting)
+    window = memo.attribute(memo.application(1), "AXWindows")[0]
+    assert memo.attribute(window, backend.AX_TITLE) == "node 1"
+    counting.reset()
+    replies = memo.copy_multiple_attributes(window, [backend.AX_ROLE, backend.AX_TITLE])
+    assert replies == [(0, "AXWindow"), (0, "node 1")]
+    assert counting.attribute_calls == {backend.AX_ROLE: 1}
+    assert memo.duplicates[backend.AX_TITLE] == 1
+
+    # children read in a batch are not fetched again on their own
+    memo.copy_multiple_attributes(window, [backend.AX_CHILDREN])
+    counting.reset()
+    assert len(memo.children(window)) == 1
+    assert counting.round_trips == 0
+
+
+def test_transient_errors_are_not_remembered():
+    busy = BusyAXBackend(ReplayAXBackend(make_recording(1, 1)))
+    memo = MemoAXBackend(busy)
+    application = memo.application(1)
+    assert memo.attribute(application, "AXWindows") is None
+    window = memo.attribute(application, "AXWindows")[0]
+    # the first reply was an error and is asked again, the second one is kept
+    assert memo.attribute(window, backend.AX_TITLE) is None
+    assert memo.attribute(window, backend.AX_TITLE) == "node 1"
+    assert memo.attribute(window, backend.AX_TITLE) == "node 1"
+    assert memo.fetched[backend.AX_TITLE] == 2 and memo.duplicates[backend.AX_TITLE] == 1
+
+
+# a group with one child of a different frame reads the child's frame, then builds the child
+def test_group_child_is_read_once():
+    recording = make_recording(3, 1)
+    recording["elements"]["2"]["attributes"]["AXRole"] = [0, "AXGroup"]
+    plain = CountingAXBackend(ReplayAXBackend(recording))
+    counting = CountingAXBackend(ReplayAXBackend(recording))
+    memo = MemoAXBackend(counting)
+    assert _build(memo).to_dict() == _build(plain).to_dict()
+    # window, group, child and grandchild, the group's child twice without the memo
+    assert counting.calls["copy_multiple_attributes"] == 4
+    assert plain.calls["copy_multiple_attributes"] == 4 + 1
+    assert memo.duplicates[backend.AX_POSITION] == 1
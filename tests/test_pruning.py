@@ -0,0 +1,112 @@
+from conftest import make_recording
+from macapptree import traversal
+from macapptree.backend import DelegatingAXBackend, ReplayAXBackend, use_backend
+from macapptree.pruning import ALWAYS, VisibilityPruning
+from macapptree.uielement import UIElement
+
+
+SCREEN = [0, 0, 800, 600]
+
+
+# remembers the elements whose attributes were fetched
+class FetchLog(DelegatingAXBackend):
+    def __init__(self, backend):
+        super().__init__(backend)
+        self.elements = set()
+
+    def copy_multiple_attributes(self, element, attributes):
+        self.elements.add(element.element_id)
+        return super().copy_multiple_attributes(element, attributes)
+
+
+def _children_ids(recording, element_id):
+    return [child["$element"] for child in recording["elements"][str(element_id)]["children"]]
+
+
+def _attributes(recording, element_id):
+    return recording["elements"][str(element_id)]["attributes"]
+
+
+# a window with an off-screen subtree, a zero-area subtree, a subtree clipped away by its parent
+# and a closed menu reporting an off-screen frame
+def _recording():
+    recording = make_recording(3, 4)
+    offscreen, zero_area, clipping, menu = _children_ids(recording, 1)
+    _attributes(recording, offscreen)["AXPosition"] = [0, {"$point": [2000.0, 2000.0]}]
+    _attributes(recording, zero_area)["AXSize"] = [0, {"$size": [0.0, 596.0]}]
+    clipped = _children_ids(recording, clipping)[0]
+    _attributes(recording, clipped)["AXPosition"] = [0, {"$point": [700.0, 2.0]}]
+    _attributes(recording, menu)["AXRole"] = [0, "AXMenu"]
+    _attributes(recording, menu)["AXPosition"] = [0, {"$point": [-900.0, -900.0]}]
+    return recording, {"offscreen": offscreen, "zero_area": zero_area, "clipped": clipped, "menu": menu}
+
+
+def _capture(recording, monkeypatch, pruning):
+    monkeypatch.setattr(UIElement, "visibility_pruning", pruning)
+    log = FetchLog(ReplayAXBackend(recording))
+    with use_backend(log):
+        window = log.attribute(log.application(1), "AXWindows")[0]
+        return UIElement(window, parents_visible_bbox=SCREEN), log.elements
+
+
+# the unpruned dump with the children of the nodes the pruning does not descend into cut
+def _expected(window, pruning):
+    results = {}
+    for node in traversal.walk_post_order(window):
+        result = node._node_dict()
+        if pruning.descend(node):
+            result["children"] = [results[id(child)] for child in node.children]
+        else:
+            result["children"] = []
+            result["pruned"] = True
+        results[id(node)] = result
+    return results[id(window)]
+
+
+def test_invisible_subtrees_are_stubs(monkeypatch):
+    recording, ids = _recording()
+    full, full_fetched = _capture(recording, monkeypatch, None)
+    pruning = VisibilityPruning()
+    pruned, pruned_fetched = _capture(recording, monkeypatch, pruning)
+
+    # visible parts are unchanged, the invisible ones are stubs
+    assert pruned.to_dict() == _expected(full, VisibilityPruning())
+    stubs = {node.ax_element.element_id: node for node in traversal.walk(pruned) if node.pruned}
+    assert set(stubs) >= {ids["offscreen"], ids["zero_area"], ids["clipped"]}
+    assert ids["menu"] not in stubs
+    assert all(not node.children and not (node.visible and node.visible_bbox) for node in stubs.values())
+    assert pruning.pruned == len(stubs)
+
+    # nothing below the stubs was fetched
+    below = {
+        node.ax_element.element_id
+        for stub in (node for node in traversal.walk(full) if node.ax_element.element_id in stubs)
+        for node in list(traversal.walk(stub))[1:]
+    }
+    assert below and not below & pruned_fetched
+    assert pruned_fetched == full_fetched - below
+
+
+def test_role_policies(monkeypatch):
+    recording, ids = _recording()
+    full, _ = _capture(recording, monkeypatch, None)
+
+    # without the default policies the closed menu is pruned as well
+    pruning = VisibilityPruning(role_policies={})
+    pruned, _ = _capture(recording, monkeypatch, pruning)
+    assert pruned.to_dict() == _expected(full, pruning)
+    assert any(node.pruned and node.ax_element.element_id == ids["menu"] for node in traversal.walk(pruned))
+
+    # and a role can be always descended into, like --always-descend
+    pruning = VisibilityPruning(role_policies={"AXMenu": ALWAYS, "AXWindow": ALWAYS}, default=ALWAYS)
+    everything, _ = _capture(recording, monkeypatch, pruning)
+    assert everything.to_dict() == full.to_dict() and pruning.pruned == 0
+
+
+def test_min_area(monkeypatch):
+    recording, _ = _recording()
+    full, _ = _capture(recording, monkeypatch, None)
+    pruning = VisibilityPruning(min_area=200 * 600)
+    pruned, _ = _capture(recording, monkeypatch, pruning)
+    assert pruned.to_dict() == _expected(full, VisibilityPruning(min_area=200 * 600))
+    assert all(not node.children for node in traversal.walk(pruned) if node.pruned)
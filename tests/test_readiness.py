@@ -0,0 +1,97 @@
+import pytest
+
+from conftest import make_recording
+from macapptree import readiness
+from macapptree.backend import ReplayAXBackend, use_backend
+from macapptree.readiness import WaitLog, wait_until
+
+
+# time only moves when the wait sleeps
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def _wait(condition, clock, wait_log, **kwargs):
+    return wait_until(condition, wait_log=wait_log, clock=clock, sleep=clock.sleep, **kwargs)
+
+
+# a condition that becomes true at the given time
+def ready_at(clock, at, value="ready"):
+    def condition():
+        return value if clock.now >= at else None
+    return condition
+
+
+def test_condition_met():
+    clock, wait_log = FakeClock(), WaitLog()
+    assert _wait(ready_at(clock, 0.0), clock, wait_log, name="now") == "ready"
+    assert clock.sleeps == []
+
+    assert _wait(ready_at(clock, 0.05), clock, wait_log, name="later") == "ready"
+    assert clock.now == pytest.approx(0.07)
+    now, later = wait_log.records
+    assert (now.name, now.ready, now.polls, now.elapsed) == ("now", True, 1, 0.0)
+    assert (later.name, later.ready, later.polls) == ("later", True, 4)
+    assert later.elapsed == pytest.approx(0.07)
+
+
+def test_timeout():
+    clock, wait_log = FakeClock(), WaitLog()
+    condition = ready_at(clock, 10.0)
+    assert _wait(condition, clock, wait_log, timeout=0.5) is None
+    record = wait_log.records[0]
+    assert record.name == "condition" and not record.ready
+    assert record.elapsed == pytest.approx(0.5)
+    # the last sleep ends at the timeout, the condition gets a last poll there
+    assert sum(clock.sleeps) == pytest.approx(0.5)
+    assert record.polls == len(clock.sleeps) + 1
+
+
+def test_polling_interval_backs_off():
+    clock, wait_log = FakeClock(), WaitLog()
+    _wait(ready_at(clock, 10.0), clock, wait_log, timeout=1.0, interval=0.01)
+    assert clock.sleeps[:5] == pytest.approx([0.01, 0.02, 0.04, 0.08, readiness.MAX_INTERVAL])
+    assert max(clock.sleeps) == readiness.MAX_INTERVAL
+
+
+def test_stats():
+    clock, wait_log = FakeClock(), WaitLog()
+    _wait(ready_at(clock, 0.03), clock, wait_log, name="a")
+    _wait(ready_at(clock, 10.0), clock, wait_log, name="a", timeout=0.2)
+    _wait(ready_at(clock, 0.0), clock, wait_log, name="b")
+    stats = wait_log.stats()
+    assert stats["a"]["count"] == 2 and stats["a"]["timeouts"] == 1
+    assert stats["a"]["max"] == pytest.approx(0.2)
+    assert stats["b"] == {"count": 1, "total": 0.0, "max": 0.0, "timeouts": 0}
+    assert wait_log.total == pytest.approx(stats["a"]["total"])
+
+
+def test_file_complete(tmp_path):
+    path = tmp_path / "screenshot.png"
+    condition = readiness.file_complete(str(path))
+    assert not condition()
+    path.write_bytes(b"1234")
+    # the size has to hold still for one poll
+    assert not condition()
+    assert condition()
+    path.write_bytes(b"123456")
+    assert not condition()
+
+
+def test_element_on_screen():
+    recording = make_recording(1, 2)
+    replay = ReplayAXBackend(recording)
+    with use_backend(replay):
+        window = replay.attribute(replay.application(1), "AXWindows")[0]
+        assert readiness.element_on_screen(window, (0, 0, 800, 600))()
+        assert not readiness.element_on_screen(window, (0, 0, 800, 500))()
+        assert not readiness.element_on_screen(None, (0, 0, 800, 600))()
@@ -0,0 +1,88 @@
+import json
+
+import pytest
+
+from conftest import build_window, make_recording
+from macapptree import serializer, traversal
+from macapptree.tree_store import TreeStore
+
+
+# a recording whose node 3 has another element as its value, like a scroll area pointing at its content
+def _recording_with_element_value():
+    recording = make_recording(2, 3)
+    recording["elements"]["900"] = {
+        "attributes": {
+            "AXRole": [0, "AXTextArea"],
+            "AXTitle": [0, "content"],
+            "AXPosition": [0, {"$point": [10.0, 20.0]}],
+            "AXSize": [0, {"$size": [100.0, 50.0]}],
+            "AXEnabled": [0, True],
+        },
+        "children": [],
+    }
+    recording["elements"]["3"]["attributes"]["AXValue"] = [0, {"$element": 900}]
+    return recording
+
+
+def _pairs(serialized, element):
+    pending = [(serialized, element)]
+    while pending:
+        node, element = pending.pop()
+        yield node, element
+        assert len(node["children"]) == len(element.children)
+        pending.extend(zip(node["children"], element.children))
+
+
+@pytest.mark.parametrize("format", serializer.FORMATS)
+def test_dump_and_load_round_trip(tmp_path, format):
+    if format == "msgpack":
+        pytest.importorskip("msgpack")
+    windows = [build_window(make_recording(3, 3)), build_window(_recording_with_element_value())]
+    windows[0].app_name = "First"
+    path = serializer.dump(windows, str(tmp_path / f"tree.{format}"), format)
+    loaded = serializer.load(path, format)
+    assert loaded == [serializer.serialize(window) for window in windows]
+    assert loaded[0]["app_name"] == "First"
+    assert "app_name" not in loaded[1]
+
+
+def test_fields_are_typed(recording):
+    window = build_window(recording)
+    for node, element in _pairs(serializer.serialize(window), window):
+        expected = element._node_dict()
+        assert node["id"] == expected["id"]
+        assert node["content_id"] == element.content_identifier
+        assert (node["name"], node["role"], node["bbox"]) == (expected["name"], expected["role"], expected["bbox"])
+        # numbers instead of the formatted strings of to_dict
+        assert "{x:.2f};{y:.2f}".format(**node["position"]) == expected["position"]
+        assert "{width:.0f};{height:.0f}".format(**node["size"]) == expected["size"]
+
+
+def test_element_values_are_nested_nodes():
+    window = build_window(_recording_with_element_value())
+    serialized = serializer.serialize(window)
+    nodes = [node for node, _ in _pairs(serialized, window) if isinstance(node["value"], dict)]
+    assert len(nodes) == 1
+    value = nodes[0]["value"]
+    assert (value["role"], value["name"]) == ("AXTextArea", "content")
+    # to_dict escapes the same value as a JSON string
+    element = next(node for node in traversal.walk(window) if node.value is not None)
+    assert json.loads(element.to_dict()["value"])["id"] == value["id"]
+
+
+@pytest.mark.parametrize("element_value", [False, True])
+def test_store_views_serialize_like_elements(recording, element_value):
+    window = build_window(_recording_with_element_value() if element_value else recording)
+    root = TreeStore.from_elements([window]).root_nodes[0]
+    assert serializer.serialize(root) == serializer.serialize(window)
+    # element values stay nested nodes, not JSON strings inside the JSON
+    compact = json.loads(serializer.dumps([root]))[0]
+    values = [node["value"] for node in traversal.walk(compact, children=lambda node: node["children"])]
+    assert sum(isinstance(value, dict) for value in values) == element_value
+    # the dictionary form is unchanged
+    assert root.to_dict() == window.to_dict()
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        serializer.dumps([], "xml")
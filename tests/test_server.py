@@ -0,0 +1,111 @@
+import tempfile
+import threading
+
+import numpy as np
+import pytest
+
+from conftest import build_window, make_recording
+from macapptree.capture import FrameCaptureSource
+from macapptree.client import CaptureClient, CaptureRejected
+from macapptree.server import CaptureBackend, CaptureServer
+from macapptree.window_tools import segment_window_image
+
+
+WINDOW_SCREEN_RECT = [100, 50, 900, 650]
+
+
+# captures replayed recordings and crops their windows out of a fixed frame.
+# with a gate, every capture waits for it after signalling started
+class ReplayCaptureBackend(CaptureBackend):
+    def __init__(self, recordings, frame, gate=None):
+        self.recordings = recordings
+        self.source = FrameCaptureSource(frame)
+        self.gate = gate
+        self.started = threading.Event()
+
+    def window(self, bundle, max_depth=None):
+        window = build_window(self.recordings[bundle], max_depth=max_depth)
+        window.window_screen_rect = WINDOW_SCREEN_RECT
+        return window
+
+    def capture(self, bundle, max_depth=None, screenshots=False):
+        self.started.set()
+        if self.gate is not None:
+            self.gate.wait(10)
+        window = self.window(bundle, max_depth)
+        if not screenshots:
+            return [window.to_dict()], None, None
+        x1, y1, x2, y2 = WINDOW_SCREEN_RECT
+        cropped = self.source.grab((x1, y1, x2 - x1, y2 - y1))
+        return [window.to_dict()], cropped, segment_window_image(window, cropped, scale=1.0)
+
+
+@pytest.fixture
+def frame():
+    return np.random.default_rng(0).integers(0, 256, (800, 1200, 3), dtype=np.uint8)
+
+
+@pytest.fixture
+def serve():
+    servers = []
+    directory = tempfile.TemporaryDirectory()
+
+    def start(backend, **kwargs):
+        server = CaptureServer(f"{directory.name}/{len(servers)}.sock", backend, **kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server.socket_path
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+    directory.cleanup()
+
+
+def test_capture(serve, frame):
+    backend = ReplayCaptureBackend({"com.example.a": make_recording(3, 3), "com.example.b": make_recording(2, 4)}, frame)
+    socket_path = serve(backend)
+    with CaptureClient(socket_path, timeout=10) as client:
+        results = client.capture(["com.example.a", "com.example.missing", "com.example.b"])
+        assert results["com.example.a"]["tree"] == [backend.window("com.example.a").to_dict()]
+        assert results["com.example.b"]["tree"] == [backend.window("com.example.b").to_dict()]
+        assert results["com.example.missing"]["type"] == "error"
+        assert "KeyError" in results["com.example.missing"]["error"]
+
+        # the same connection serves further requests
+        result = client.capture(["com.example.a"], max_depth=1, screenshots=True)["com.example.a"]
+    window = backend.window("com.example.a", max_depth=1)
+    assert result["tree"] == [window.to_dict()]
+    cropped = np.asarray(result["cropped_image"])
+    assert np.array_equal(cropped, frame[50:650, 100:900])
+    expected = segment_window_image(window, backend.source.grab((100, 50, 800, 600)), scale=1.0)
+    assert np.array_equal(np.asarray(result["segmented_image"]), np.asarray(expected))
+    assert not np.array_equal(np.asarray(result["segmented_image"]), cropped)
+
+
+def test_full_queue_rejects(serve, frame):
+    gate = threading.Event()
+    backend = ReplayCaptureBackend({"com.example.a": make_recording(2, 2)}, frame, gate)
+    socket_path = serve(backend, max_concurrency=1, max_queue=1)
+
+    running = {}
+    first = CaptureClient(socket_path, timeout=10)
+    thread = threading.Thread(target=lambda: running.update(first.capture(["com.example.a"])))
+    thread.start()
+    try:
+        assert backend.started.wait(10)
+        with CaptureClient(socket_path, timeout=10) as queued, CaptureClient(socket_path, timeout=10) as rejected:
+            messages = queued.stream(["com.example.a"])
+            accepted = next(messages)
+            assert (accepted["type"], accepted["queue_position"]) == ("accepted", 1)
+            with pytest.raises(CaptureRejected):
+                rejected.capture(["com.example.a"])
+            gate.set()
+            assert [message["type"] for message in messages] == ["tree"]
+        thread.join(10)
+        assert running["com.example.a"]["type"] == "tree"
+    finally:
+        gate.set()
+        thread.join(10)
+        first.close()
@@ -0,0 +1,126 @@
+import math
+
+import numpy as np
+import pytest
+
+from conftest import ROLES, build_window
+from macapptree import traversal
+from macapptree.spatial import SpatialIndex, screen_box
+
+
+# recording of a window whose elements are placed at random, partly outside their parents
+def _random_recording(rng, depth, fanout, width=1400.0, height=880.0):
+    elements = {"0": {"attributes": {"AXWindows": [0, [{"$element": 1}]]}}}
+    pending = [(1, 0, 0.0, 0.0, width, height)]
+    next_id = 2
+    while pending:
+        node_id, level, x, y, node_width, node_height = pending.pop()
+        children = []
+        if level < depth:
+            for _ in range(int(rng.integers(1, fanout + 1))):
+                child_width = node_width * rng.uniform(0.05, 0.6)
+                child_height = node_height * rng.uniform(0.05, 0.6)
+                child_x = x + rng.uniform(-0.1, 1.0) * node_width
+                child_y = y + rng.uniform(-0.1, 1.0) * node_height
+                children.append(next_id)
+                pending.append((next_id, level + 1, child_x, child_y, child_width, child_height))
+                next_id += 1
+        elements[str(node_id)] = {
+            "attributes": {
+                "AXRole": [0, "AXWindow" if node_id == 1 else ROLES[node_id % len(ROLES)]],
+                "AXTitle": [0, f"node {node_id}"],
+                "AXPosition": [0, {"$point": [x, y]}],
+                "AXSize": [0, {"$size": [node_width, node_height]}],
+                "AXEnabled": [0, True],
+            },
+            "children": [{"$element": child} for child in children],
+        }
+    return {"elements": elements, "applications": {"1": 0}}
+
+
+def _windows(seed):
+    rng = np.random.default_rng(seed)
+    roots = []
+    for rect in ([200, 100, 1600, 980], [900, 500, 2300, 1380]):
+        window = build_window(_random_recording(rng, 4, 6), parents_visible_bbox=[0, 0, 1400, 880])
+        window.window_screen_rect = rect
+        roots.append(window)
+    return roots, rng
+
+
+# the linear scans the index is checked against: every visible element with its hit test rank
+class _Linear:
+    def __init__(self, roots):
+        self.items = []
+        for root in roots:
+            for element, depth, _ in traversal.walk_with_depth(root):
+                box = screen_box(element, root.window_screen_rect)
+                if box is not None:
+                    self.items.append((element, box, (depth, len(self.items))))
+
+    def containing(self, x, y):
+        found = [item for item in self.items if item[1][0] <= x <= item[1][2] and item[1][1] <= y <= item[1][3]]
+        return [element for element, _, _ in sorted(found, key=lambda item: item[2])]
+
+    def hit_test(self, x, y):
+        found = self.containing(x, y)
+        return found[-1] if found else None
+
+    def intersecting(self, rect):
+        x1, y1, x2, y2 = rect
+        return [element for element, box, _ in self.items
+                if box[0] <= x2 and x1 <= box[2] and box[1] <= y2 and y1 <= box[3]]
+
+    def nearest(self, x, y, k):
+        found = []
+        for element, box, rank in self.items:
+            distance = math.hypot(max(box[0] - x, x - box[2], 0), max(box[1] - y, y - box[3], 0))
+            found.append((distance, tuple(-value for value in rank), element))
+        found.sort(key=lambda item: item[:2])
+        return [(distance, element) for distance, _, element in found[:k]]
+
+
+def _same(a, b):
+    return len(a) == len(b) and all(x is y for x, y in zip(a, b))
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_queries_match_linear_scans(seed):
+    roots, rng = _windows(seed)
+    index = SpatialIndex(roots)
+    linear = _Linear(roots)
+    assert len(index) == len(linear.items)
+
+    # points on element edges as well, boxes are closed
+    edges = [(box[0], box[3]) for _, box, _ in linear.items[::7]]
+    points = [tuple(point) for point in rng.uniform((-100, -100), (2500, 1500), (300, 2))] + edges
+    for x, y in points:
+        assert index.hit_test(x, y) is linear.hit_test(x, y)
+        assert _same(index.elements_at(x, y), linear.containing(x, y))
+    assert _same(index.hit_test_many(points), [linear.hit_test(x, y) for x, y in points])
+
+    for x, y in points[:60]:
+        rect = (x, y, x + rng.uniform(0, 300), y + rng.uniform(0, 300))
+        assert _same(index.intersecting(rect), linear.intersecting(rect))
+
+    for x, y in points[:60] + [(-5000, -5000), (1e5, 3)]:
+        k = int(rng.choice([1, 5, 20]))
+        found, expected = index.nearest(x, y, k), linear.nearest(x, y, k)
+        assert np.allclose([distance for distance, _ in found], [distance for distance, _ in expected])
+        assert _same([element for _, element in found], [element for _, element in expected])
+
+
+def test_cell_size_does_not_change_results():
+    roots, rng = _windows(7)
+    points = rng.uniform((0, 0), (2400, 1400), (200, 2))
+    expected = SpatialIndex(roots).hit_test_many(points)
+    for cell_size in (4, 37.5, 5000):
+        assert _same(SpatialIndex(roots, cell_size=cell_size).hit_test_many(points), expected)
+
+
+def test_empty_index():
+    index = SpatialIndex([])
+    assert index.hit_test(10, 10) is None
+    assert index.hit_test_many([(10, 10)]) == [None]
+    assert index.intersecting((0, 0, 10, 10)) == []
+    assert index.nearest(10, 10, 3) == []
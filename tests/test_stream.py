@@ -0,0 +1,70 @@
+import pytest
+
+from conftest import build_window, make_recording
+from macapptree import traversal
+from macapptree.stream import NDJSONTreeWriter, load_ndjson
+
+
+class _Hang(Exception):
+    pass
+
+
+# visitor raising once the given number of nodes is finished, like an app that stops replying
+def _failing_after(count):
+    finished = []
+
+    def visit(node, depth):
+        finished.append(node)
+        if len(finished) == count:
+            raise _Hang("app stopped replying")
+    return visit
+
+
+def _stream(writer, recording, index, visitor=None):
+    with writer.window():
+        window = build_window(recording, visitor=traversal.chain(writer.visit, visitor), release=True)
+    writer.write_root(window, index)
+    return window
+
+
+def test_streamed_windows_round_trip(tmp_path, recording):
+    path = str(tmp_path / "tree.ndjson.gz")
+    other = make_recording(2, 5)
+    with NDJSONTreeWriter(path) as writer:
+        first = _stream(writer, recording, 0)
+        writer.write_tree(build_window(other), 1)
+
+    # the streamed nodes were released during the build
+    assert first.children == []
+    skipped = []
+    assert load_ndjson(path, skipped=skipped) == [build_window(recording).to_dict(), build_window(other).to_dict()]
+    assert skipped == []
+
+
+def test_aborted_windows_are_skipped_and_reported(tmp_path, recording):
+    path = str(tmp_path / "tree.ndjson")
+    with NDJSONTreeWriter(path) as writer:
+        with pytest.raises(_Hang):
+            _stream(writer, make_recording(3, 3), 0, _failing_after(10))
+        _stream(writer, recording, 1)
+        # built but never written, as when the capture is interrupted
+        with writer.window():
+            build_window(make_recording(1, 2), visitor=writer.visit)
+
+    skipped = []
+    assert load_ndjson(path, skipped=skipped) == [build_window(recording).to_dict()]
+    assert skipped == [
+        {"window": 0, "nodes": 6, "reason": "_Hang: app stopped replying"},
+        {"window": 2, "nodes": 2, "reason": "no end marker"},
+    ]
+
+
+def test_nodes_without_parent_are_reported(tmp_path, recording, capsys):
+    path = str(tmp_path / "tree.ndjson")
+    with NDJSONTreeWriter(path) as writer:
+        # streamed outside writer.window(), the root is never written
+        build_window(make_recording(1, 3), visitor=writer.visit)
+        writer.write_tree(build_window(recording))
+
+    assert load_ndjson(path) == [build_window(recording).to_dict()]
+    assert "Skipped 3 nodes of window None: parent missing" in capsys.readouterr().out
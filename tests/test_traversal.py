@@ -0,0 +1,82 @@
+import pytest
+
+from conftest import build_window, make_recording
+from macapptree import traversal
+from macapptree.uielement import UIElement
+
+
+# the construction before the traversal engine: every child builds its whole subtree in its constructor
+class RecursiveUIElement(UIElement):
+    def _expand(self):
+        if not self._complete:
+            return []
+        elements, self.action_items = self._child_elements_and_actions(
+            self.ax_element, self._start_position, self._children_hint
+        )
+        self._children_hint = None
+        if self.max_depth is None or self.max_depth > 0:
+            offset_x, offset_y = self._offset
+            child_depth = self.max_depth - 1 if self.max_depth is not None else None
+            self.children = [
+                self._make_child(child, offset_x, offset_y, child_depth, self.visible_bbox, True)
+                for child in elements
+            ]
+        return []
+
+
+def _build(recording, order, monkeypatch, **kwargs):
+    monkeypatch.setattr(UIElement, "traversal_order", order)
+    return build_window(recording, **kwargs)
+
+
+@pytest.mark.parametrize("max_depth", [None, 2])
+def test_dfs_bfs_and_recursive_builds_are_equal(recording, monkeypatch, max_depth):
+    dfs = _build(recording, traversal.DFS, monkeypatch, max_depth=max_depth)
+    bfs = _build(recording, traversal.BFS, monkeypatch, max_depth=max_depth)
+    monkeypatch.setattr("conftest.UIElement", RecursiveUIElement)
+    recursive = _build(recording, traversal.DFS, monkeypatch, max_depth=max_depth)
+
+    assert isinstance(recursive.children[0], RecursiveUIElement)
+    assert dfs.to_dict() == bfs.to_dict() == recursive.to_dict()
+    expected_nodes = sum(4 ** level for level in range(4 + 1 if max_depth is None else max_depth + 1))
+    assert sum(1 for _ in traversal.walk(dfs)) == expected_nodes
+
+
+def test_visitor_sees_every_node_after_its_subtree(recording):
+    finished = []
+    window = build_window(recording, visitor=lambda node, depth: finished.append((node, depth)))
+    position = {id(node): index for index, (node, _) in enumerate(finished)}
+    assert finished[-1] == (window, 0)
+    assert len(finished) == sum(1 for _ in traversal.walk(window))
+    for node, depth, parent in traversal.walk_with_depth(window):
+        assert (node, depth) == finished[position[id(node)]]
+        if parent is not None:
+            assert position[id(node)] < position[id(parent)]
+
+
+def test_walk_orders(recording):
+    window = build_window(recording)
+    dfs = list(traversal.walk(window))
+    bfs = list(traversal.walk(window, traversal.BFS))
+    post = list(traversal.walk_post_order(window))
+    assert dfs[0] is bfs[0] is post[-1] is window
+    assert {id(node) for node in dfs} == {id(node) for node in bfs} == {id(node) for node in post}
+    assert [depth for _, depth, _ in traversal.walk_with_depth(window, traversal.BFS)] == sorted(
+        depth for _, depth, _ in traversal.walk_with_depth(window)
+    )
+
+
+def test_deep_trees_do_not_recurse():
+    # deeper than the interpreter's recursion limit
+    deep = make_recording(1200, 1)
+    window = build_window(deep)
+    assert sum(1 for _ in traversal.walk(window)) == 1201
+    node, depth = window.to_dict(), 0
+    while node["children"]:
+        node, depth = node["children"][0], depth + 1
+    assert depth == 1200
+
+
+def test_unknown_order():
+    with pytest.raises(ValueError):
+        traversal.build(object(), "sideways")
@@ -0,0 +1,72 @@
+import gc
+import weakref
+
+from conftest import build_window, make_recording
+from macapptree import traversal
+from macapptree.spatial import SpatialIndex
+from macapptree.tree_store import TreeStore, TreeStoreBuilder
+from macapptree.window_tools import propagate_screen_rect
+
+
+RECT = [100, 50, 900, 650]
+
+
+def _capture(recording, release):
+    builder = TreeStoreBuilder(capacity=8)
+    window = build_window(recording, visitor=builder.visit, release=release)
+    propagate_screen_rect(window, RECT)
+    view = builder.add_root(window, RECT)
+    return builder, window, view
+
+
+def test_builder_matches_the_element_tree(recording):
+    expected = build_window(recording)
+    builder, window, view = _capture(recording, release=False)
+    store = builder.build()
+    assert len(store) == sum(1 for _ in traversal.walk(expected))
+    assert view.to_dict() == expected.to_dict()
+    assert store.to_dict() == TreeStore.from_elements([window]).to_dict()
+    # children are contiguous and point back at their parent
+    for node in store.nodes():
+        for child in node.children:
+            assert child.parent == node
+            assert child.depth == node.depth + 1
+
+
+def test_release_keeps_only_the_store(recording):
+    expected = build_window(recording).to_dict()
+    nodes = []
+    builder = TreeStoreBuilder()
+    visitor = traversal.chain(lambda node, depth: nodes.append(weakref.ref(node)), builder.visit)
+    window = build_window(recording, visitor=visitor, release=True)
+    view = builder.add_root(window)
+    gc.collect()
+
+    assert window.children == []
+    assert [ref for ref in nodes if ref() is not None] == [nodes[-1]]
+    assert view.to_dict() == expected
+    assert len(builder.build()) == len(nodes)
+
+
+def test_every_node_reports_its_window_screen_rect():
+    builder, window, view = _capture(make_recording(2, 3), release=False)
+    assert all(node.window_screen_rect == RECT for node in traversal.walk(window))
+    # the store keeps the rect once per root
+    assert all(node.window_screen_rect == RECT for node in builder.build().nodes())
+
+    # element and store trees give the same screen boxes
+    for roots in ([window], [view]):
+        index = SpatialIndex(roots)
+        hit = index.hit_test(RECT[0] + 5, RECT[1] + 5)
+        assert hit is not None and hit.role != "AXWindow"
+    assert SpatialIndex([window]).boxes.tolist() == SpatialIndex([view]).boxes.tolist()
+
+
+def test_abandoned_builds_do_not_leak_into_later_trees(recording):
+    builder = TreeStoreBuilder()
+    for _ in range(20):
+        # the windows are built but their roots are never added, like windows of an app that stopped replying
+        build_window(make_recording(2, 2), visitor=builder.visit)
+    window = build_window(recording, visitor=builder.visit, release=True)
+    view = builder.add_root(window)
+    assert view.to_dict() == build_window(recording).to_dict()
@@ -0,0 +1,190 @@
+import copy
+import random
+
+import pytest
+
+from conftest import ROLES, make_recording
+from macapptree import backend, diff, traversal
+from macapptree.backend import ReplayAXBackend, use_backend
+from macapptree.uielement import UIElement
+from macapptree.watch import ReplayNotificationSource, TreeWatcher
+from macapptree.window_tools import propagate_screen_rect
+
+
+VALUE_CHANGED = backend.AX_VALUE_CHANGED_NOTIFICATION
+CREATED = backend.AX_CREATED_NOTIFICATION
+DESTROYED = backend.AX_UI_ELEMENT_DESTROYED_NOTIFICATION
+RECT = [100, 50, 900, 650]
+
+
+def _event(time, element, notification=VALUE_CHANGED):
+    return {"time": time, "pid": 1, "element": element, "notification": notification}
+
+
+# a replayed app whose recording is changed in place, like the app changing under the watcher
+class App:
+    def __init__(self, depth=3, fanout=3):
+        self.recording = make_recording(depth, fanout)
+        self.elements = self.recording["elements"]
+        self.replay = ReplayAXBackend(self.recording)
+        self.next_id = max(int(key) for key in self.elements) + 1
+        for key, element in list(self.elements.items()):
+            for child in element.get("children", []):
+                self.elements[str(child["$element"])]["attributes"]["AXParent"] = [0, {"$element": int(key)}]
+
+    def window(self):
+        with use_backend(self.replay):
+            window = self.replay.attribute(self.replay.application(1), "AXWindows")[0]
+            window = UIElement(window)
+        propagate_screen_rect(window, RECT)
+        return window
+
+    def nodes(self):
+        return [int(node.ax_element.element_id) for node in traversal.walk(self.window())]
+
+    def attributes(self, element_id):
+        return self.elements[str(element_id)]["attributes"]
+
+    def rename(self, element_id, title):
+        self.attributes(element_id)["AXTitle"] = [0, title]
+
+    def move(self, element_id, dx, dy):
+        x, y = self.attributes(element_id)["AXPosition"][1]["$point"]
+        self.attributes(element_id)["AXPosition"] = [0, {"$point": [x + dx, y + dy]}]
+
+    def insert(self, parent_id, x, y):
+        element_id = self.next_id
+        self.next_id += 1
+        self.elements[str(element_id)] = {
+            "attributes": {
+                "AXRole": [0, ROLES[element_id % len(ROLES)]],
+                "AXTitle": [0, f"inserted {element_id}"],
+                "AXPosition": [0, {"$point": [x, y]}],
+                "AXSize": [0, {"$size": [20.0, 10.0]}],
+                "AXEnabled": [0, True],
+                "AXParent": [0, {"$element": parent_id}],
+            },
+            "children": [],
+        }
+        self.elements[str(parent_id)]["children"].append({"$element": element_id})
+        return element_id
+
+    def remove(self, element_id):
+        parent_id = self.attributes(element_id)["AXParent"][1]["$element"]
+        children = self.elements[str(parent_id)]["children"]
+        children.remove({"$element": element_id})
+
+
+class Watch:
+    def __init__(self, app, events, **kwargs):
+        self.app = app
+        self.updates = []
+        self.dicts = []
+        self.source = ReplayNotificationSource(events)
+        self.watcher = TreeWatcher([app.window()], 1, self.source, self.publish, **kwargs)
+
+    def publish(self, update):
+        self.updates.append(update)
+        self.dicts.append([diff.as_dict(root) for root in update.roots])
+
+    def run(self, duration):
+        with use_backend(self.app.replay):
+            self.watcher.start()
+            self.watcher.run(duration)
+            self.watcher.stop()
+        return self.watcher.roots
+
+
+def test_bursts_are_coalesced():
+    app = App()
+    nodes = app.nodes()
+    burst = [_event(0.001 * i, nodes[i % len(nodes)]) for i in range(10)]
+    # a notification every 10ms for 1.5s never leaves 50ms of quiet time, max_delay flushes it
+    storm = [_event(2.0 + 0.01 * i, nodes[5]) for i in range(150)]
+    watch = Watch(app, burst + [_event(1.0, nodes[3])] + storm, coalesce=0.05, max_delay=0.5)
+    watch.run(4.0)
+
+    counts = [update.notifications for update in watch.updates]
+    assert counts[:2] == [10, 1]
+    assert 3 <= len(counts[2:]) <= 4 and sum(counts[2:]) == 150
+    assert watch.watcher.stats.notifications == 161 and watch.watcher.stats.flushes == len(counts)
+
+
+def test_only_changed_subtrees_are_rebuilt():
+    app = App()
+    watch = Watch(app, [_event(0.0, 3), _event(0.01, 7)])
+    before = {id(node) for node in traversal.walk(watch.watcher.roots[0])}
+    subtree_sizes = {}
+    for node in traversal.walk(watch.watcher.roots[0]):
+        if node.ax_element.element_id in (3, 7):
+            subtree_sizes[node.ax_element.element_id] = sum(1 for _ in traversal.walk(node))
+    app.rename(3, "renamed")
+    app.rename(7, "renamed too")
+    roots = watch.run(1.0)
+
+    assert len(watch.updates) == 1
+    refreshed = watch.updates[0].refreshed
+    assert sorted(node.ax_element.element_id for node in refreshed) == [3, 7]
+    assert watch.watcher.stats.refreshed_nodes == sum(subtree_sizes.values())
+    # nodes outside the refreshed subtrees are the ones captured before
+    rebuilt = {id(node) for subtree in refreshed for node in traversal.walk(subtree)}
+    kept = [node for node in traversal.walk(roots[0]) if id(node) not in rebuilt]
+    assert len(kept) == len(before) - sum(subtree_sizes.values())
+    assert all(id(node) in before for node in kept)
+    assert roots[0].to_dict() == app.window().to_dict()
+    assert all(node.window_screen_rect == RECT for node in traversal.walk(roots[0]))
+
+
+def test_destroyed_and_created_elements():
+    app = App()
+    removed = app.nodes()[4]
+    parent = app.attributes(removed)["AXParent"][1]["$element"]
+    watch = Watch(app, [_event(0.0, removed, DESTROYED), _event(0.5, 0, CREATED)])
+    app.remove(removed)
+    inserted = app.insert(parent, 333.3, 44.4)
+    watch.source.events[1]["element"] = inserted
+    roots = watch.run(1.0)
+    assert len(watch.updates) == 2
+    assert roots[0].to_dict() == app.window().to_dict()
+
+
+# random edits, inserts, removals and moves arriving at random times
+@pytest.mark.parametrize("seed", range(25))
+def test_random_sequences_match_a_full_build(seed):
+    rng = random.Random(seed)
+    app = App()
+    events = []
+    time = 0.0
+    for step in range(rng.randint(5, 30)):
+        time += rng.choice([0.001, 0.02, 0.2])
+        nodes = app.nodes()
+        element_id = rng.choice(nodes[1:] or nodes)
+        action = rng.choice(["rename", "move", "insert", "remove"] if len(nodes) > 5 else ["insert"])
+        if action == "rename":
+            app.rename(element_id, f"step {step}")
+            events.append(_event(time, element_id))
+        elif action == "move":
+            app.move(element_id, rng.uniform(-30, 30), rng.uniform(-5, 5))
+            events.append(_event(time, element_id))
+        elif action == "insert":
+            x, y = app.attributes(element_id)["AXPosition"][1]["$point"]
+            inserted = app.insert(element_id, x + rng.uniform(0, 50), y + rng.uniform(0, 20))
+            events.append(_event(time, inserted, CREATED))
+        else:
+            app.remove(element_id)
+            events.append(_event(time, element_id, DESTROYED))
+
+    # the app state the events were read from is the final one, the replay does not go back in time
+    initial = App()
+    initial_dict = diff.as_dict(initial.window())
+    watch = Watch(initial, events, deltas=True)
+    initial.elements.clear()
+    initial.elements.update(copy.deepcopy(app.elements))
+    roots = watch.run(time + 1.0)
+
+    assert roots[0].to_dict() == app.window().to_dict()
+    # the published deltas rebuild every update from the previous one
+    previous = [initial_dict]
+    for update, expected in zip(watch.updates, watch.dicts):
+        previous = diff.apply(previous, update.delta)
+        assert previous == expected
@@ -0,0 +1,160 @@
+import json
+
+import pytest
+
+from conftest import build_window, make_recording
+from macapptree import readiness
+from macapptree.backend import (
+    AX_ERROR_CANNOT_COMPLETE, AX_TITLE, CountingAXBackend, DelegatingAXBackend, ReplayAXBackend, ReplayElement,
+    use_backend,
+)
+from macapptree.budget import CaptureBudget
+from macapptree.exceptions import AppNotRespondingException
+from macapptree.manifest import write_manifest
+from macapptree.uielement import UIElement
+from macapptree.watchdog import HangWatchdog
+
+
+APP = "com.example.App"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+# takes the given seconds for the calls on the slow elements, and records the messaging timeouts set
+class SlowAXBackend(DelegatingAXBackend):
+    def __init__(self, backend, clock, slow=(), seconds=5.0):
+        super().__init__(backend)
+        self.clock = clock
+        self.slow = set(slow)
+        self.seconds = seconds
+        self.messaging_timeouts = []
+
+    def _wait(self, element):
+        if element.element_id in self.slow:
+            self.clock.now += self.seconds
+
+    def copy_attribute(self, element, attribute):
+        self._wait(element)
+        return super().copy_attribute(element, attribute)
+
+    def copy_multiple_attributes(self, element, attributes):
+        self._wait(element)
+        return super().copy_multiple_attributes(element, attributes)
+
+    def set_messaging_timeout(self, element, seconds):
+        self.messaging_timeouts.append((element, seconds))
+        return super().set_messaging_timeout(element, seconds)
+
+
+# a recording whose elements 10 and 11 reply in time, and whose elements 20-29 time out
+def _replies_recording():
+    elements = {str(n): {"attributes": {AX_TITLE: [0, f"node {n}"]}} for n in (10, 11)}
+    for n in range(20, 30):
+        elements[str(n)] = {"attributes": {AX_TITLE: [AX_ERROR_CANNOT_COMPLETE, None]}}
+    return {"elements": elements, "applications": {}}
+
+
+def _titles(watchdog, *element_ids):
+    return [watchdog.copy_attribute(ReplayElement(n), AX_TITLE) for n in element_ids]
+
+
+def test_only_consecutive_timeouts_count():
+    counting = CountingAXBackend(ReplayAXBackend(_replies_recording()))
+    watchdog = HangWatchdog(counting, max_timeouts=3, clock=FakeClock())
+    with watchdog.watching(APP) as state:
+        _titles(watchdog, 20, 21, 10, 22, 23, 11, 24, 25)
+        assert (state.calls, state.timeouts, state.consecutive) == (8, 6, 2)
+        assert not state.hung and not watchdog.is_hung(APP)
+        with pytest.raises(AppNotRespondingException):
+            _titles(watchdog, 26)
+        assert state.hung and watchdog.report() == {APP: {"timeouts": 7, "calls": 9, "elapsed": 0.0}}
+
+        # the hung app is not asked again
+        with pytest.raises(AppNotRespondingException):
+            _titles(watchdog, 10)
+        assert counting.round_trips == 9
+
+    # calls outside watching() are forwarded as they are, and a hung app stays hung
+    assert _titles(watchdog, 20) == [(AX_ERROR_CANNOT_COMPLETE, None)]
+    with watchdog.watching(APP), pytest.raises(AppNotRespondingException):
+        _titles(watchdog, 10)
+
+
+def test_slow_calls_count_as_timeouts():
+    clock = FakeClock()
+    slow = SlowAXBackend(ReplayAXBackend(_replies_recording()), clock, slow={10}, seconds=2.0)
+    watchdog = HangWatchdog(slow, timeout=1.0, max_timeouts=2, app_timeouts={"com.example.Fast": 5.0}, clock=clock)
+    application = ReplayElement(0)
+
+    # 2s replies are within the 5s of the app with its own timeout
+    with watchdog.watching("com.example.Fast", application) as state:
+        _titles(watchdog, 10, 10, 10)
+        assert state.timeouts == 0
+    with watchdog.watching(APP, application) as state:
+        _titles(watchdog, 10)
+        assert state.consecutive == 1
+        with pytest.raises(AppNotRespondingException):
+            _titles(watchdog, 10)
+    assert slow.messaging_timeouts == [(application, 5.0), (application, 1.0)]
+    assert watchdog.report() == {APP: {"timeouts": 2, "calls": 2, "elapsed": 4.0}}
+    assert not watchdog.is_hung("com.example.Fast")
+
+
+# the window of the recording built with the watchdog as the backend
+def _build_watched(recording, watchdog, app):
+    replay = watchdog.backend.backend
+    window = replay.attribute(replay.application(1), "AXWindows")[0]
+    with use_backend(watchdog), watchdog.watching(app):
+        return UIElement(window)
+
+
+def test_capture_stops_at_a_hung_app():
+    recording = make_recording(3, 3)
+    clock = FakeClock()
+    # one subtree of the window replies slowly
+    subtree = [child["$element"] for child in recording["elements"]["2"]["children"]]
+    slow = SlowAXBackend(ReplayAXBackend(recording), clock, slow=[2] + subtree)
+    watchdog = HangWatchdog(slow, timeout=1.0, max_timeouts=2, clock=clock)
+    with pytest.raises(AppNotRespondingException):
+        _build_watched(recording, watchdog, APP)
+    assert watchdog.is_hung(APP)
+
+    # other apps are captured as before
+    other = make_recording(2, 2)
+    watchdog.backend.backend = ReplayAXBackend(other)
+    assert _build_watched(other, watchdog, "com.example.Other").to_dict() == build_window(other).to_dict()
+
+
+def test_manifest(tmp_path):
+    recording = _replies_recording()
+    watchdog = HangWatchdog(ReplayAXBackend(recording), max_timeouts=1, clock=FakeClock())
+    with watchdog.watching(APP), pytest.raises(AppNotRespondingException):
+        _titles(watchdog, 20)
+    budget = CaptureBudget(max_nodes=10, clock=FakeClock()).start()
+    readiness.log.clear()
+    readiness.log.add(readiness.WaitRecord("windows com.example.Other", 0.25, True, 3))
+
+    path = write_manifest(
+        str(tmp_path / "dump.manifest.json"), "dump.json", "json",
+        {"com.example.Other": 1.5, APP: 0.5}, watchdog, budget
+    )
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    readiness.log.clear()
+    assert manifest == {
+        "output": "dump.json",
+        "output_format": "json",
+        "apps": [
+            {"bundle": "com.example.Other", "elapsed": 1.5, "status": "ok"},
+            {"bundle": APP, "elapsed": 0.5, "status": "not_responding"},
+        ],
+        "hung_apps": watchdog.report(),
+        "budget": budget.stats(),
+        "waits": [{"name": "windows com.example.Other", "elapsed": 0.25, "ready": True, "polls": 3}],
+    }
@@ -0,0 +1,95 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from conftest import make_recording
+from macapptree.backend import ReplayAXBackend
+from macapptree.window_matching import VisibleWindowIndex, assign, iou_matrix, match_windows
+from macapptree.window_tools import _iou
+
+
+def _best_total(scores):
+    rows, columns = scores.shape
+    if rows <= columns:
+        return max(sum(scores[row, perm[row]] for row in range(rows))
+                   for perm in itertools.permutations(range(columns), rows))
+    return max(sum(scores[perm[column], column] for column in range(columns))
+               for perm in itertools.permutations(range(rows), columns))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_assign_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    for _ in range(60):
+        rows, columns = int(rng.integers(1, 6)), int(rng.integers(1, 6))
+        # zeros like windows without overlap, ties like windows with the same frame
+        scores = rng.random((rows, columns)) * (rng.random((rows, columns)) < 0.7)
+        scores[:, int(rng.integers(columns))] = scores[0, 0]
+        pairs = assign(scores)
+        assert len(pairs) == min(rows, columns)
+        assert len({row for row, _ in pairs}) == len({column for _, column in pairs}) == len(pairs)
+        assert sum(scores[row, column] for row, column in pairs) == pytest.approx(_best_total(scores))
+
+
+def test_iou_matrix_matches_iou():
+    rng = np.random.default_rng(0)
+    corners = rng.integers(0, 500, (35, 2))
+    boxes = np.hstack([corners, corners + rng.integers(0, 300, (35, 2))])
+    a, b = boxes[:20], boxes[20:]
+    assert np.allclose(iou_matrix(a, b), [[_iou(x, y) for y in b] for x in a])
+
+
+def _entry(bounds, number=None):
+    return {"pid": 1, "bounds": bounds, "visible": [bounds], "window_number": number}
+
+
+def test_windows_do_not_share_an_entry():
+    entries = [_entry((0, 0, 100, 100)), _entry((0, 0, 100, 120))]
+    # greedily both windows would take the first entry
+    matches = match_windows([(0, 0, 100, 100), (0, 0, 100, 119)], entries)
+    assert [match["bounds"] for match in matches] == [(0, 0, 100, 100), (0, 0, 100, 120)]
+    assert match_windows([None, (0, 0, 100, 100)], entries) == [None, entries[0]]
+    assert match_windows([(500, 500, 600, 600)], entries) == [None]
+
+
+def test_window_numbers_win_over_geometry():
+    entries = [_entry((0, 0, 100, 100), 7), _entry((0, 0, 100, 120), 9)]
+    rects = [(0, 0, 100, 100), (0, 0, 100, 119)]
+    assert [match["window_number"] for match in match_windows(rects, entries, [9, 7])] == [9, 7]
+    # an unknown number falls back to the overlap
+    assert [match["window_number"] for match in match_windows(rects, entries, [None, 9])] == [7, 9]
+
+
+def test_replay_returns_recorded_window_numbers():
+    recording = make_recording(1, 2)
+    recording["elements"]["1"]["window_number"] = 4242
+    replay = ReplayAXBackend(recording)
+    window = replay.attribute(replay.application(1), "AXWindows")[0]
+    assert replay.window_number(window) == 4242
+    assert replay.window_number(replay.application(1)) is None
+
+
+# apps with overlapping windows, the accessibility frames off by a fraction of a point
+def _layout(apps, windows, seed=0):
+    rng = np.random.default_rng(seed)
+    entries = []
+    ax_windows = {}
+    for pid in range(apps):
+        ax_windows[pid] = []
+        for number in range(pid * 1000, pid * 1000 + windows):
+            x, y = rng.integers(0, 2000), rng.integers(0, 1200)
+            width, height = rng.integers(200, 900), rng.integers(150, 700)
+            bounds = (int(x), int(y), int(width), int(height))
+            entries.append({"pid": pid, "bounds": bounds, "visible": [bounds], "window_number": number})
+            ax_windows[pid].append(((x + rng.random(), y, x + width, y + height), number))
+    return VisibleWindowIndex(entries), ax_windows
+
+
+@pytest.mark.parametrize("use_numbers", [True, False])
+def test_hundreds_of_windows_match_their_own_entries(use_numbers):
+    index, ax_windows = _layout(4, 150)
+    for pid, windows in ax_windows.items():
+        numbers = [number for _, number in windows] if use_numbers else None
+        matches = match_windows([rect for rect, _ in windows], index.for_pid(pid), numbers)
+        assert [match["window_number"] for match in matches] == [number for _, number in windows]
@@ -0,0 +1,80 @@
+import threading
+
+import pytest
+
+from conftest import build_window, make_recording
+from macapptree.backend import ReplayAXBackend, get_backend, use_backend
+from macapptree.workers import run_apps
+
+
+APPS = ["com.example.a", "com.example.b", "com.example.c", "com.example.d"]
+
+
+# a clock for one thread at a time, every reading is a second later
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        self.now += 1.0
+        return self.now
+
+
+def test_sequential_timings(capsys):
+    clock = FakeClock()
+    results = run_apps(APPS[:2], lambda app_bundle: app_bundle.upper(), clock=clock)
+    assert results == [("COM.EXAMPLE.A", 1.0), ("COM.EXAMPLE.B", 1.0)]
+    assert capsys.readouterr().out.splitlines() == [
+        "Processing app: com.example.a", "Processed com.example.a in 1.00s",
+        "Processing app: com.example.b", "Processed com.example.b in 1.00s",
+    ]
+
+
+# every app waits until the app after it finished, so they finish in reverse order
+@pytest.mark.parametrize("workers", [len(APPS), 8])
+def test_results_keep_the_app_order(workers):
+    done = {app_bundle: threading.Event() for app_bundle in APPS}
+    finished = []
+    running = set()
+    overlapped = []
+
+    def process(app_bundle):
+        running.add(app_bundle)
+        overlapped.append(len(running))
+        index = APPS.index(app_bundle)
+        if index + 1 < len(APPS):
+            assert done[APPS[index + 1]].wait(5)
+        finished.append(app_bundle)
+        running.discard(app_bundle)
+        done[app_bundle].set()
+        return [app_bundle]
+
+    results = run_apps(APPS, process, workers)
+    assert finished == APPS[::-1]
+    assert [result for result, _ in results] == [[app_bundle] for app_bundle in APPS]
+    assert max(overlapped) == len(APPS)
+    # the first app waited for all the others
+    assert results[0][1] >= max(elapsed for _, elapsed in results[1:])
+
+
+def test_workers_share_the_callers_backend():
+    recordings = {app_bundle: make_recording(2, index + 1) for index, app_bundle in enumerate(APPS)}
+    caller = ReplayAXBackend(recordings[APPS[0]])
+
+    def process(app_bundle):
+        assert get_backend() is caller
+        return build_window(recordings[app_bundle]).to_dict()
+
+    with use_backend(caller):
+        results = run_apps(APPS, process, workers=3)
+    assert [result for result, _ in results] == [build_window(recordings[app_bundle]).to_dict() for app_bundle in APPS]
+
+
+def test_errors_reach_the_caller():
+    def process(app_bundle):
+        if app_bundle == APPS[2]:
+            raise RuntimeError(app_bundle)
+        return app_bundle
+
+    with pytest.raises(RuntimeError, match=APPS[2]):
+        run_apps(APPS, process, workers=2)